@@ -1,21 +1,31 @@
 from __future__ import annotations
 
+from collections.abc import Iterable, Sequence
 from dataclasses import dataclass
 from typing import Literal, Type
 
 import numpy as np
+from crypto_gltf.data.asset_file_data_types import LazySequence
 from crypto_gltf.data.types import AAD_DATA, BaseKey, BaseParams, EncryptionResponse
 from crypto_gltf.encrypt.adaptive.system import AdaptiveCryptoSystemV3
 from crypto_gltf.encrypt.adaptive.types import (
     ImagesAdaptiveCipherParams,
     Key,
     MeshesAdaptiveCipherParams,
+    VisualLevel,
 )
 from crypto_gltf.io.file.base_file import BaseFile
 from crypto_gltf.io.file.file import File
 from crypto_gltf.io.plaintext.plnm import PlnM
 
 
+def _loaded(arrs: Sequence[np.ndarray]) -> dict[int, np.ndarray]:
+    """Arrays of cipher_plnm that were loaded or replaced, by index"""
+    if isinstance(arrs, LazySequence):
+        return {idx: arrs[idx] for idx in range(len(arrs)) if arrs.is_loaded(idx)}
+    return dict(enumerate(arrs))
+
+
 @dataclass
 class Asset:
     file: BaseFile
@@ -25,9 +35,11 @@ class Asset:
     def load(
         cls,
         import_filepath: str,
+        use_mmap: bool = False,
     ) -> Asset:
-        """Load file from import_filepath"""
-        return cls(file=File(import_filepath=import_filepath))
+        """Load file from import_filepath.
+        use_mmap memory maps .glb/.gltf binary data instead of reading it into memory"""
+        return cls(file=File(import_filepath=import_filepath, use_mmap=use_mmap))
 
     def save(self, export_dir: str) -> str:
         """Save file to export_dir"""
@@ -35,18 +47,31 @@ class Asset:
             export_dir=export_dir, images_encrypted=self.images_encrypted
         )
 
+    def patch(self, export_dir: str | None = None) -> str:
+        """Patch encrypted or decrypted data into a copy of the source .glb file in export_dir,
+        or into the source file itself if export_dir is None.
+        Much faster than save for large files, but images must not be encrypted"""
+        return self.file.patch(export_dir=export_dir)
+
     def encrypt(
         self,
         meshes_cipher_params: tuple[int, int, int] = (2, 2, 10),
         images_cipher_params: tuple[int, int, int] = (1, 1, 6),
         key: bytes | None = None,
         encrypt_images: bool = False,
+        segment_size: int | None = None,
+        partial: bool = False,
     ) -> EncryptionResponse[PlnM, AAD_DATA, Key]:
-        """Encrypt a file"""
+        """Encrypt a file. If segment_size is given, block streams are encrypted in parallel
+        as independent segments of segment_size bytes.
+        If partial, every accessor and image is authenticated on its own,
+        so meshes and nodes can be decrypted selectively"""
         self.images_encrypted = encrypt_images
 
         if len(meshes_cipher_params)!=3 or len(images_cipher_params)!=3:
             raise ValueError(f'All three cipher parameters must be specified.')
+        if (segment_size is not None or partial) and self.file.filename_ext == ".off":
+            raise ValueError("Segmented encryption is not supported for .off files.")
         
         mesh_params = MeshesAdaptiveCipherParams(
             p=meshes_cipher_params[0],
@@ -59,31 +84,92 @@ class Asset:
             r=images_cipher_params[2],
         )
         response = AdaptiveCryptoSystemV3.encrypt(
-            plnm=self.file.plnm,
+            plnm=self.file.cipher_plnm(images=encrypt_images),
             meshes_cipher_params=mesh_params,
             images_cipher_params=img_params,
             k3=key,
             encrypt_images=encrypt_images,
+            segment_size=segment_size,
+            partial=partial,
         )
-        self.file.insert_plnm(response.ciphertext)
+        self.file.insert_cipher_plnm(response.ciphertext, images=encrypt_images)
 
         assert response.aad is not None
         self.file.embed_aad(response.aad)
 
         return response
 
+    def reencrypt_changed(
+        self, edited: Asset, key: bytes
+    ) -> EncryptionResponse[
+        tuple[dict[int, np.ndarray], dict[int, np.ndarray]], AAD_DATA, Key
+    ]:
+        """Update this asset, encrypted with partial=True under k3 key, to the plaintext asset
+        edited by encrypting only the accessors and images whose content changed.
+        Their segments are encrypted again under the same keys and the embedded aad is updated,
+        every other accessor is left untouched, so patch only writes what changed.
+        Changed arrays must keep their size and only encrypted data is taken from edited.
+        Returns the re-encrypted arrays by index and the updated aad"""
+        if self.file.filename_ext == ".off":
+            raise ValueError("Re-encryption is not supported for .off files.")
+        aad = self.file.read_aad()  # left in the file until re-encryption succeeds
+        response = AdaptiveCryptoSystemV3.reencrypt(
+            plnm=edited.file.cipher_plnm(images=aad.encrypt_images), k3=key, aad=aad
+        )
+        meshes, images = response.ciphertext
+        self.file.insert_cipher_arrays(meshes=meshes, images=images)
+        self.file.remove_aad()  # replaced by the updated aad
+        self.file.embed_aad(response.aad)
+        self.images_encrypted = aad.encrypt_images
+
+        return response
+
     def decrypt(
         self,
         k1: bytes | None = None,
         k2: bytes | None = None,
         k3: bytes | None = None,
+        target_level: VisualLevel | None = None,
+        meshes: Iterable[int] | None = None,
+        nodes: Iterable[int] | None = None,
     ) -> bool:
-        """Decrypt a file"""
+        """Decrypt a file to target_level, "clear", "low" or "mid" distortion.
+        Defaults to the clearest level the key allows, lower levels skip unneeded work.
+        "high" decrypts nothing, so it's rejected and the file is left as it was.
+        If meshes or nodes are given, only the glTF meshes, and the meshes of the node subtrees,
+        are decrypted with their textures. Requires a file encrypted with partial=True"""
         key = Key(k1=k1, k2=k2, k3=k3)
+        mesh_idxs, image_idxs = None, None
+        if meshes is not None or nodes is not None:
+            mesh_idxs, image_idxs = self.file.cipher_plnm_selection(meshes=meshes, nodes=nodes)
         aad = (
             self.file.aad
         )  # important we do this before extracting plnm, else aad extracted as well
 
-        plnm = AdaptiveCryptoSystemV3.decrypt(plnm=self.file.plnm, key=key, aad=aad)
-        self.file.insert_plnm(plnm)
+        try:
+            plnm = AdaptiveCryptoSystemV3.decrypt(
+                plnm=self.file.cipher_plnm(images=aad.encrypt_images, lazy=True),
+                key=key,
+                aad=aad,
+                target_level=target_level,
+                mesh_idxs=mesh_idxs,
+                image_idxs=image_idxs,
+            )
+        except Exception:
+            self.file.embed_aad(aad)  # nothing was decrypted, the file is still encrypted
+            raise
+
+        if aad.segments and aad.segments.get("per_array"):
+            # only decrypted arrays, and the leading meshes subkeys derive from, are loaded
+            self.file.insert_cipher_arrays(
+                meshes=_loaded(plnm.meshes),
+                images=_loaded(plnm.images) if aad.encrypt_images else {},
+            )
+        else:
+            self.file.insert_cipher_plnm(plnm, images=aad.encrypt_images)
+
+        if AdaptiveCryptoSystemV3.encrypted_arrays_remain(aad):
+            # updated with the arrays decrypted, to decrypt the rest later
+            self.file.embed_aad(aad)
+            self.images_encrypted = aad.encrypt_images
         return True
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, TypeVar
+
+import numpy as np
+from crypto_gltf import Asset
+from crypto_gltf.data.types import AAD_DATA, EncryptionResponse
+from crypto_gltf.encrypt.adaptive.types import Key, VisualLevel
+from crypto_gltf.io.plaintext.plnm import PlnM
+
+"""asyncio wrappers around Asset. File I/O, bit packing and AES-GCM run in an executor,
+the C library and cryptography release the GIL so threads run them in parallel"""
+
+T = TypeVar("T")
+
+
+@dataclass
+class AsyncAsset:
+    """Asset whose blocking methods are coroutines run in executor,
+    the event loop's default thread pool if None.
+    Calls on one AsyncAsset run one at a time, as they modify the same file data"""
+
+    asset: Asset
+    executor: Executor | None = None
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False, repr=False)
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        async with self._lock:
+            return await run_blocking(self.executor, func, *args, **kwargs)
+
+    @classmethod
+    async def load(
+        cls,
+        import_filepath: str,
+        use_mmap: bool = False,
+        executor: Executor | None = None,
+    ) -> AsyncAsset:
+        """Load file from import_filepath without blocking the event loop"""
+        asset = await run_blocking(executor, Asset.load, import_filepath, use_mmap=use_mmap)
+        return cls(asset=asset, executor=executor)
+
+    async def save(self, export_dir: str) -> str:
+        """Save file to export_dir"""
+        return await self._run(self.asset.save, export_dir)
+
+    async def patch(self, export_dir: str | None = None) -> str:
+        """Patch encrypted or decrypted data into the source .glb file, or a copy in export_dir"""
+        return await self._run(self.asset.patch, export_dir=export_dir)
+
+    async def encrypt(self, **kwargs: Any) -> EncryptionResponse[PlnM, AAD_DATA, Key]:
+        """Encrypt a file, takes the keyword arguments of Asset.encrypt"""
+        return await self._run(self.asset.encrypt, **kwargs)
+
+    async def reencrypt_changed(
+        self, edited: AsyncAsset, key: bytes
+    ) -> EncryptionResponse[
+        tuple[dict[int, np.ndarray], dict[int, np.ndarray]], AAD_DATA, Key
+    ]:
+        """Re-encrypt the arrays modified in edited, takes the arguments of
+        Asset.reencrypt_changed"""
+        return await self._run(self.asset.reencrypt_changed, edited.asset, key)
+
+    async def decrypt(
+        self,
+        k1: bytes | None = None,
+        k2: bytes | None = None,
+        k3: bytes | None = None,
+        target_level: VisualLevel | None = None,
+        meshes: Iterable[int] | None = None,
+        nodes: Iterable[int] | None = None,
+    ) -> bool:
+        """Decrypt a file, takes the arguments of Asset.decrypt"""
+        return await self._run(
+            self.asset.decrypt,
+            k1=k1,
+            k2=k2,
+            k3=k3,
+            target_level=target_level,
+            meshes=meshes,
+            nodes=nodes,
+        )
+
+
+async def run_blocking(
+    executor: Executor | None, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Run blocking func in executor, the event loop's default if None"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def gather_limited(aws: Iterable[Awaitable[T]], limit: int) -> list[T]:
+    """Await aws concurrently with at most limit in progress at a time.
+    Returns results in order, e.g. to load, encrypt and save many assets at once"""
+    if limit < 1:
+        raise ValueError("Concurrency limit must be at least 1.")
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(aw: Awaitable[T]) -> T:
+        async with semaphore:
+            return await aw
+
+    return list(await asyncio.gather(*(limited(aw) for aw in aws)))
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from base64 import urlsafe_b64decode as b64d
+from base64 import urlsafe_b64encode as b64e
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Literal, NamedTuple
+
+from crypto_gltf import Asset
+from crypto_gltf.data.types import FileType
+from crypto_gltf.encrypt.adaptive.utils import set_num_threads
+
+"""Encrypt or decrypt many assets across a process pool.
+Keys and per file results are written to a JSONL manifest as each file completes"""
+
+BatchMode = Literal["encrypt", "decrypt"]
+KEY_NAMES = ("k1", "k2", "k3")
+PENDING_PER_WORKER = 2  # tasks queued per worker, so large catalogs aren't all submitted at once
+
+
+class BatchTask(NamedTuple):
+    """One asset to encrypt or decrypt in a worker process"""
+
+    import_path: str
+    export_dir: str
+    mode: BatchMode
+    keys: dict[str, bytes]  # k3 to encrypt with, else random. k1, k2 or k3 to decrypt with
+    meshes_cipher_params: tuple[int, int, int] = (2, 2, 10)
+    images_cipher_params: tuple[int, int, int] = (1, 1, 6)
+    encrypt_images: bool = False
+    segment_size: int | None = None
+    use_mmap: bool = False
+
+
+def find_assets(source: str) -> Iterator[tuple[str, dict[str, bytes]]]:
+    """Yields (asset path, keys) of every asset under directory source,
+    or of every successful record of a JSONL manifest source.
+    Records of a results manifest yield their output path, so encrypted outputs can be decrypted"""
+    if os.path.isdir(source):
+        for path in sorted(Path(source).rglob("*")):
+            if path.suffix.lower() in FileType.ASSET.extensions:
+                yield str(path), {}
+        return
+
+    with open(source) as manifest:
+        for line in manifest:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("status", "ok") != "ok":
+                continue
+            keys = {name: b64d(record[name]) for name in KEY_NAMES if record.get(name)}
+            yield record.get("output", record["path"]), keys
+
+
+def batch_tasks(
+    source: str,
+    output_dir: str,
+    mode: BatchMode,
+    key: bytes | None = None,
+    **options: Any,
+) -> list[BatchTask]:
+    """Returns a task per asset of source, exporting into output_dir with the same relative layout.
+    key is used as k3 for assets without keys of their own. options are passed to BatchTask"""
+    assets = list(find_assets(source))
+    if not assets:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path, _ in assets])
+
+    tasks = []
+    for path, keys in assets:
+        if not keys and key is not None:
+            keys = {"k3": key}
+        relative_dir = os.path.relpath(os.path.dirname(os.path.abspath(path)), root)
+        export_dir = os.path.normpath(os.path.join(os.path.abspath(output_dir), relative_dir))
+        tasks.append(BatchTask(path, export_dir, mode, keys, **options))
+    return tasks
+
+
+def process_asset(task: BatchTask) -> dict[str, Any]:
+    """Encrypt or decrypt one asset and save it. Returns its manifest record,
+    failures are recorded rather than raised so one bad file doesn't stop a batch"""
+    record: dict[str, Any] = {"path": task.import_path, "mode": task.mode}
+    tic = perf_counter()
+    try:
+        asset = Asset.load(task.import_path, use_mmap=task.use_mmap)
+        if task.mode == "encrypt":
+            response = asset.encrypt(
+                meshes_cipher_params=task.meshes_cipher_params,
+                images_cipher_params=task.images_cipher_params,
+                key=task.keys.get("k3"),
+                encrypt_images=task.encrypt_images,
+                segment_size=task.segment_size,
+            )
+            for name in KEY_NAMES:
+                value = getattr(response.key, name)
+                if value is not None:
+                    record[name] = b64e(value).decode("ascii")
+        else:
+            asset.decrypt(**task.keys)
+
+        os.makedirs(task.export_dir, exist_ok=True)
+        record["output"] = asset.save(task.export_dir)
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(perf_counter() - tic, 3)
+    return record
+
+
+def _init_worker(max_memory: int | None) -> None:
+    """Bit pack on the worker's own thread, as the pool already uses every core,
+    and cap the worker's address space at max_memory bytes"""
+    set_num_threads(1)
+    if max_memory is not None:
+        import resource  # unix only
+
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+
+
+def run_batch(
+    tasks: Iterable[BatchTask],
+    manifest_path: str,
+    workers: int | None = None,
+    max_tasks_per_child: int | None = None,
+    max_memory: int | None = None,
+) -> dict[str, int]:
+    """Process tasks across a pool of worker processes, one per CPU by default,
+    writing each result to the JSONL manifest as it completes. Workers are replaced after
+    max_tasks_per_child tasks (python 3.11+) and limited to max_memory bytes each.
+    Returns the number of files per status"""
+    workers = workers or os.cpu_count() or 1
+    pool_options: dict[str, Any] = {}
+    if max_tasks_per_child is not None:
+        if sys.version_info < (3, 11):
+            raise ValueError("max_tasks_per_child requires python 3.11 or later.")
+        pool_options["max_tasks_per_child"] = max_tasks_per_child
+
+    counts = {"ok": 0, "error": 0}
+
+    def record(done: Iterable[Future]) -> None:
+        for future in done:
+            result = future.result()
+            counts[result["status"]] += 1
+            manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+
+    with open(manifest_path, "w") as manifest, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(max_memory,),
+        **pool_options,
+    ) as executor:
+        pending: set[Future] = set()
+        for task in tasks:
+            if len(pending) >= workers * PENDING_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                record(done)
+            pending.add(executor.submit(process_asset, task))
+        record(wait(pending).done)
+
+    return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Encrypt or decrypt a directory or JSONL manifest of assets in parallel."
+    )
+    parser.add_argument("mode", choices=["encrypt", "decrypt"])
+    parser.add_argument("source", help="directory of .glb/.gltf/.off files, or JSONL manifest")
+    parser.add_argument("output_dir")
+    parser.add_argument(
+        "--manifest", help="results manifest path, default output_dir/manifest.jsonl"
+    )
+    parser.add_argument("--key", help="urlsafe base64 k3 for files without their own keys")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-tasks-per-child", type=int, default=None)
+    parser.add_argument("--max-memory-mb", type=int, default=None)
+    parser.add_argument("--meshes-params", type=int, nargs=3, default=(2, 2, 10))
+    parser.add_argument("--images-params", type=int, nargs=3, default=(1, 1, 6))
+    parser.add_argument("--encrypt-images", action="store_true")
+    parser.add_argument("--segment-size", type=int, default=None)
+    parser.add_argument("--mmap", action="store_true", help="memory map glTF binary data")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    tasks = batch_tasks(
+        args.source,
+        args.output_dir,
+        args.mode,
+        key=b64d(args.key) if args.key else None,
+        meshes_cipher_params=tuple(args.meshes_params),
+        images_cipher_params=tuple(args.images_params),
+        encrypt_images=args.encrypt_images,
+        segment_size=args.segment_size,
+        use_mmap=args.mmap,
+    )
+    counts = run_batch(
+        tasks,
+        manifest_path=args.manifest or os.path.join(args.output_dir, "manifest.jsonl"),
+        workers=args.workers,
+        max_tasks_per_child=args.max_tasks_per_child,
+        max_memory=args.max_memory_mb << 20 if args.max_memory_mb else None,
+    )
+    print(f"{counts['ok']} of {len(tasks)} files {args.mode}ed, {counts['error']} failed")
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,6 +17,14 @@ void put_bits32(uint32_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, s
 void get_bits8(uint8_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, size_t slices, size_t start, size_t stop, uint32_t fill);
 void put_bits8(uint8_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, size_t slices, size_t start, size_t stop);
 
+void get_bits32_pqr(uint32_t *arr, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t rows, size_t cols, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop, uint32_t pfill, uint32_t qfill, uint32_t rfill);
+void put_bits32_pqr(uint32_t *arr, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t rows, size_t cols, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop);
+
+void get_bits32_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *buffer_arr, size_t *offsets, size_t start, size_t stop, uint32_t *fills);
+void put_bits32_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *buffer_arr, size_t *offsets, size_t start, size_t stop);
+void get_bits32_pqr_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t *p_offsets, size_t *q_offsets, size_t *r_offsets, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop, uint32_t *fills);
+void put_bits32_pqr_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t *p_offsets, size_t *q_offsets, size_t *r_offsets, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop);
+
 
 void get_bits32(uint32_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, size_t start, size_t stop, uint32_t fill)
 {
@@ -67,6 +75,109 @@ void put_bits32(uint32_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, s
     }
 }
 
+void get_bits32_pqr(uint32_t *arr, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t rows, size_t cols, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop, uint32_t pfill, uint32_t qfill, uint32_t rfill)
+{
+    // fused get_bits32 for the p, q and r blocks
+    // reads every element of arr once, appending each of its three bit slices to the matching buffer
+    // expects empty buffer arrays, arr must be of bit length 32
+
+    assertmsg((pstart < pstop) && (qstart < qstop) && (rstart < rstop), "Error: mis-ordered start/stop.");
+    assertmsg((pstop <= 32) && (qstop <= 32) && (rstop <= 32), "Error: stop must be between 1 and 32.");
+
+    Buffer p_buffer, q_buffer, r_buffer;
+    init_buffer(&p_buffer, p_buffer_arr, rows * cols * (pstop - pstart), pstop - pstart);
+    init_buffer(&q_buffer, q_buffer_arr, rows * cols * (qstop - qstart), qstop - qstart);
+    init_buffer(&r_buffer, r_buffer_arr, rows * cols * (rstop - rstart), rstop - rstart);
+
+    for (int i = 0; i < rows; i++)
+    {
+        for (int j = 0; j < cols; j++)
+        {
+            uint32_t element = arr[i * cols + j];
+            extend(&p_buffer, slice32(element, pstart, pstop));
+            extend(&q_buffer, slice32(element, qstart, qstop));
+            extend(&r_buffer, slice32(element, rstart, rstop));
+        }
+    }
+    fill_buffer(&p_buffer, pfill);
+    fill_buffer(&q_buffer, qfill);
+    fill_buffer(&r_buffer, rfill);
+}
+
+void put_bits32_pqr(uint32_t *arr, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t rows, size_t cols, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop)
+{
+    // fused put_bits32 for the p, q and r blocks
+    // inserts one block of each buffer into every element of matrix arr in a single pass
+    // arr must be of bit length 32
+
+    assertmsg((pstart < pstop) && (qstart < qstop) && (rstart < rstop), "Error: mis-ordered start/stop.");
+    assertmsg((pstop <= 32) && (qstop <= 32) && (rstop <= 32), "Error: stop must be between 1 and 32.");
+
+    Buffer p_buffer, q_buffer, r_buffer;
+    init_buffer(&p_buffer, p_buffer_arr, rows * cols * (pstop - pstart), pstop - pstart);
+    init_buffer(&q_buffer, q_buffer_arr, rows * cols * (qstop - qstart), qstop - qstart);
+    init_buffer(&r_buffer, r_buffer_arr, rows * cols * (rstop - rstart), rstop - rstart);
+
+    for (int i = 0; i < rows; i++)
+    {
+        for (int j = 0; j < cols; j++)
+        {
+            uint32_t element = arr[i * cols + j];
+            element ^= (slice32(element, pstart, pstop) ^ next_block(&p_buffer)) << (32 - pstop);
+            element ^= (slice32(element, qstart, qstop) ^ next_block(&q_buffer)) << (32 - qstop);
+            element ^= (slice32(element, rstart, rstop) ^ next_block(&r_buffer)) << (32 - rstop);
+            arr[i * cols + j] = element;
+        }
+    }
+}
+
+void get_bits32_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *buffer_arr, size_t *offsets, size_t start, size_t stop, uint32_t *fills)
+{
+    // get_bits32 for every array of arrs
+    // array k (of sizes[k] elements) is packed into buffer_arr starting at uint32 offset offsets[k]
+    // with padding value fills[k]
+
+    for (size_t k = 0; k < num_arrs; k++)
+    {
+        get_bits32(arrs[k], buffer_arr + offsets[k], sizes[k], 1, start, stop, fills[k]);
+    }
+}
+
+void put_bits32_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *buffer_arr, size_t *offsets, size_t start, size_t stop)
+{
+    // put_bits32 for every array of arrs
+    // array k (of sizes[k] elements) is filled from buffer_arr starting at uint32 offset offsets[k]
+
+    for (size_t k = 0; k < num_arrs; k++)
+    {
+        put_bits32(arrs[k], buffer_arr + offsets[k], sizes[k], 1, start, stop);
+    }
+}
+
+void get_bits32_pqr_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t *p_offsets, size_t *q_offsets, size_t *r_offsets, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop, uint32_t *fills)
+{
+    // get_bits32_pqr for every array of arrs
+    // fills holds the p, q and r padding values of each array, i.e. 3 * num_arrs values
+
+    for (size_t k = 0; k < num_arrs; k++)
+    {
+        get_bits32_pqr(arrs[k], p_buffer_arr + p_offsets[k], q_buffer_arr + q_offsets[k], r_buffer_arr + r_offsets[k],
+                       sizes[k], 1, pstart, pstop, qstart, qstop, rstart, rstop,
+                       fills[3 * k], fills[3 * k + 1], fills[3 * k + 2]);
+    }
+}
+
+void put_bits32_pqr_batch(uint32_t **arrs, size_t *sizes, size_t num_arrs, uint32_t *p_buffer_arr, uint32_t *q_buffer_arr, uint32_t *r_buffer_arr, size_t *p_offsets, size_t *q_offsets, size_t *r_offsets, size_t pstart, size_t pstop, size_t qstart, size_t qstop, size_t rstart, size_t rstop)
+{
+    // put_bits32_pqr for every array of arrs
+
+    for (size_t k = 0; k < num_arrs; k++)
+    {
+        put_bits32_pqr(arrs[k], p_buffer_arr + p_offsets[k], q_buffer_arr + q_offsets[k], r_buffer_arr + r_offsets[k],
+                       sizes[k], 1, pstart, pstop, qstart, qstop, rstart, rstop);
+    }
+}
+
 void get_bits8(uint8_t *arr, uint32_t *buffer_arr, size_t rows, size_t cols, size_t slices, size_t start, size_t stop, uint32_t fill)
 {
     // for every element of arr (a matrix), appends bit slice between start and stop to the buffer buffer_arr
@@ -1,9 +1,9 @@
+from collections.abc import Callable, Iterable, Iterator, MutableMapping, Sequence
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Generic, TypeVar
 
 import numpy as np
 from crypto_gltf.data.types import Composition, JSONDict
-from PIL import Image
 from pydantic import BaseModel, ConfigDict, model_validator
 
 
@@ -11,8 +11,9 @@ from pydantic import BaseModel, ConfigDict, model_validator
 class OffData:
     model_config = ConfigDict(arbitrary_types_allowed=True)
     verts: type[np.ndarray]
-    faces: list[Any]
+    faces: type[np.ndarray] | list[Any]  # (n, 3) array for triangle meshes
     colors: type[np.ndarray]
+    num_used_vertices: int | None = None  # largest face vertex index + 1
 
     @model_validator(mode="before")
     @classmethod
@@ -23,12 +24,80 @@ class OffData:
         return data
 
 
+V = TypeVar("V")
+
+
+class LazyDict(MutableMapping[int, V], Generic[V]):
+    """Dict whose values are loaded on first access by loader(key), then cached"""
+
+    def __init__(self, keys: Iterable[int], loader: Callable[[int], V]):
+        self._keys = list(keys)
+        self._loader = loader
+        self._values: dict[int, V] = {}
+
+    def __getitem__(self, key: int) -> V:
+        if key not in self._values:
+            if key not in self._keys:
+                raise KeyError(key)
+            self._values[key] = self._loader(key)
+        return self._values[key]
+
+    def __setitem__(self, key: int, value: V) -> None:
+        if key not in self._keys:
+            self._keys.append(key)
+        self._values[key] = value
+
+    def __delitem__(self, key: int) -> None:
+        self._keys.remove(key)
+        self._values.pop(key, None)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def is_loaded(self, key: int) -> bool:
+        """True if the value of key has been loaded or set"""
+        return key in self._values
+
+
+class LazySequence(Sequence[V], Generic[V]):
+    """List of length items, each loaded on first access by loader(index), then cached.
+    Items can be replaced, but not added or removed"""
+
+    def __init__(self, length: int, loader: Callable[[int], V]):
+        self._length = length
+        self._loader = loader
+        self._values: dict[int, V] = {}
+
+    def __getitem__(self, index: int) -> V:  # type: ignore[override]
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        if index not in self._values:
+            self._values[index] = self._loader(index)
+        return self._values[index]
+
+    def __setitem__(self, index: int, value: V) -> None:
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        self._values[index] = value
+
+    def __len__(self) -> int:
+        return self._length
+
+    def is_loaded(self, index: int) -> bool:
+        """True if the item at index has been loaded or set"""
+        return index in self._values
+
+
 @dataclass
 class Gltf2Data:
     gltf: JSONDict
-    images: dict[int, Image.Image]
-    accessors: dict[int, np.ndarray]
+    images: MutableMapping[int, Any]  # PIL images, untyped so PIL is imported on first use
+    accessors: MutableMapping[int, np.ndarray]
     is_glb: bool
+    source: Any = None  # GlTF2Importer of the source file, for export of data never loaded
 
 
 class AssetFileDataType:
@@ -151,6 +151,7 @@ class AAD_DATA(BaseModel):
     encrypt_images: bool
     meshes_params: JSONDict
     images_params: JSONDict
+    segments: JSONDict | None = None  # segment table of segmented GCM mode
 
 
 # ENCRYPTION BASE TYPES
@@ -5,13 +5,18 @@ import secrets
 import time
 from base64 import urlsafe_b64decode as b64d
 from base64 import urlsafe_b64encode as b64e
+from collections.abc import Iterable
+from concurrent.futures import Executor
 
 from crypto_gltf.data.types import EncryptionResponse
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import InvalidToken
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from pydantic import BaseModel
 
+CHUNK_SIZE = 1 << 20  # bytes fed to the cipher per update_into call
+
 
 class AAD(BaseModel):
     """Additional associated data"""
@@ -63,6 +68,16 @@ def aes_gcm_decrypt(ciphertext: bytes, aad_b64: bytes, key: bytes, ttl=None) ->
     algorithm = algorithms.AES(key)
     aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
 
+    _check_ttl(aad, ttl)
+
+    cipher = Cipher(algorithm, modes.GCM(aad.iv, aad.tag), backend=default_backend())
+    decryptor = cipher.decryptor()
+    decryptor.authenticate_additional_data(aad.timestamp)
+    return decryptor.update(ciphertext) + decryptor.finalize()
+
+
+def _check_ttl(aad: AAD, ttl: int | None) -> None:
+    """Raise InvalidToken if aad timestamp is outside of ttl"""
     if ttl is not None:
         current_time = int(time.time())
         time_encrypted = int.from_bytes(aad.timestamp, "big")
@@ -70,7 +85,309 @@ def aes_gcm_decrypt(ciphertext: bytes, aad_b64: bytes, key: bytes, ttl=None) ->
             # too old or created well before our current time + 1 h to account for clock skew
             raise InvalidToken
 
+
+def _update_into(context, data: memoryview, out: memoryview, chunk_size: int) -> None:
+    """Feed data through cipher context in chunks, writing the output into out.
+    out may be data itself, in which case the data is transformed in place"""
+    if len(out) < len(data):
+        raise ValueError(f"Output buffer of {len(out)} bytes too short for {len(data)} bytes.")
+    slack = algorithms.AES.block_size // 8 - 1  # room update_into may require past the chunk
+
+    for pos in range(0, len(data), chunk_size):
+        chunk = data[pos : pos + chunk_size]
+        if len(out) - pos >= len(chunk) + slack:
+            written = context.update_into(chunk, out[pos:])
+        else:
+            # final chunk with too little room left in out, small temporary copy
+            written = len(chunk)
+            out[pos : pos + written] = context.update(chunk)
+        if written != len(chunk):
+            raise Exception(f"Cipher wrote {written} bytes, expected {len(chunk)}.")
+
+
+def aes_gcm_encrypt_into(
+    message: memoryview, out: memoryview, key: bytes, chunk_size: int = CHUNK_SIZE
+) -> bytes:
+    """Streaming AES-GCM encrypt of message into the preallocated buffer out, returns the b64 aad.
+    out may be message itself to encrypt in place"""
+
+    current_time = int(time.time()).to_bytes(8, "big")
+    algorithm = algorithms.AES(key)
+    iv = secrets.token_bytes(algorithm.block_size // 8)
+    cipher = Cipher(algorithm, modes.GCM(iv), backend=default_backend())
+    encryptor = cipher.encryptor()
+    encryptor.authenticate_additional_data(current_time)
+
+    _update_into(encryptor, memoryview(message), memoryview(out), chunk_size)
+    encryptor.finalize()
+    aad = b64e(current_time + iv + encryptor.tag)
+
+    assert len(aad) == 56
+
+    return aad
+
+
+def aes_gcm_decrypt_into(
+    ciphertext: memoryview,
+    out: memoryview,
+    aad_b64: bytes,
+    key: bytes,
+    ttl=None,
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    """Streaming AES-GCM decrypt of ciphertext into the preallocated buffer out.
+    out may be ciphertext itself to decrypt in place. Raises InvalidTag if authentication fails,
+    in which case the contents of out must be discarded"""
+
+    algorithm = algorithms.AES(key)
+    aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
+    _check_ttl(aad, ttl)
+
     cipher = Cipher(algorithm, modes.GCM(aad.iv, aad.tag), backend=default_backend())
     decryptor = cipher.decryptor()
     decryptor.authenticate_additional_data(aad.timestamp)
-    return decryptor.update(ciphertext) + decryptor.finalize()
+    _update_into(decryptor, memoryview(ciphertext), memoryview(out), chunk_size)
+    decryptor.finalize()
+
+
+def _segment_iv(iv: bytes, index: int) -> bytes:
+    """Derive the unique IV of segment index from the message IV"""
+    counter = int.from_bytes(iv[8:], "big") ^ index
+    return iv[:8] + counter.to_bytes(len(iv) - 8, "big")
+
+
+def _segment_aad(timestamp: bytes, index: int, num_segments: int) -> bytes:
+    """Authenticated data of segment index, binds the segment to its position and count"""
+    return timestamp + index.to_bytes(8, "big") + num_segments.to_bytes(8, "big")
+
+
+def _segments_table_tag(
+    key: bytes, iv: bytes, timestamp: bytes, tags: list[bytes], tag: bytes | None = None
+) -> bytes:
+    """Tag authenticating the segment tag table, uses IV index num_segments.
+    Verifies against tag when provided, raising InvalidTag on mismatch"""
+    num_segments = len(tags)
+    mode = modes.GCM(_segment_iv(iv, num_segments), tag)
+    cipher = Cipher(algorithms.AES(key), mode, backend=default_backend())
+    context = cipher.encryptor() if tag is None else cipher.decryptor()
+    context.authenticate_additional_data(
+        _segment_aad(timestamp, num_segments, num_segments) + b"".join(tags)
+    )
+    context.finalize()
+    return context.tag if tag is None else tag
+
+
+def _segment_ranges(length: int, segment_size: int) -> list[tuple[int, int]]:
+    """Returns (start, stop) byte range of each segment of a message of length bytes"""
+    if segment_size < 1:
+        raise ValueError(f"Segment size must be positive, received {segment_size}.")
+    return [
+        (start, min(start + segment_size, length))
+        for start in range(0, max(length, 1), segment_size)
+    ]
+
+
+def aes_gcm_encrypt_segments(
+    message: memoryview,
+    out: memoryview,
+    key: bytes,
+    segment_size: int | None = None,
+    executor: Executor | None = None,
+    ranges: list[tuple[int, int]] | None = None,
+) -> tuple[bytes, list[bytes]]:
+    """AES-GCM encrypt message into out as independent segments of segment_size bytes,
+    or of the (start, stop) byte ranges covering message if given,
+    each with an IV derived from one random message IV, processed in parallel on executor.
+    Returns the b64 aad, whose tag authenticates the segment tag table, and the segment tags"""
+
+    current_time = int(time.time()).to_bytes(8, "big")
+    algorithm = algorithms.AES(key)
+    iv = secrets.token_bytes(algorithm.block_size // 8)
+    message, out = memoryview(message), memoryview(out)
+    if ranges is None:
+        assert segment_size is not None
+        ranges = _segment_ranges(len(message), segment_size)
+
+    def encrypt_segment(index: int) -> bytes:
+        start, stop = ranges[index]
+        cipher = Cipher(
+            algorithms.AES(key), modes.GCM(_segment_iv(iv, index)), backend=default_backend()
+        )
+        encryptor = cipher.encryptor()
+        encryptor.authenticate_additional_data(
+            _segment_aad(current_time, index, len(ranges))
+        )
+        _update_into(encryptor, message[start:stop], out[start:stop], CHUNK_SIZE)
+        encryptor.finalize()
+        return encryptor.tag
+
+    if executor is None or len(ranges) == 1:
+        tags = [encrypt_segment(index) for index in range(len(ranges))]
+    else:
+        tags = list(executor.map(encrypt_segment, range(len(ranges))))
+
+    table_tag = _segments_table_tag(key, iv, current_time, tags)
+    aad = b64e(current_time + iv + table_tag)
+
+    assert len(aad) == 56
+
+    return aad, tags
+
+
+def aes_gcm_decrypt_segments(
+    ciphertext: memoryview,
+    out: memoryview,
+    aad_b64: bytes,
+    tags: list[bytes],
+    key: bytes,
+    segment_size: int | None = None,
+    executor: Executor | None = None,
+    ttl=None,
+    ranges: list[tuple[int, int]] | None = None,
+    indices: Iterable[int] | None = None,
+    ivs: list[bytes] | None = None,
+) -> None:
+    """Decrypt segments encrypted by aes_gcm_encrypt_segments into out, in parallel on executor.
+    Only the segments indices are decrypted if given, the rest of out is left untouched.
+    ivs are the segment IVs of a message updated by aes_gcm_reencrypt_segments.
+    Raises InvalidTag if the segment table or any decrypted segment fails authentication,
+    in which case the contents of out must be discarded"""
+
+    algorithm = algorithms.AES(key)
+    aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
+    _check_ttl(aad, ttl)
+
+    ciphertext, out = memoryview(ciphertext), memoryview(out)
+    if ranges is None:
+        assert segment_size is not None
+        ranges = _segment_ranges(len(ciphertext), segment_size)
+    if len(ranges) != len(tags) or (ivs is not None and len(ivs) != len(tags)):
+        raise InvalidTag
+    _segments_table_tag(key, aad.iv, aad.timestamp, tags, tag=aad.tag)
+    iv_of = (lambda index: _segment_iv(aad.iv, index)) if ivs is None else ivs.__getitem__
+
+    def decrypt_segment(index: int) -> None:
+        start, stop = ranges[index]
+        cipher = Cipher(
+            algorithms.AES(key),
+            modes.GCM(iv_of(index), tags[index]),
+            backend=default_backend(),
+        )
+        decryptor = cipher.decryptor()
+        decryptor.authenticate_additional_data(
+            _segment_aad(aad.timestamp, index, len(ranges))
+        )
+        _update_into(decryptor, ciphertext[start:stop], out[start:stop], CHUNK_SIZE)
+        decryptor.finalize()
+
+    indices = range(len(ranges)) if indices is None else list(indices)
+    if executor is None or len(indices) == 1:
+        for index in indices:
+            decrypt_segment(index)
+    else:
+        list(executor.map(decrypt_segment, indices))
+
+
+def aes_gcm_decrypt_prefix(
+    ciphertext: memoryview,
+    aad_b64: bytes,
+    key: bytes,
+    ranges: list[tuple[int, int]] | None = None,
+    ivs: list[bytes] | None = None,
+) -> bytes:
+    """Decrypt ciphertext, the first bytes of a message encrypted by aes_gcm_encrypt_into,
+    or by aes_gcm_encrypt_segments as segments of the byte ranges if given,
+    with the segment IVs ivs if updated by aes_gcm_reencrypt_segments.
+    GCM is a counter mode, so the prefix decrypts without the rest of the message,
+    but it is NOT authenticated. Only use it where a later authenticated decryption fails
+    if the prefix was wrong, e.g. to derive the key of the next block"""
+
+    algorithm = algorithms.AES(key)
+    aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
+    ciphertext = memoryview(ciphertext)
+
+    if ranges is None:
+        ranges, ivs = [(0, len(ciphertext))], [aad.iv]
+    elif ivs is None:
+        ivs = [_segment_iv(aad.iv, index) for index in range(len(ranges))]
+
+    plaintext = bytearray()
+    for (start, stop), iv in zip(ranges, ivs):
+        if start >= len(ciphertext):
+            break
+        # no tag and no finalize, the segment is never authenticated
+        decryptor = Cipher(algorithm, modes.GCM(iv), backend=default_backend()).decryptor()
+        plaintext += decryptor.update(ciphertext[start : min(stop, len(ciphertext))])
+    return bytes(plaintext)
+
+
+def aes_gcm_verify_segments(aad_b64: bytes, tags: list[bytes], key: bytes) -> None:
+    """Authenticate the segment tag table of aes_gcm_encrypt_segments with key,
+    without decrypting any segment. Raises InvalidTag if it fails, e.g. key is wrong"""
+    algorithm = algorithms.AES(key)
+    aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
+    _segments_table_tag(key, aad.iv, aad.timestamp, tags, tag=aad.tag)
+
+
+def aes_gcm_reencrypt_segments(
+    message: memoryview,
+    out: memoryview,
+    aad_b64: bytes,
+    tags: list[bytes],
+    key: bytes,
+    ranges: list[tuple[int, int]],
+    indices: Iterable[int],
+    ivs: list[bytes] | None = None,
+    executor: Executor | None = None,
+) -> tuple[bytes, list[bytes], list[bytes]]:
+    """Encrypt the segments indices of message into out, replacing those segments of
+    a message encrypted by aes_gcm_encrypt_segments, whose other segments are kept as they are.
+    ivs are its segment IVs if it was re-encrypted before, else derived from its message IV.
+    An IV must never encrypt twice, so each replaced segment gets a new random IV and the table
+    a new message IV, the timestamp is kept as the kept segments authenticate it.
+    Raises InvalidTag if the existing table fails authentication with key.
+    Returns the b64 aad, the segment tags and the segment IVs"""
+
+    algorithm = algorithms.AES(key)
+    aad = AAD.b64d(aad_b64=aad_b64, block_size=algorithm.block_size)
+    if len(ranges) != len(tags) or (ivs is not None and len(ivs) != len(tags)):
+        raise InvalidTag
+    _segments_table_tag(key, aad.iv, aad.timestamp, tags, tag=aad.tag)
+
+    message, out = memoryview(message), memoryview(out)
+    iv_size = algorithm.block_size // 8
+    indices = list(indices)
+    tags = list(tags)
+    ivs = (
+        [_segment_iv(aad.iv, index) for index in range(len(ranges))]
+        if ivs is None
+        else list(ivs)
+    )
+    for index in indices:
+        ivs[index] = secrets.token_bytes(iv_size)
+
+    def encrypt_segment(index: int) -> bytes:
+        start, stop = ranges[index]
+        cipher = Cipher(algorithms.AES(key), modes.GCM(ivs[index]), backend=default_backend())
+        encryptor = cipher.encryptor()
+        encryptor.authenticate_additional_data(
+            _segment_aad(aad.timestamp, index, len(ranges))
+        )
+        _update_into(encryptor, message[start:stop], out[start:stop], CHUNK_SIZE)
+        encryptor.finalize()
+        return encryptor.tag
+
+    if executor is None or len(indices) <= 1:
+        new_tags = [encrypt_segment(index) for index in indices]
+    else:
+        new_tags = list(executor.map(encrypt_segment, indices))
+    for index, tag in zip(indices, new_tags):
+        tags[index] = tag
+
+    iv = secrets.token_bytes(iv_size)
+    table_tag = _segments_table_tag(key, iv, aad.timestamp, tags)
+    new_aad = b64e(aad.timestamp + iv + table_tag)
+
+    assert len(new_aad) == 56
+
+    return new_aad, tags, ivs
@@ -1,18 +1,17 @@
+import hashlib
 import secrets
 
 import numpy as np
-from crypto_gltf.encrypt.adaptive.types import (
-    AdaptiveCipherParams,
-    BlockSelection,
-    BufferView,
-    Key,
-)
-from crypto_gltf.encrypt.adaptive.utils import get_bits
+from crypto_gltf.encrypt.adaptive.types import AdaptiveCipherParams, BlockSelection, Key
+from crypto_gltf.encrypt.adaptive.utils import block_offsets, get_bits_batch, get_executor
+from crypto_gltf.profiling import span
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from loguru import logger
 
+DIGEST_SIZE = 16  # bytes of each array digest
+
 
 def aes_sha(sblock: bytes, ki: bytes) -> bytes:
     """Generate subsequent subkey k_(i-1) using AES followed by sha"""
@@ -48,6 +47,35 @@ def get_source_arrays(plnm_arrs: list[np.ndarray], min_size: int) -> list[np.nda
     return source_arrays
 
 
+def get_sblock(
+    source_arrays: list[np.ndarray], start: int, stop: int, length: int = 32
+) -> bytes:
+    """Returns the first length bytes of the combined block buffer of source_arrays,
+    packed directly into one preallocated buffer. Only the leading values reaching
+    those bytes are packed, not the whole arrays"""
+    bits = stop - start
+    remaining = length * 8
+    prefixes: list[np.ndarray] = []
+    for arr in source_arrays:
+        if remaining <= 0:
+            break
+        if arr.size * bits >= remaining:
+            # a multiple of 32 values packs into whole words, like the whole array's prefix
+            count = -(-remaining // bits)
+            prefixes.append(arr.reshape(-1)[: count + -count % 32].reshape(-1, 1))
+            break
+        prefixes.append(arr)
+        remaining -= -(-arr.size * bits // 32) * 32  # each array's buffer is whole words
+    source_arrays = prefixes
+
+    offsets = block_offsets(
+        [arr.shape for arr in source_arrays], [(start, stop)] * len(source_arrays)
+    )
+    buffer = np.zeros(int(offsets[-1]), dtype=np.uint32)
+    get_bits_batch(source_arrays, buffer, offsets, start, stop)
+    return memoryview(buffer).cast("B")[:length].tobytes()
+
+
 def get_min_size_plaintext(
     params: AdaptiveCipherParams, selection: BlockSelection
 ) -> int:
@@ -69,33 +97,18 @@ def generate_keys(
         min_size=min_size,
     )
 
-    s2, s3 = bytearray(b""), bytearray(b"")
-
-    for arr in source_arrays:
-
-        buffer_view = BufferView.from_shape(shape=arr.shape, params=params)
-
-        q_buffer, r_buffer = (
-            buffer_view.q_buffer,
-            buffer_view.r_buffer,
-        )
-        get_bits(arr, q_buffer, params.qstart, params.qstop)
-        get_bits(arr, r_buffer, params.rstart, params.rstop)
-
-        s2.extend(q_buffer.tobytes())
-        s3.extend(r_buffer.tobytes())
-
-    s3 = s3[:32]
-    s2 = s2[:32]
+    with span("key_derivation", sum(arr.nbytes for arr in source_arrays)):
+        s2 = get_sblock(source_arrays, params.qstart, params.qstop)
+        s3 = get_sblock(source_arrays, params.rstart, params.rstop)
 
-    if k3:
-        assert len(k3) == 32
-        logger.info("User specified key detected, using key provided.")
-    else:
-        k3 = secrets.token_bytes(32)
+        if k3:
+            assert len(k3) == 32
+            logger.info("User specified key detected, using key provided.")
+        else:
+            k3 = secrets.token_bytes(32)
 
-    k2 = aes_sha(sblock=s3, ki=k3)
-    k1 = aes_sha(sblock=s2, ki=k2)
+        k2 = aes_sha(sblock=s3, ki=k3)
+        k1 = aes_sha(sblock=s2, ki=k2)
 
     return Key(k1=k1, k2=k2, k3=k3)
 
@@ -115,13 +128,25 @@ def get_subkey(
     start = params.start(block)
     stop = params.stop(block)
 
-    si = bytearray(b"")
-    for arr in source_arrays:
-        buffer_view = BufferView.from_shape(arr.shape, params=params)
-        buffer = buffer_view.buffer(block)
-        get_bits(arr, buffer, start, stop)
-        si.extend(buffer.tobytes())
+    with span("key_derivation", sum(arr.nbytes for arr in source_arrays)):
+        si = get_sblock(source_arrays, start, stop)
 
-    ki_minus_1 = aes_sha(sblock=si[:32], ki=ki)
+        ki_minus_1 = aes_sha(sblock=si, ki=ki)
 
     return ki_minus_1
+
+
+def array_digest(arr: np.ndarray, key: bytes) -> bytes:
+    """Keyed BLAKE2b digest of the shape, dtype and values of arr.
+    Detects modified arrays of an encrypted asset, keyed so the digest reveals nothing
+    of the plaintext to anyone without key"""
+    digest = hashlib.blake2b(key=key, digest_size=DIGEST_SIZE, person=b"crypto-gltf")
+    digest.update(f"{arr.dtype.str}{arr.shape}".encode())
+    digest.update(np.ascontiguousarray(arr).reshape(-1).view(np.uint8))
+    return digest.digest()
+
+
+def array_digests(arrs: list[np.ndarray], key: bytes) -> list[bytes]:
+    """array_digest of every array, hashed in parallel as hashlib releases the GIL"""
+    with span("digest", sum(arr.nbytes for arr in arrs)):
+        return list(get_executor().map(lambda arr: array_digest(arr, key), arrs))
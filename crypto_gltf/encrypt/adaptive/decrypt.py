@@ -1,93 +1,248 @@
-from time import time
+from base64 import urlsafe_b64decode as b64d
+from collections.abc import Collection
 
 import numpy as np
+from crypto_gltf.data.types import JSONDict
 from crypto_gltf.encrypt.adaptive.base import AdaptiveBaseModel
-from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import aes_gcm_decrypt
+from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import (
+    aes_gcm_decrypt_into,
+    aes_gcm_decrypt_prefix,
+    aes_gcm_decrypt_segments,
+)
+from crypto_gltf.encrypt.adaptive.cryptography.key_gen import get_subkey
 from crypto_gltf.encrypt.adaptive.types import (
+    BLOCK_INDEX,
     AdaptiveCipherParams,
+    BlockLayout,
     BlockSelection,
-    BufferView,
     Key,
 )
-from crypto_gltf.encrypt.adaptive.utils import get_bits, put_bits
+from crypto_gltf.encrypt.adaptive.utils import (
+    block_offsets,
+    get_bits_batch,
+    get_executor,
+    put_bits_batch,
+)
+from crypto_gltf.profiling import span
 from loguru import logger
 
+# values of each array decrypted to derive a subkey without decrypting the whole block.
+# A multiple of 32, so a prefix packs into whole words, above the 257 a subkey may need
+PREFIX_ELEMENTS = 1 << 10
 
-class AdaptiveDecryptionModel(AdaptiveBaseModel):
 
-    @staticmethod
-    def _decrypt(
-        data: list[tuple[np.ndarray, AdaptiveCipherParams]],
-        key: Key,
-        selection: BlockSelection,
-        aad: np.ndarray,
-    ) -> list[tuple[np.ndarray, AdaptiveCipherParams]]:
-        tic = time()
+def segment_ivs(segments: JSONDict, block: str) -> list[bytes] | None:
+    """Segment IVs of block stored in the segment table by re-encryption, None if derived"""
+    ivs = segments.get("ivs")
+    return None if ivs is None else [b64d(iv) for iv in ivs[block]]
 
-        block = selection.single_block
 
-        assert len(aad) == len(data) + 14  # +14 for 14 rows of aad data
+class AdaptiveDecryptionModel(AdaptiveBaseModel):
+
+    @staticmethod
+    def _scratch_buffer(
+        layout: BlockLayout, selections: list[BlockSelection]
+    ) -> np.ndarray:
+        """Returns a uint32 buffer large enough for the combined block buffer of every selection,
+        so successive _decrypt passes share one allocation"""
+        length = max(layout.length(selection.single_block) for selection in selections)
+        return np.empty(length, dtype=np.uint32)
 
+    @staticmethod
+    def _block_key(
+        key: Key, selection: BlockSelection, aad: np.ndarray
+    ) -> tuple[bytes, np.ndarray]:
+        """Returns the subkey of the selected block and its column of aad"""
         match selection.single_block:
             case "p":
                 assert key.k1  # check key exists
-                subkey = key.k1
-                padding_arr = aad[:, 0]
+                return key.k1, aad[:, 0]
             case "q":
                 assert key.k2  # check key exists
-                subkey = key.k2
-                padding_arr = aad[:, 1]
+                return key.k2, aad[:, 1]
             case "r":
                 assert key.k3  # check key exists
-                subkey = key.k3
-                padding_arr = aad[:, 2]
+                return key.k3, aad[:, 2]
             case _:
                 raise Exception("No blocks selected.")
 
-        aad_b64 = padding_arr[-14:].tobytes()
+    @staticmethod
+    def _decrypt(
+        data: list[tuple[np.ndarray, AdaptiveCipherParams]],
+        key: Key,
+        selection: BlockSelection,
+        aad: np.ndarray,
+        segments: JSONDict | None = None,
+        scratch: np.ndarray | None = None,
+        layout: BlockLayout | None = None,
+        arrays: list[int] | None = None,
+    ) -> list[tuple[np.ndarray, AdaptiveCipherParams]]:
+        """Decrypt the selected block of data in place,
+        segments is the segment table if data was encrypted in segmented GCM mode.
+        The combined block buffer is a view of scratch if given, else newly allocated.
+        layout is computed from data if not given.
+        arrays are the sorted indices of data to decrypt, every array if None.
+        Selecting arrays requires data encrypted with per array segments"""
+        block = selection.single_block
 
-        combined_sblocks = bytearray(b"")
-        for idx, (arr, params) in enumerate(data):
+        assert len(aad) == len(data) + 14  # +14 for 14 rows of aad data
 
-            start = params.start(block)
-            stop = params.stop(block)
-            buffer_view = BufferView.from_shape(shape=arr.shape, params=params)
-            buffer = buffer_view.buffer(block=block)
-            get_bits(arr, buffer, start, stop)
-            buffer[-1] = padding_arr[idx]
-            combined_sblocks.extend(buffer.tobytes())
+        subkey, padding_arr = AdaptiveDecryptionModel._block_key(key, selection, aad)
+        aad_b64 = padding_arr[-14:].tobytes()
 
-        toc = time() - tic
+        arrs = [arr for arr, _ in data]
+        if layout is None:
+            layout = BlockLayout.from_data(data)
+        offsets = layout.block_offsets(block)
+        block_idx = BLOCK_INDEX[block]
+
+        runs = layout.runs
+        indices = None  # segments to decrypt, every one if None
+        if arrays is not None:
+            if segments is None or not segments.get("per_array"):
+                raise Exception("Arrays can only be selected if encrypted with per array segments.")
+            runs = layout.select(arrays)
+            ranges = layout.segment_ranges(block, segments["segment_size"], per_array=True)
+            indices = layout.segment_indices(block, ranges, arrays)
+        nbytes = sum(arr.nbytes for start, stop, _ in runs for arr in arrs[start:stop])
+
+        if scratch is None:
+            combined_sblocks = np.zeros(int(offsets[-1]), dtype=np.uint32)
+        else:
+            if len(scratch) < offsets[-1]:
+                raise Exception(f"Scratch buffer too short for {block} block.")
+            combined_sblocks = scratch[: int(offsets[-1])]
+            if arrays is None:
+                combined_sblocks.fill(0)  # get_bits packs into a zeroed buffer
+        if arrays is not None:
+            for start, stop, _ in runs:
+                combined_sblocks[offsets[start] : offsets[stop]] = 0
+        with span("bit_extraction", nbytes):
+            for start, stop, slices in runs:
+                get_bits_batch(
+                    arrs[start:stop],
+                    combined_sblocks,
+                    offsets[start : stop + 1],
+                    *slices[block_idx],
+                )
+        selected = slice(None) if arrays is None else arrays
+        combined_sblocks[offsets[1:][selected] - 1] = padding_arr[: len(data)][selected]
 
         try:
-            decrypted_data = aes_gcm_decrypt(
-                ciphertext=combined_sblocks, aad_b64=aad_b64, key=subkey
-            )
+            # decrypt in place, combined_sblocks is discarded if authentication fails
+            with span("gcm", combined_sblocks.nbytes):
+                if segments is None:
+                    aes_gcm_decrypt_into(
+                        ciphertext=memoryview(combined_sblocks).cast("B"),
+                        out=memoryview(combined_sblocks).cast("B"),
+                        aad_b64=aad_b64,
+                        key=subkey,
+                    )
+                else:
+                    aes_gcm_decrypt_segments(
+                        ciphertext=memoryview(combined_sblocks).cast("B"),
+                        out=memoryview(combined_sblocks).cast("B"),
+                        aad_b64=aad_b64,
+                        tags=[b64d(tag) for tag in segments["tags"][block]],
+                        key=subkey,
+                        executor=get_executor(),
+                        ranges=layout.segment_ranges(
+                            block, segments["segment_size"], segments.get("per_array", False)
+                        ),
+                        indices=indices,
+                        ivs=segment_ivs(segments, block),
+                    )
         except:
             raise Exception("Invalid key.")
 
-        tic = time()
-
-        decrypted_data_arr = np.frombuffer(decrypted_data, dtype=np.uint32)
-
-        offset = 0
-        for arr, params in data:
-            buffer_view = BufferView.from_shape(shape=arr.shape, params=params)
-            start = params.start(block)
-            stop = params.stop(block)
+        decrypted_data_arr = combined_sblocks
 
-            put_bits(
-                arr,
-                decrypted_data_arr[offset : offset + buffer_view.bufflen(block=block)],
-                start,
-                stop,
-            )
-            offset += buffer_view.bufflen(block=block)
+        with span("bit_insertion", nbytes):
+            for start, stop, slices in runs:
+                put_bits_batch(
+                    arrs[start:stop],
+                    decrypted_data_arr,
+                    offsets[start : stop + 1],
+                    *slices[block_idx],
+                )
 
-        if not offset == len(decrypted_data_arr):
+        if not offsets[-1] == len(decrypted_data_arr):
             raise Exception(f"Entire plain text has not been used")
 
-        # logger.debug(
-        #     f"Byte retrieval/insertion and reshaping took {time()-tic + toc} seconds"
-        # )
         return data
+
+    @staticmethod
+    def _prefix_arrays(sizes: list[int]) -> int:
+        """Number of leading float mesh arrays, of sizes, that _derive_subkey reads:
+        whole arrays up to the first larger than PREFIX_ELEMENTS or reaching it in total"""
+        total = 0
+        for count, size in enumerate(sizes, 1):
+            total += size
+            if size > PREFIX_ELEMENTS or total > PREFIX_ELEMENTS:
+                return count
+        return len(sizes)
+
+    @staticmethod
+    def _derive_subkey(
+        data: list[tuple[np.ndarray, AdaptiveCipherParams]],
+        key: Key,
+        selection: BlockSelection,
+        aad: np.ndarray,
+        layout: BlockLayout,
+        segments: JSONDict | None = None,
+        decrypted: Collection[int] = (),
+    ) -> bytes:
+        """Returns the subkey below the selected block's, i.e. k2 from k3 for the r block,
+        decrypting only the first PREFIX_ELEMENTS values of the arrays it is derived from.
+        Equal to get_subkey of the decrypted arrays, without decrypting the rest of the block.
+        The prefix isn't authenticated, a wrong subkey fails decryption of the next block.
+        data is the leading float mesh arrays subkeys are derived from,
+        layout that of every array encrypted with them.
+        decrypted are the indices of data whose selected block is already decrypted"""
+        block = selection.single_block
+        subkey, padding_arr = AdaptiveDecryptionModel._block_key(key, selection, aad)
+        start, stop = data[0][1].start(block), data[0][1].stop(block)
+
+        def prefix(arr: np.ndarray) -> np.ndarray:
+            if arr.size > PREFIX_ELEMENTS:
+                return np.array(arr.reshape(-1)[:PREFIX_ELEMENTS].reshape(-1, 1))
+            return np.array(arr)
+
+        # the last array may be cut short, arrays before it are whole,
+        # so the prefix buffers are the start of the block buffer
+        count = AdaptiveDecryptionModel._prefix_arrays([arr.size for arr, _ in data])
+        prefixes = [prefix(arr) for arr, _ in data[:count]]
+        prefix_offsets = block_offsets(
+            [prefix.shape for prefix in prefixes], [(start, stop)] * len(prefixes)
+        )
+
+        buffer = np.zeros(int(prefix_offsets[-1]), dtype=np.uint32)
+        get_bits_batch(prefixes, buffer, prefix_offsets, start, stop)
+        whole = [idx for idx, arr in enumerate(prefixes) if arr.size == data[idx][0].size]
+        buffer[prefix_offsets[1:][whole] - 1] = padding_arr[whole]  # as _decrypt does
+
+        with span("gcm", buffer.nbytes):
+            try:
+                plaintext = aes_gcm_decrypt_prefix(
+                    ciphertext=memoryview(buffer).cast("B"),
+                    aad_b64=padding_arr[-14:].tobytes(),
+                    key=subkey,
+                    ranges=layout.segment_ranges(
+                        block, segments["segment_size"], segments.get("per_array", False)
+                    )
+                    if segments
+                    else None,
+                    ivs=segment_ivs(segments, block) if segments else None,
+                )
+            except:
+                raise Exception("Invalid key.")
+        put_bits_batch(
+            prefixes, np.frombuffer(plaintext, dtype=np.uint32), prefix_offsets, start, stop
+        )
+        for idx in decrypted:
+            if idx < len(prefixes):
+                prefixes[idx] = prefix(data[idx][0])  # already plaintext
+
+        return get_subkey(
+            plnm_arrs=prefixes, params=data[0][1], ki=subkey, selection=selection
+        )
@@ -1,12 +1,28 @@
 import secrets
-from time import time
+from base64 import urlsafe_b64decode as b64d
+from base64 import urlsafe_b64encode as b64e
 
 import numpy as np
-from crypto_gltf.data.types import EncryptionResponse
+from crypto_gltf.data.types import EncryptionResponse, JSONDict
 from crypto_gltf.encrypt.adaptive.base import AdaptiveBaseModel
-from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import aes_gcm_encrypt
-from crypto_gltf.encrypt.adaptive.types import AdaptiveCipherParams, BufferView, Key
-from crypto_gltf.encrypt.adaptive.utils import get_bits, put_bits
+from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import (
+    aes_gcm_encrypt_into,
+    aes_gcm_encrypt_segments,
+    aes_gcm_reencrypt_segments,
+)
+from crypto_gltf.encrypt.adaptive.decrypt import segment_ivs
+from crypto_gltf.encrypt.adaptive.types import (
+    BLOCK_INDEX,
+    AdaptiveCipherParams,
+    BlockLayout,
+    Key,
+)
+from crypto_gltf.encrypt.adaptive.utils import (
+    get_bits_pqr_batch,
+    get_executor,
+    put_bits_pqr_batch,
+)
+from crypto_gltf.profiling import span
 from loguru import logger
 
 
@@ -14,127 +30,227 @@ class AdaptiveEncryptionModel(AdaptiveBaseModel):
 
     @staticmethod
     def _encrypt(
-        data: list[tuple[np.ndarray, AdaptiveCipherParams]], key: Key
-    ) -> EncryptionResponse[list[np.ndarray], np.ndarray, Key]:
+        data: list[tuple[np.ndarray, AdaptiveCipherParams]],
+        key: Key,
+        segment_size: int | None = None,
+        partial: bool = False,
+    ) -> EncryptionResponse[list[np.ndarray], tuple[np.ndarray, JSONDict | None], Key]:
+        """Encrypt data, returning the aad array and the segment table of segmented GCM mode.
+        Block buffers are encrypted as single GCM messages if segment_size is None, else as
+        independent segments of segment_size bytes encrypted in parallel.
+        If partial, segments restart at every array so arrays can be decrypted on their own"""
 
-        tic = time()
+        arrs = [arr for arr, _ in data]
+        nbytes = sum(arr.nbytes for arr in arrs)
+        layout = BlockLayout.from_data(data)
+        p_offsets, q_offsets, r_offsets = layout.offsets
 
-        s1, s2, s3 = bytearray(b""), bytearray(b""), bytearray(b"")
-
-        for arr, params in data:
-
-            buffer_view = BufferView.from_shape(shape=arr.shape, params=params)
-
-            p_buffer, q_buffer, r_buffer = (
-                buffer_view.p_buffer,
-                buffer_view.q_buffer,
-                buffer_view.r_buffer,
-            )
-
-            get_bits(
-                arr,
-                p_buffer,
-                params.pstart,
-                params.pstop,
-                secrets.randbits(32),
-            )
-            get_bits(
-                arr,
-                q_buffer,
-                params.qstart,
-                params.qstop,
-                secrets.randbits(32),
-            )
-            get_bits(
-                arr,
-                r_buffer,
-                params.rstart,
-                params.rstop,
-                secrets.randbits(32),
-            )
+        s1, s2, s3 = (
+            np.zeros(int(offsets[-1]), dtype=np.uint32)
+            for offsets in (p_offsets, q_offsets, r_offsets)
+        )
+        fills = np.frombuffer(
+            secrets.token_bytes(12 * len(data)), dtype=np.uint32
+        ).reshape(-1, 3)  # random p, q and r buffer padding values
 
-            s1.extend(p_buffer.tobytes())
-            s2.extend(q_buffer.tobytes())
-            s3.extend(r_buffer.tobytes())
+        with span("bit_extraction", nbytes):
+            for start, stop, slices in layout.runs:
+                get_bits_pqr_batch(
+                    arrs[start:stop],
+                    (s1, s2, s3),
+                    (
+                        p_offsets[start : stop + 1],
+                        q_offsets[start : stop + 1],
+                        r_offsets[start : stop + 1],
+                    ),
+                    slices,
+                    fills[start:stop],
+                )
 
-        toc = time() - tic
         assert key.k1 and key.k2 and key.k3
 
-        r1 = aes_gcm_encrypt(message=s1, key=key.k1)
-        r2 = aes_gcm_encrypt(message=s2, key=key.k2)
-        r3 = aes_gcm_encrypt(message=s3, key=key.k3)
-
-        # combine aads
-        aad = bytearray(b"")
-        aad.extend(r1.aad)
-        aad.extend(r2.aad)
-        aad.extend(r3.aad)
+        # encrypt block buffers in place, so no ciphertext copies are held
+        with span("gcm", s1.nbytes + s2.nbytes + s3.nbytes):
+            segments: JSONDict | None = None
+            if segment_size is None and not partial:
+                r1_aad, r2_aad, r3_aad = (
+                    aes_gcm_encrypt_into(
+                        message=memoryview(sblocks).cast("B"),
+                        out=memoryview(sblocks).cast("B"),
+                        key=subkey,
+                    )
+                    for sblocks, subkey in ((s1, key.k1), (s2, key.k2), (s3, key.k3))
+                )
+            else:
+                segments = {"segment_size": segment_size, "tags": {}}
+                if partial:
+                    segments["per_array"] = True
+                block_aads = []
+                for block, sblocks, subkey in (
+                    ("p", s1, key.k1),
+                    ("q", s2, key.k2),
+                    ("r", s3, key.k3),
+                ):
+                    block_aad, tags = aes_gcm_encrypt_segments(
+                        message=memoryview(sblocks).cast("B"),
+                        out=memoryview(sblocks).cast("B"),
+                        key=subkey,
+                        executor=get_executor(),
+                        ranges=layout.segment_ranges(block, segment_size, partial),
+                    )
+                    block_aads.append(block_aad)
+                    segments["tags"][block] = [b64e(tag).decode() for tag in tags]
+                r1_aad, r2_aad, r3_aad = block_aads
 
-        tic = time()
+        r1_arr, r2_arr, r3_arr = s1, s2, s3
 
-        r1_arr = np.frombuffer(r1.ciphertext, dtype=np.uint32)
-        r2_arr = np.frombuffer(r2.ciphertext, dtype=np.uint32)
-        r3_arr = np.frombuffer(r3.ciphertext, dtype=np.uint32)
+        with span("bit_insertion", nbytes):
+            for start, stop, slices in layout.runs:
+                put_bits_pqr_batch(
+                    arrs[start:stop],
+                    (r1_arr, r2_arr, r3_arr),
+                    (
+                        p_offsets[start : stop + 1],
+                        q_offsets[start : stop + 1],
+                        r_offsets[start : stop + 1],
+                    ),
+                    slices,
+                )
 
-        padding = []
-        poffset, qoffset, roffset = 0, 0, 0
-        for arr, params in data:
-
-            buffer_view = BufferView.from_shape(shape=arr.shape, params=params)
-            put_bits(
-                arr,
-                r1_arr[poffset : poffset + buffer_view.pbufflen],
-                params.pstart,
-                params.pstop,
-            )
-            put_bits(
-                arr,
-                r2_arr[qoffset : qoffset + buffer_view.qbufflen],
-                params.qstart,
-                params.qstop,
-            )
-            put_bits(
-                arr,
-                r3_arr[roffset : roffset + buffer_view.rbufflen],
-                params.rstart,
-                params.rstop,
-            )
-
-            padding.append(
-                [
-                    r1_arr[poffset + buffer_view.pbufflen - 1],
-                    r2_arr[qoffset + buffer_view.qbufflen - 1],
-                    r3_arr[roffset + buffer_view.rbufflen - 1],
-                ]
-            )
-            poffset += buffer_view.pbufflen
-            qoffset += buffer_view.qbufflen
-            roffset += buffer_view.rbufflen
-
-        if not poffset == len(r1_arr):
+        if not p_offsets[-1] == len(r1_arr):
             raise Exception(f"Entire p buffer has not been inserted")
-        if not qoffset == len(r2_arr):
+        if not q_offsets[-1] == len(r2_arr):
             raise Exception(f"Entire q buffer has not been inserted")
-        if not roffset == len(r3_arr):
+        if not r_offsets[-1] == len(r3_arr):
             raise Exception(f"Entire r buffer has not been inserted")
 
+        # final (padded) ciphertext value of each array's buffers
+        padding = np.column_stack(
+            (
+                r1_arr[p_offsets[1:] - 1],
+                r2_arr[q_offsets[1:] - 1],
+                r3_arr[r_offsets[1:] - 1],
+            )
+        )
+
         aad_arr = np.column_stack(
             (
-                np.frombuffer(r1.aad, dtype=np.uint32),
-                np.frombuffer(r2.aad, dtype=np.uint32),
-                np.frombuffer(r3.aad, dtype=np.uint32),
+                np.frombuffer(r1_aad, dtype=np.uint32),
+                np.frombuffer(r2_aad, dtype=np.uint32),
+                np.frombuffer(r3_aad, dtype=np.uint32),
             )
         )  # convert to arr so we can embed in file
         aad = np.concatenate(
-            (np.array(padding, dtype=np.uint32), aad_arr)
+            (padding, aad_arr)
         )  # add padding to authentification information
 
-        # logger.debug(
-        #     f"Byte retrieval/insertion and reshaping took {time()-tic + toc} seconds"
-        # )
-
-        return EncryptionResponse[list[np.ndarray], np.ndarray, Key](
+        return EncryptionResponse[
+            list[np.ndarray], tuple[np.ndarray, JSONDict | None], Key
+        ](
             ciphertext=[item[0] for item in data],
-            aad=aad,
+            aad=(aad, segments),
+            key=key,
+        )
+
+    @staticmethod
+    def _reencrypt(
+        data: list[tuple[np.ndarray, AdaptiveCipherParams]],
+        key: Key,
+        aad: np.ndarray,
+        segments: JSONDict,
+        arrays: list[int],
+    ) -> EncryptionResponse[list[np.ndarray], tuple[np.ndarray, JSONDict], Key]:
+        """Encrypt the plaintext arrays of the sorted indices arrays of data in place, replacing
+        their ciphertext in an asset encrypted with per array segments under key.
+        Only their segments are encrypted, with new IVs, the rest of the segment table is kept.
+        Returns the updated aad array and segment table"""
+
+        assert key.k1 and key.k2 and key.k3
+        if not segments.get("per_array"):
+            raise Exception("Arrays can only be re-encrypted if encrypted with per array segments.")
+        assert len(aad) == len(data) + 14  # +14 for 14 rows of aad data
+
+        arrs = [arr for arr, _ in data]
+        layout = BlockLayout.from_data(data)
+        runs = layout.select(arrays)
+        p_offsets, q_offsets, r_offsets = layout.offsets
+        nbytes = sum(arr.nbytes for start, stop, _ in runs for arr in arrs[start:stop])
+
+        # full length buffers so segment ranges apply as is, only the selected arrays' pages
+        # of the zeroed allocations are ever touched
+        s1, s2, s3 = (
+            np.zeros(int(offsets[-1]), dtype=np.uint32)
+            for offsets in (p_offsets, q_offsets, r_offsets)
+        )
+        fills = np.frombuffer(
+            secrets.token_bytes(12 * len(data)), dtype=np.uint32
+        ).reshape(-1, 3)
+
+        with span("bit_extraction", nbytes):
+            for start, stop, slices in runs:
+                get_bits_pqr_batch(
+                    arrs[start:stop],
+                    (s1, s2, s3),
+                    (
+                        p_offsets[start : stop + 1],
+                        q_offsets[start : stop + 1],
+                        r_offsets[start : stop + 1],
+                    ),
+                    slices,
+                    fills[start:stop],
+                )
+
+        aad = aad.copy()
+        table: JSONDict = {**segments, "tags": {}, "ivs": {}}
+        with span("gcm", nbytes):
+            for block, sblocks, subkey in (
+                ("p", s1, key.k1),
+                ("q", s2, key.k2),
+                ("r", s3, key.k3),
+            ):
+                column = BLOCK_INDEX[block]
+                ranges = layout.segment_ranges(block, segments["segment_size"], per_array=True)
+                block_aad, tags, ivs = aes_gcm_reencrypt_segments(
+                    message=memoryview(sblocks).cast("B"),
+                    out=memoryview(sblocks).cast("B"),
+                    aad_b64=aad[-14:, column].tobytes(),
+                    tags=[b64d(tag) for tag in segments["tags"][block]],
+                    key=subkey,
+                    ranges=ranges,
+                    indices=layout.segment_indices(block, ranges, arrays),
+                    ivs=segment_ivs(segments, block),
+                    executor=get_executor(),
+                )
+                aad[-14:, column] = np.frombuffer(block_aad, dtype=np.uint32)
+                table["tags"][block] = [b64e(tag).decode() for tag in tags]
+                table["ivs"][block] = [b64e(iv).decode() for iv in ivs]
+
+        with span("bit_insertion", nbytes):
+            for start, stop, slices in runs:
+                put_bits_pqr_batch(
+                    arrs[start:stop],
+                    (s1, s2, s3),
+                    (
+                        p_offsets[start : stop + 1],
+                        q_offsets[start : stop + 1],
+                        r_offsets[start : stop + 1],
+                    ),
+                    slices,
+                )
+
+        # final (padded) ciphertext value of each re-encrypted array's buffers
+        aad[arrays] = np.column_stack(
+            (
+                s1[p_offsets[1:][arrays] - 1],
+                s2[q_offsets[1:][arrays] - 1],
+                s3[r_offsets[1:][arrays] - 1],
+            )
+        )
+
+        return EncryptionResponse[
+            list[np.ndarray], tuple[np.ndarray, JSONDict], Key
+        ](
+            ciphertext=arrs,
+            aad=(aad, table),
             key=key,
         )
@@ -0,0 +1,115 @@
+import numpy as np
+
+UINT_DTYPES = {1: np.uint8, 4: np.uint32}
+GROUP_SIZE = 32  # elements per group, a group of n bit blocks always fills n whole uint32 words
+CHUNK_GROUPS = 1 << 15  # groups processed per vectorized pass, bounds temporary memory
+
+
+def _uint_view(arr: np.ndarray) -> np.ndarray:
+    """Returns flat unsigned integer view of arr"""
+    if arr.dtype.itemsize not in UINT_DTYPES:
+        raise Exception(
+            f"dtype {arr.dtype} not supported, bit length must be 8 or 32."
+        )
+    if not arr.flags.c_contiguous:
+        raise Exception("Array must be C contiguous.")
+    return arr.reshape(-1).view(UINT_DTYPES[arr.dtype.itemsize])
+
+
+def _group_pattern(length: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns word index, word offset and reduction indices for each block of a group"""
+    pos = np.arange(GROUP_SIZE, dtype=np.intp) * length
+    word = pos // 32
+    shift = (64 - length - pos % 32).astype(np.uint64)
+    reduce_idxs = np.flatnonzero(np.diff(word, prepend=-1))
+    return word, shift, reduce_idxs
+
+
+def get_bits(
+    arr: np.ndarray,
+    buffer: np.ndarray,
+    start: int,
+    stop: int,
+    fill: int = 0,
+) -> None:
+    """Vectorized equivalent of clib get_bits32/get_bits8.
+    Packs bit slice [start, stop) of every element of arr into buffer"""
+    values = _uint_view(arr)
+    width = values.dtype.itemsize * 8
+    if not (0 <= start < stop <= width):
+        raise Exception(f"Invalid bit slice [{start}, {stop}) for {width} bit type.")
+
+    length = stop - start
+    num_bits = values.size * length
+    if len(buffer) != (num_bits - 1) // 32 + 1:
+        raise Exception(f"Buffer length {len(buffer)} does not match array.")
+
+    _, shift, reduce_idxs = _group_pattern(length)
+    mask = np.uint64((1 << length) - 1)
+    lo_mask = np.uint64(0xFFFFFFFF)
+
+    # each chunk of groups starts on a word boundary, so chunks are packed independently
+    chunk_size = CHUNK_GROUPS * GROUP_SIZE
+    for offset in range(0, values.size, chunk_size):
+        chunk = values[offset : offset + chunk_size]
+        groups = -(-chunk.size // GROUP_SIZE)
+        blocks = np.zeros(groups * GROUP_SIZE, dtype=np.uint64)
+        blocks[: chunk.size] = chunk
+        blocks = ((blocks >> np.uint64(width - stop)) & mask).reshape(
+            groups, GROUP_SIZE
+        )
+        blocks <<= shift
+        combined = np.bitwise_or.reduceat(blocks, reduce_idxs, axis=1)  # (groups, length)
+
+        words = (combined >> np.uint64(32)).astype(np.uint32)
+        words[:, 1:] |= (combined[:, :-1] & lo_mask).astype(np.uint32)
+
+        word_offset = offset * length // 32
+        words = words.reshape(-1)[: len(buffer) - word_offset]
+        buffer[word_offset : word_offset + len(words)] = words
+
+    remainder = num_bits % 32
+    if remainder:
+        # fill remaining bits of the final word, so padded values are random bits
+        buffer[-1] |= np.uint32((fill & 0xFFFFFFFF) >> remainder)
+
+
+def put_bits(
+    putarr: np.ndarray,
+    buffer: np.ndarray,
+    start: int,
+    stop: int,
+) -> None:
+    """Vectorized equivalent of clib put_bits32/put_bits8.
+    Inserts one block of buffer into bit slice [start, stop) of every element of putarr"""
+    values = _uint_view(putarr)
+    width = values.dtype.itemsize * 8
+    if not (0 <= start < stop <= width):
+        raise Exception(f"Invalid bit slice [{start}, {stop}) for {width} bit type.")
+
+    length = stop - start
+    if len(buffer) < (values.size * length - 1) // 32 + 1:
+        raise Exception(f"Buffer length {len(buffer)} too short for array.")
+
+    word, shift, _ = _group_pattern(length)
+    mask = np.uint64((1 << length) - 1)
+    insert_mask = values.dtype.type(((1 << length) - 1) << (width - stop))
+
+    chunk_size = CHUNK_GROUPS * GROUP_SIZE
+    for offset in range(0, values.size, chunk_size):
+        chunk = values[offset : offset + chunk_size]
+        groups = -(-chunk.size // GROUP_SIZE)
+
+        # words of this chunk, with a trailing zero word per group for straddling reads
+        word_offset = offset * length // 32
+        src = buffer[word_offset : word_offset + groups * length]
+        padded = np.zeros(groups * length, dtype=np.uint64)
+        padded[: len(src)] = src
+        chunk_words = np.zeros((groups, length + 1), dtype=np.uint64)
+        chunk_words[:, :length] = padded.reshape(groups, length)
+
+        combined = (chunk_words[:, word] << np.uint64(32)) | chunk_words[:, word + 1]
+        blocks = ((combined >> shift) & mask).reshape(-1)[: chunk.size]
+
+        chunk &= ~insert_mask
+        chunk |= (blocks << np.uint64(width - stop)).astype(values.dtype)
@@ -1,20 +1,32 @@
 from __future__ import annotations
 
-from time import time
+from base64 import urlsafe_b64decode as b64d
+from base64 import urlsafe_b64encode as b64e
 
 import numpy as np
 from crypto_gltf.data.types import AAD_DATA, EncryptionResponse
-from crypto_gltf.encrypt.adaptive.cryptography.key_gen import generate_keys, get_subkey
+from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import aes_gcm_verify_segments
+from crypto_gltf.encrypt.adaptive.cryptography.key_gen import (
+    array_digests,
+    generate_keys,
+    get_subkey,
+)
 from crypto_gltf.encrypt.adaptive.decrypt import AdaptiveDecryptionModel
 from crypto_gltf.encrypt.adaptive.encrypt import AdaptiveEncryptionModel
 from crypto_gltf.encrypt.adaptive.types import (
+    BLOCK_INDEX,
+    VISUAL_LEVEL_BLOCKS,
     AdaptiveCipherParams,
+    BlockLayout,
     BlockSelection,
     ImagesAdaptiveCipherParams,
     Key,
     MeshesAdaptiveCipherParams,
+    VisualLevel,
 )
+from crypto_gltf.encrypt.adaptive.utils import writable
 from crypto_gltf.io.plaintext.plnm import PlnM
+from cryptography.exceptions import InvalidTag
 from loguru import logger
 
 
@@ -30,9 +42,11 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
         images_cipher_params: ImagesAdaptiveCipherParams,
         k3: bytes | None = None,
         encrypt_images: bool = False,
+        segment_size: int | None = None,
+        partial: bool = False,
     ) -> EncryptionResponse[PlnM, AAD_DATA, Key]:
-
-        tic = time()
+        """Encrypt plnm. If partial, every mesh and image array is authenticated
+        as its own GCM segments, so decrypt can select arrays and reencrypt can replace them"""
 
         # Get non-integer type mesh arrays
         # i.e. vertices and colors
@@ -56,14 +70,29 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
             if not len(k3) == 32:
                 raise Exception(f"Key must be 32 bytes long, received {len(k3)} bytes")
             key = generate_keys(float_arrs[:50], meshes_cipher_params, k3)
+        assert key.k1 and key.k2
 
         data: list[tuple[np.ndarray, AdaptiveCipherParams]] = [
             (float_arr, meshes_cipher_params) for float_arr in float_arrs
         ]
         if encrypt_images:
-            data += [(img, images_cipher_params) for img in plnm.images]
+            data += [
+                (writable(img), images_cipher_params) for img in plnm.images
+            ]
 
-        encryption_response = AdaptiveEncryptionModel._encrypt(data=data, key=key)
+        if partial:
+            # plaintext digests, to find and replace modified arrays later
+            assert key.k3
+            digests = array_digests([arr for arr, _ in data], key.k3)
+
+        encryption_response = AdaptiveEncryptionModel._encrypt(
+            data=data, key=key, segment_size=segment_size, partial=partial
+        )
+        aad_arr, segments = encryption_response.aad
+        if partial:
+            assert segments is not None
+            segments["digests"] = [b64e(digest).decode() for digest in digests]
+            segments["sizes"] = [arr.size for arr, _ in data]
         for idx, i in enumerate(meshes_float_arrs_idxs):
             plnm.meshes[i] = encryption_response.ciphertext[idx]
 
@@ -71,13 +100,13 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
             plnm.images = encryption_response.ciphertext[len(float_arrs) :]
 
         aad = AAD_DATA(
-            aad=encryption_response.aad,
+            aad=aad_arr,
             encrypt_images=encrypt_images,
             meshes_params=meshes_cipher_params.__dict__,
             images_params=images_cipher_params.__dict__,
+            segments=segments,
         )
 
-        # logger.debug(f"Adaptive mesh encryption took {time()-tic} seconds.")
         logger.success(f"Asset encrypted")
 
         return EncryptionResponse[PlnM, AAD_DATA, Key](
@@ -87,20 +116,27 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
         )
 
     @staticmethod
-    def decrypt(
-        plnm: PlnM,
-        key: Key,
-        aad: AAD_DATA,
-    ) -> PlnM:
-        tic = time()
-
+    def reencrypt(
+        plnm: PlnM, k3: bytes, aad: AAD_DATA
+    ) -> EncryptionResponse[
+        tuple[dict[int, np.ndarray], dict[int, np.ndarray]], AAD_DATA, Key
+    ]:
+        """Encrypt the arrays of plaintext plnm modified since the asset of aad was encrypted
+        from it with partial=True under k3, found by their digests. Only their segments are
+        encrypted again, the ciphertext of every other array stays valid.
+        Arrays must keep their sizes. Modified leading mesh values may change the subkeys,
+        in which case every array is encrypted again.
+        Returns the ciphertext of the modified plnm.meshes and plnm.images by index,
+        and the updated aad"""
+        segments = aad.segments
+        if not (segments and segments.get("digests")):
+            raise ValueError("Re-encryption requires an asset encrypted with partial=True.")
+        if any(segments.get("decrypted", {}).values()):
+            raise ValueError("Asset is partially decrypted, it must be encrypted again.")
+        if not len(k3) == 32:
+            raise Exception(f"Key must be 32 bytes long, received {len(k3)} bytes")
         meshes_cipher_params = MeshesAdaptiveCipherParams(**aad.meshes_params)
 
-        if key.size == 0:
-            raise Exception(f"Please provide a key")
-
-        # Get non-integer type arrays
-        # i.e. vertices and colors
         meshes_float_arrs_idxs = np.array(
             [
                 idx
@@ -108,16 +144,181 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
                 if mesh.dtype.kind == "f" and mesh.size > 0
             ]
         )
-
-        float_arrs = [plnm.meshes[i] for i in meshes_float_arrs_idxs]
-
+        # no copies yet, only modified arrays are encrypted
         data: list[tuple[np.ndarray, AdaptiveCipherParams]] = [
-            (float_arr, meshes_cipher_params) for float_arr in float_arrs
+            (np.asarray(plnm.meshes[i], dtype=np.float32), meshes_cipher_params)
+            for i in meshes_float_arrs_idxs
         ]
+        float_arrs = [arr for arr, _ in data]
         if aad.encrypt_images:
             images_cipher_params = ImagesAdaptiveCipherParams(**aad.images_params)
             data += [(img, images_cipher_params) for img in plnm.images]
 
+        if len(data) != len(segments["digests"]):
+            raise ValueError(
+                f"Asset has {len(data)} arrays to encrypt, "
+                f"but was encrypted with {len(segments['digests'])}."
+            )
+        resized = [
+            idx for idx, (arr, _) in enumerate(data) if arr.size != segments["sizes"][idx]
+        ]
+        if resized:
+            raise ValueError(
+                f"Arrays {resized} changed size, the asset must be encrypted again."
+            )
+
+        digests = array_digests([arr for arr, _ in data], k3)
+        modified = [
+            idx
+            for idx, digest in enumerate(digests)
+            if digest != b64d(segments["digests"][idx])
+        ]
+
+        key = generate_keys(float_arrs[:50], meshes_cipher_params, k3)
+        assert key.k1 and key.k2
+
+        def authentic(block: str, subkey: bytes) -> bool:
+            try:
+                aes_gcm_verify_segments(
+                    aad.aad[-14:, BLOCK_INDEX[block]].tobytes(),
+                    [b64d(tag) for tag in segments["tags"][block]],
+                    subkey,
+                )
+            except InvalidTag:
+                return False
+            return True
+
+        if not authentic("r", k3):
+            raise Exception("Invalid key.")
+
+        aad_arr = aad.aad
+        if modified:
+            if authentic("q", key.k2) and authentic("p", key.k1):
+                for idx in modified:
+                    data[idx] = (np.array(data[idx][0]), data[idx][1])
+                encryption_response = AdaptiveEncryptionModel._reencrypt(
+                    data=data, key=key, aad=aad_arr, segments=segments, arrays=modified
+                )
+            else:
+                logger.info("Modified arrays changed the subkeys, encrypting every array.")
+                modified = list(range(len(data)))
+                data = [(np.array(arr), params) for arr, params in data]
+                encryption_response = AdaptiveEncryptionModel._encrypt(
+                    data=data, key=key, segment_size=segments["segment_size"], partial=True
+                )
+            aad_arr, segments = encryption_response.aad
+            assert segments is not None
+            segments["digests"] = [b64e(digest).decode() for digest in digests]
+            segments["sizes"] = [arr.size for arr, _ in data]
+
+        meshes = {
+            int(meshes_float_arrs_idxs[idx]): data[idx][0]
+            for idx in modified
+            if idx < len(float_arrs)
+        }
+        images = {
+            idx - len(float_arrs): data[idx][0] for idx in modified if idx >= len(float_arrs)
+        }
+
+        logger.success(f"{len(modified)} of {len(data)} arrays re-encrypted")
+
+        return EncryptionResponse[
+            tuple[dict[int, np.ndarray], dict[int, np.ndarray]], AAD_DATA, Key
+        ](
+            ciphertext=(meshes, images),
+            aad=AAD_DATA(
+                aad=aad_arr,
+                encrypt_images=aad.encrypt_images,
+                meshes_params=aad.meshes_params,
+                images_params=aad.images_params,
+                segments=segments,
+            ),
+            key=key,
+        )
+
+    @staticmethod
+    def encrypted_arrays_remain(aad: AAD_DATA) -> bool:
+        """True if aad is of an asset encrypted with partial=True, some of whose arrays
+        weren't selected by any decryption, so aad must be kept to decrypt them later.
+        Like whole assets, arrays decrypted to a visual level aren't decrypted further"""
+        segments = aad.segments
+        if not (segments and segments.get("per_array")):
+            return False
+        decrypted = set().union(*segments.get("decrypted", {}).values())
+        return len(decrypted) < len(segments["sizes"])
+
+    @staticmethod
+    def decrypt(
+        plnm: PlnM,
+        key: Key,
+        aad: AAD_DATA,
+        target_level: VisualLevel | None = None,
+        mesh_idxs: list[int] | None = None,
+        image_idxs: list[int] | None = None,
+    ) -> PlnM:
+        """Decrypt plnm to target_level, the clearest level key allows if None.
+        Blocks the target doesn't need are skipped, the subkeys below them are derived
+        from a short decrypted prefix rather than by decrypting the whole block.
+        If mesh_idxs or image_idxs are given, only those indices of plnm.meshes and
+        plnm.images are decrypted, which requires plnm encrypted with partial=True.
+        Arrays of plnm encrypted with partial=True are only accessed if they are decrypted
+        or subkeys derive from them, so plnm may load them lazily. The blocks of the arrays
+        decrypted are recorded in aad.segments, so later decryptions skip them"""
+        meshes_cipher_params = MeshesAdaptiveCipherParams(**aad.meshes_params)
+
+        if key.size == 0:
+            raise Exception(f"Please provide a key")
+
+        segments = aad.segments
+        per_array = bool(segments and segments.get("per_array"))
+        if (mesh_idxs is not None or image_idxs is not None) and not per_array:
+            raise ValueError(
+                "Selective decryption requires an asset encrypted with partial=True."
+            )
+
+        # Get non-integer type arrays
+        # i.e. vertices and colors
+        if per_array:
+            # every array is encrypted, their sizes are in the segment table
+            assert segments is not None
+            sizes: list[int] = segments["sizes"]
+            num_images = len(plnm.images) if aad.encrypt_images else 0
+            if len(plnm.meshes) + num_images != len(sizes):
+                raise ValueError(
+                    f"Asset has {len(plnm.meshes) + num_images} arrays to decrypt, "
+                    f"but was encrypted with {len(sizes)}."
+                )
+            meshes_float_arrs_idxs = np.arange(len(plnm.meshes))
+        else:
+            meshes_float_arrs_idxs = np.array(
+                [
+                    idx
+                    for idx, mesh in enumerate(plnm.meshes)
+                    if mesh.dtype.kind == "f" and mesh.size > 0
+                ]
+            )
+        num_float_arrs = len(meshes_float_arrs_idxs)
+
+        # indices of data still to decrypt in each block, every array if None
+        pending: dict[str, list[int] | None] = {"p": None, "q": None, "r": None}
+        decrypted: dict[str, list[int]] = {"p": [], "q": [], "r": []}
+        if per_array:
+            assert segments is not None
+            decrypted.update(segments.get("decrypted", {}))
+            arrays = list(range(len(sizes)))
+            if mesh_idxs is not None or image_idxs is not None:
+                selected_meshes = set(mesh_idxs or [])
+                arrays = [idx for idx in range(num_float_arrs) if idx in selected_meshes]
+                arrays += [
+                    num_float_arrs + idx
+                    for idx in sorted(set(image_idxs or []))
+                    if idx < num_images
+                ]
+            for block in "pqr":
+                done = set(decrypted[block])
+                pending[block] = [idx for idx in arrays if idx not in done]
+
+        visual_level: VisualLevel
         if key.k3:
             visual_level = "clear"
         elif key.k2:
@@ -127,42 +328,132 @@ class AdaptiveCryptoSystemV3(AdaptiveEncryptionModel, AdaptiveDecryptionModel):
         else:
             visual_level = "high"
 
-        if key.k3:
-            data = AdaptiveDecryptionModel._decrypt(
-                data=data, key=key, aad=aad.aad, selection=BlockSelection(r=True)
-            )
-
-            key.k2 = get_subkey(
-                plnm_arrs=[item[0] for item in data[: len(float_arrs)]],
-                params=meshes_cipher_params,
-                ki=key.k3,
-                selection=BlockSelection(r=True),
+        if target_level is not None:
+            if target_level not in VISUAL_LEVEL_BLOCKS:
+                raise ValueError(
+                    f"Unknown visual level {target_level}, must be one of {tuple(VISUAL_LEVEL_BLOCKS)}."
+                )
+            if len(VISUAL_LEVEL_BLOCKS[target_level]) > len(VISUAL_LEVEL_BLOCKS[visual_level]):
+                raise ValueError(
+                    f"Key only decrypts to visual level {visual_level}, not {target_level}."
+                )
+            visual_level = target_level
+        blocks = VISUAL_LEVEL_BLOCKS[visual_level]
+        if not blocks:
+            raise ValueError(
+                f"Visual level {visual_level} decrypts nothing, the asset is left encrypted."
             )
 
-        if key.k2:
-            data = AdaptiveDecryptionModel._decrypt(
-                data=data, key=key, aad=aad.aad, selection=BlockSelection(q=True)
-            )
+        def cipher_arr(idx: int) -> np.ndarray:
+            if idx < num_float_arrs:
+                return plnm.meshes[meshes_float_arrs_idxs[idx]]
+            return plnm.images[idx - num_float_arrs]
 
-            key.k1 = get_subkey(
-                plnm_arrs=[item[0] for item in data[: len(float_arrs)]],
-                params=meshes_cipher_params,
-                ki=key.k2,
-                selection=BlockSelection(q=True),
-            )
+        if per_array:
+            # only arrays that are decrypted are modified, and only they and the leading meshes
+            # subkeys derive from are accessed, the rest are size only placeholders
+            modified = set().union(*(pending[block] or [] for block in blocks))
+            num_prefix_arrs = AdaptiveDecryptionModel._prefix_arrays(sizes[:num_float_arrs])
+            images_cipher_params = ImagesAdaptiveCipherParams(**aad.images_params)
+            data: list[tuple[np.ndarray, AdaptiveCipherParams]] = [
+                (
+                    writable(cipher_arr(idx))
+                    if idx in modified
+                    else cipher_arr(idx)
+                    if idx < num_prefix_arrs
+                    else np.broadcast_to(np.float32(0), (size,)),
+                    meshes_cipher_params if idx < num_float_arrs else images_cipher_params,
+                )
+                for idx, size in enumerate(sizes)
+            ]
+        else:
+            data = [
+                (writable(cipher_arr(idx)), meshes_cipher_params)
+                for idx in range(num_float_arrs)
+            ]
+            if aad.encrypt_images:
+                images_cipher_params = ImagesAdaptiveCipherParams(**aad.images_params)
+                data += [(writable(img), images_cipher_params) for img in plnm.images]
+
+        # one scratch buffer shared by the r, q and p passes
+        selections = [BlockSelection(**{block: True}) for block in blocks]
+        layout = BlockLayout.from_data(data)
+        scratch = AdaptiveDecryptionModel._scratch_buffer(layout, selections)
+
+        def decrypt_block(block: str) -> None:
+            arrays = pending[block]
+            if block in blocks and (arrays is None or arrays):
+                AdaptiveDecryptionModel._decrypt(
+                    data=data,
+                    key=key,
+                    aad=aad.aad,
+                    selection=BlockSelection(**{block: True}),
+                    segments=segments,
+                    scratch=scratch,
+                    layout=layout,
+                    arrays=arrays,
+                )
+
+        for block, ki, subkey in (("r", "k3", "k2"), ("q", "k2", "k1")):
+            if not getattr(key, ki):
+                continue
+            # a subkey is derived from a prefix of its block's ciphertext unless the whole block
+            # is decrypted first, so it's derived before any of the block is decrypted
+            full_block = block in blocks and pending[block] is None
+            if not full_block:
+                setattr(
+                    key,
+                    subkey,
+                    AdaptiveDecryptionModel._derive_subkey(
+                        data=data[:num_float_arrs],
+                        key=key,
+                        selection=BlockSelection(**{block: True}),
+                        aad=aad.aad,
+                        layout=layout,
+                        segments=segments,
+                        decrypted=decrypted[block],
+                    ),
+                )
+            decrypt_block(block)
+            if full_block:
+                setattr(
+                    key,
+                    subkey,
+                    get_subkey(
+                        plnm_arrs=[item[0] for item in data[:num_float_arrs]],
+                        params=meshes_cipher_params,
+                        ki=getattr(key, ki),
+                        selection=BlockSelection(**{block: True}),
+                    ),
+                )
 
         assert key.k1 is not None
-
-        decrypted_data = AdaptiveDecryptionModel._decrypt(
-            data=data, key=key, aad=aad.aad, selection=BlockSelection(p=True)
-        )
-
-        for idx, i in enumerate(meshes_float_arrs_idxs):
-            plnm.meshes[i] = decrypted_data[idx][0]
+        decrypt_block("p")
+
+        if per_array:
+            for idx in sorted(modified):
+                if idx < num_float_arrs:
+                    plnm.meshes[meshes_float_arrs_idxs[idx]] = data[idx][0]
+                else:
+                    plnm.images[idx - num_float_arrs] = data[idx][0]
+            assert segments is not None
+            aad.segments = {
+                **segments,
+                "decrypted": {
+                    block: sorted(set(decrypted[block]) | set(pending[block] or []))
+                    if block in blocks
+                    else decrypted[block]
+                    for block in "pqr"
+                },
+            }
+        else:
+            for idx, i in enumerate(meshes_float_arrs_idxs):
+                plnm.meshes[i] = data[idx][0]
+            if aad.encrypt_images:
+                plnm.images = [item[0] for item in data[num_float_arrs:]]
 
         assert key.filled
 
-        # logger.debug(f"Adaptive mesh decryption took {time()-tic} seconds.")
         logger.success(f"Asset decrypted to visual level {visual_level}")
 
         return plnm
@@ -2,14 +2,25 @@ from __future__ import annotations
 
 from base64 import urlsafe_b64encode as b64e
 from functools import cached_property
-from typing import Any, Literal
+from typing import Any, Literal, NamedTuple
 
 import numpy as np
 from crypto_gltf.data.types import BaseKey, BaseParams
-from crypto_gltf.encrypt.adaptive.utils import buffer_length
 from pydantic import BaseModel, model_validator
 
 
+BLOCK_INDEX = {"p": 0, "q": 1, "r": 2}
+VisualLevel = Literal["clear", "low", "mid", "high"]
+# blocks decrypted to reach each visual level, from fully decrypted to fully encrypted
+VISUAL_LEVEL_BLOCKS: dict[str, tuple[str, ...]] = {
+    "clear": ("r", "q", "p"),
+    "low": ("q", "p"),
+    "mid": ("p",),
+    "high": (),
+}
+BlockSlices = tuple[tuple[int, int], tuple[int, int], tuple[int, int]]
+
+
 class Key(BaseKey):
 
     @model_validator(mode="before")
@@ -89,6 +100,15 @@ class AdaptiveCipherParams(BaseParams):
     def rstop(self) -> int:
         raise NotImplementedError()
 
+    @cached_property
+    def slices(self) -> BlockSlices:
+        """(start, stop) bit slices of the p, q and r blocks"""
+        return (
+            (self.pstart, self.pstop),
+            (self.qstart, self.qstop),
+            (self.rstart, self.rstop),
+        )
+
     def start(self, block: Literal["p", "q", "r"]) -> int:
         MAPPING = {"p": "pstart", "q": "qstart", "r": "rstart"}
         return self.__getattribute__(MAPPING[block])
@@ -180,59 +200,88 @@ class MeshesAdaptiveCipherParams(AdaptiveCipherParams):
         return self.rstart + self.r
 
 
-class BufferView(BaseModel):
+class BlockLayout(NamedTuple):
+    """Frozen p/q/r block buffer layout of every array of an asset, computed once per call.
+    offsets[b, i]:offsets[b, i+1] is array i's range of the combined buffer of block b,
+    runs are (start, stop, slices) of consecutive arrays sharing cipher params"""
 
-    params: AdaptiveCipherParams
-    rows: int
-    cols: int
-    slices: int = 1
+    offsets: np.ndarray  # (3, num_arrs + 1) uintp
+    runs: tuple[tuple[int, int, BlockSlices], ...]
 
     @classmethod
-    def from_shape(
-        cls, shape: tuple[int, int] | tuple[int, int, int], params: AdaptiveCipherParams
-    ) -> BufferView:
-        if len(shape) == 2:
-            return cls(rows=shape[0], cols=shape[1], params=params)
-        elif len(shape) == 3:
-            return cls(rows=shape[0], cols=shape[1], slices=shape[2], params=params)
-
-    @cached_property
-    def pbufflen(self) -> int:
-        """p uint32 buffer length required"""
-        return buffer_length(
-            self.params.pstart, self.params.pstop, self.rows, self.cols, self.slices
-        )
-
-    @cached_property
-    def qbufflen(self) -> int:
-        """q uint32 buffer length required"""
-        return buffer_length(
-            self.params.qstart, self.params.qstop, self.rows, self.cols, self.slices
-        )
-
-    @cached_property
-    def rbufflen(self) -> int:
-        """r uint32 buffer length required"""
-        return buffer_length(
-            self.params.rstart, self.params.rstop, self.rows, self.cols, self.slices
-        )
-
-    @property
-    def p_buffer(self) -> np.ndarray:
-        return np.zeros((self.pbufflen), dtype=np.uint32, order="C")
-
-    @property
-    def q_buffer(self) -> np.ndarray:
-        return np.zeros((self.qbufflen), dtype=np.uint32, order="C")
-
-    @property
-    def r_buffer(self) -> np.ndarray:
-        return np.zeros((self.rbufflen), dtype=np.uint32, order="C")
-
-    def buffer(self, block: Literal["p", "q", "r"]) -> np.ndarray:
-        MAPPING = {"p": "p_buffer", "q": "q_buffer", "r": "r_buffer"}
-        return self.__getattribute__(MAPPING[block])
-
-    def bufflen(self, block: Literal["p", "q", "r"]) -> np.ndarray:
-        MAPPING = {"p": "pbufflen", "q": "qbufflen", "r": "rbufflen"}
-        return self.__getattribute__(MAPPING[block])
+    def from_data(
+        cls, data: list[tuple[np.ndarray, AdaptiveCipherParams]]
+    ) -> BlockLayout:
+        runs: list[tuple[int, int, BlockSlices]] = []
+        run_params: AdaptiveCipherParams | None = None
+        for idx, (_, params) in enumerate(data):
+            if runs and params is run_params:
+                runs[-1] = (runs[-1][0], idx + 1, runs[-1][2])
+            else:
+                runs.append((idx, idx + 1, params.slices))
+                run_params = params
+
+        sizes = np.array([arr.size for arr, _ in data], dtype=np.uintp)
+        lengths = np.empty((3, len(data)), dtype=np.uintp)
+        for start, stop, slices in runs:
+            lengths[:, start:stop] = [[bit_stop - bit_start] for bit_start, bit_stop in slices]
+
+        offsets = np.zeros((3, len(data) + 1), dtype=np.uintp)
+        np.cumsum((sizes * lengths + 31) // 32, axis=1, out=offsets[:, 1:])
+        offsets.flags.writeable = False
+        return cls(offsets=offsets, runs=tuple(runs))
+
+    def block_offsets(self, block: Literal["p", "q", "r"]) -> np.ndarray:
+        """Offsets table of the combined buffer of block"""
+        return self.offsets[BLOCK_INDEX[block]]
+
+    def length(self, block: Literal["p", "q", "r"]) -> int:
+        """uint32 length of the combined buffer of block"""
+        return int(self.offsets[BLOCK_INDEX[block], -1])
+
+    def select(self, arrays: list[int]) -> tuple[tuple[int, int, BlockSlices], ...]:
+        """runs of only the sorted array indices arrays, split where arrays are skipped"""
+        runs: list[tuple[int, int, BlockSlices]] = []
+        for start, stop, slices in self.runs:
+            for idx in arrays:
+                if start <= idx < stop:
+                    if runs and runs[-1][1] == idx and runs[-1][2] is slices:
+                        runs[-1] = (runs[-1][0], idx + 1, slices)
+                    else:
+                        runs.append((idx, idx + 1, slices))
+        return tuple(runs)
+
+    def segment_ranges(
+        self,
+        block: Literal["p", "q", "r"],
+        segment_size: int | None,
+        per_array: bool = False,
+    ) -> list[tuple[int, int]]:
+        """(start, stop) byte ranges of the GCM segments of the combined buffer of block,
+        of segment_size bytes, or whole if None. If per_array segments restart at each array,
+        so every array is authenticated and can be decrypted on its own"""
+        if segment_size is not None and segment_size < 1:
+            raise ValueError(f"Segment size must be positive, received {segment_size}.")
+        offsets = [int(offset) * 4 for offset in self.block_offsets(block)]
+        if per_array:
+            bounds = list(zip(offsets[:-1], offsets[1:]))
+        else:
+            bounds = [(0, offsets[-1])]
+        ranges: list[tuple[int, int]] = []
+        for start, stop in bounds:
+            if segment_size is None:
+                ranges.append((start, stop))
+            else:
+                ranges.extend(
+                    (pos, min(pos + segment_size, stop))
+                    for pos in range(start, max(stop, start + 1), segment_size)
+                )
+        return ranges
+
+    def segment_indices(
+        self, block: Literal["p", "q", "r"], ranges: list[tuple[int, int]], arrays: list[int]
+    ) -> list[int]:
+        """Indices of the per array segment ranges of block belonging to arrays"""
+        offsets = self.block_offsets(block) * 4
+        owners = np.searchsorted(offsets, [start for start, _ in ranges], side="right") - 1
+        return np.flatnonzero(np.isin(owners, arrays)).tolist()
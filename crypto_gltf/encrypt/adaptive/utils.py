@@ -1,8 +1,20 @@
+import os
 import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import CDLL, c_size_t, c_uint32
 from pathlib import Path
+from typing import Any, Callable, Literal
+
 from loguru import logger
 import numpy as np
+from crypto_gltf.encrypt.adaptive import numpy_bits
+
+BitsBackend = Literal["c", "numpy"]
+BITS_BACKENDS: tuple[BitsBackend, ...] = ("c", "numpy")
+BITS_BACKEND_ENV = "CRYPTO_GLTF_BITS_BACKEND"
+NUM_THREADS_ENV = "CRYPTO_GLTF_NUM_THREADS"
+MIN_THREAD_ELEMENTS = 1 << 18  # smallest chunk worth handing to a worker thread, multiple of 32
 
 
 def buffer_length(start: int, stop: int, rows: int, cols: int, slices: int = 1) -> int:
@@ -12,6 +24,24 @@ def buffer_length(start: int, stop: int, rows: int, cols: int, slices: int = 1)
     return (num_bits - 1) // 32 + 1
 
 
+def block_offsets(
+    shapes: list[tuple[int, ...]], slices: list[tuple[int, int]]
+) -> np.ndarray:
+    """Returns offsets table of each array's uint32 buffer within a combined block buffer.
+    Array i occupies buffer[offsets[i]:offsets[i+1]]"""
+    offsets = np.zeros(len(shapes) + 1, dtype=np.uintp)
+    offsets[1:] = np.cumsum(
+        [buffer_length(start, stop, *shape) for shape, (start, stop) in zip(shapes, slices)],
+        dtype=np.uintp,
+    )
+    return offsets
+
+
+def writable(arr: np.ndarray) -> np.ndarray:
+    """Returns arr if it can be modified in place by put_bits, else a C contiguous copy"""
+    return np.require(arr, requirements=["C", "W"])
+
+
 match platform.system():
     case "Linux":
         CLIB_FILEPATH = str(
@@ -21,38 +51,201 @@ match platform.system():
         CLIB_FILEPATH = str(
             Path(__file__).parent.parent.parent.resolve() / "clib/clib_mac.so"
         )
-        logger.warning('Non-linux OS detected. The package DLL library may fail on your architecture.')
-
-
-try:
-    clib = CDLL(CLIB_FILEPATH)
-except:
-    raise Exception(f"Error: invalid DLL file for current architecture. Please recomplie the C library, or contact will@loci.ai for support.")
 
 NP_FLOAT32_ARR_2D = np.ctypeslib.ndpointer(dtype=np.float32, ndim=2, flags="C")
 NP_UINT32_ARR_1D = np.ctypeslib.ndpointer(dtype=np.uint32, ndim=1, flags="C")
 NP_INT8_ARR_3D = np.ctypeslib.ndpointer(dtype=np.uint8, ndim=3, flags="C")
 NP_INT8_ARR_2D = np.ctypeslib.ndpointer(dtype=np.uint8, ndim=2, flags="C")
+NP_SIZE_T_ARR_1D = np.ctypeslib.ndpointer(dtype=np.uintp, ndim=1, flags="C")
+
+
+def _load_clib() -> CDLL | None:
+    """Load the C library and declare its argument types, None if it fails to load"""
+    global _has_clib_pqr, _has_clib_batch
+    if platform.system() != "Linux":
+        logger.warning('Non-linux OS detected. The package DLL library may fail on your architecture.')
+    try:
+        clib = CDLL(CLIB_FILEPATH)
+    except OSError:
+        logger.warning(
+            "Invalid DLL file for current architecture, falling back to the numpy bits backend. "
+            "Please recompile the C library for best performance, or contact will@loci.ai for support."
+        )
+        return None
+
+    clib.get_bits32.argtypes = [
+        NP_FLOAT32_ARR_2D,
+        NP_UINT32_ARR_1D,
+        c_size_t,
+        c_size_t,
+        c_size_t,
+        c_size_t,
+        c_uint32,
+    ]
+
+    clib.put_bits32.argtypes = [
+        NP_FLOAT32_ARR_2D,
+        NP_UINT32_ARR_1D,
+        c_size_t,
+        c_size_t,
+        c_size_t,
+        c_size_t,
+    ]
+
+    # fused p/q/r entry points are missing from DLLs built before they were added
+    _has_clib_pqr = hasattr(clib, "get_bits32_pqr")
+
+    if _has_clib_pqr:
+        clib.get_bits32_pqr.argtypes = [
+            NP_FLOAT32_ARR_2D,
+            NP_UINT32_ARR_1D,
+            NP_UINT32_ARR_1D,
+            NP_UINT32_ARR_1D,
+        ] + [c_size_t] * 8 + [c_uint32] * 3
+
+        clib.put_bits32_pqr.argtypes = [
+            NP_FLOAT32_ARR_2D,
+            NP_UINT32_ARR_1D,
+            NP_UINT32_ARR_1D,
+            NP_UINT32_ARR_1D,
+        ] + [c_size_t] * 8
+
+    # batched entry points pack many arrays into one block buffer per native call
+    _has_clib_batch = hasattr(clib, "get_bits32_batch")
+
+    if _has_clib_batch:
+        clib.get_bits32_batch.argtypes = [
+            NP_SIZE_T_ARR_1D,
+            NP_SIZE_T_ARR_1D,
+            c_size_t,
+            NP_UINT32_ARR_1D,
+            NP_SIZE_T_ARR_1D,
+            c_size_t,
+            c_size_t,
+            NP_UINT32_ARR_1D,
+        ]
+
+        clib.put_bits32_batch.argtypes = [
+            NP_SIZE_T_ARR_1D,
+            NP_SIZE_T_ARR_1D,
+            c_size_t,
+            NP_UINT32_ARR_1D,
+            NP_SIZE_T_ARR_1D,
+            c_size_t,
+            c_size_t,
+        ]
+
+        clib.get_bits32_pqr_batch.argtypes = (
+            [NP_SIZE_T_ARR_1D, NP_SIZE_T_ARR_1D, c_size_t]
+            + [NP_UINT32_ARR_1D] * 3
+            + [NP_SIZE_T_ARR_1D] * 3
+            + [c_size_t] * 6
+            + [NP_UINT32_ARR_1D]
+        )
+
+        clib.put_bits32_pqr_batch.argtypes = (
+            [NP_SIZE_T_ARR_1D, NP_SIZE_T_ARR_1D, c_size_t]
+            + [NP_UINT32_ARR_1D] * 3
+            + [NP_SIZE_T_ARR_1D] * 3
+            + [c_size_t] * 6
+        )
+
+    return clib
+
+
+def get_clib() -> CDLL | None:
+    """Returns the C library, loaded on first use rather than on import.
+    None if it failed to load"""
+    global _clib, _clib_loaded
+    if not _clib_loaded:
+        with _clib_lock:
+            if not _clib_loaded:
+                _clib = _load_clib()
+                _clib_loaded = True
+    return _clib
+
 
+_clib: CDLL | None = None
+_clib_loaded = False
+_clib_lock = threading.Lock()
+_has_clib_pqr = False
+_has_clib_batch = False
 
-clib.get_bits32.argtypes = [
-    NP_FLOAT32_ARR_2D,
-    NP_UINT32_ARR_1D,
-    c_size_t,
-    c_size_t,
-    c_size_t,
-    c_size_t,
-    c_uint32,
-]
 
-clib.put_bits32.argtypes = [
-    NP_FLOAT32_ARR_2D,
-    NP_UINT32_ARR_1D,
-    c_size_t,
-    c_size_t,
-    c_size_t,
-    c_size_t,
-]
+def __getattr__(name: str) -> Any:
+    """clib, HAS_CLIB_PQR and HAS_CLIB_BATCH, which load the C library on first access"""
+    match name:
+        case "clib":
+            return get_clib()
+        case "HAS_CLIB_PQR":
+            return get_clib() is not None and _has_clib_pqr
+        case "HAS_CLIB_BATCH":
+            return get_clib() is not None and _has_clib_batch
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def set_backend(backend: BitsBackend) -> None:
+    """Select the get_bits/put_bits implementation, 'c' (clib) or 'numpy' (vectorized)"""
+    global _backend
+    if backend not in BITS_BACKENDS:
+        raise ValueError(f"Unknown bits backend {backend}, must be one of {BITS_BACKENDS}.")
+    if backend == "c" and get_clib() is None:
+        raise Exception("C bits backend unavailable, the DLL failed to load.")
+    _backend = backend
+
+
+def get_backend() -> BitsBackend:
+    """Returns the selected get_bits/put_bits implementation. Unless selected by set_backend
+    or the CRYPTO_GLTF_BITS_BACKEND environment variable, 'c' if the C library loads"""
+    if _backend is None:
+        if os.environ.get(BITS_BACKEND_ENV):
+            set_backend(os.environ[BITS_BACKEND_ENV].lower())  # type: ignore[arg-type]
+        else:
+            set_backend("c" if get_clib() is not None else "numpy")
+    return _backend  # type: ignore[return-value]
+
+
+_backend: BitsBackend | None = None  # resolved on first use, as it loads the C library
+
+
+def set_num_threads(num_threads: int) -> None:
+    """Set the number of worker threads used by the batched get/put bits functions
+    and segmented encryption, 1 runs serially on the calling thread"""
+    global _num_threads, _executor
+    if num_threads < 1:
+        raise ValueError(f"Number of threads must be at least 1, received {num_threads}.")
+    with _executor_lock:
+        executor, _executor = _executor, None
+        _num_threads = num_threads
+    if executor is not None:
+        # replaced first, so new work goes to the new pool, work in flight still completes
+        executor.shutdown(wait=False)
+
+
+def get_num_threads() -> int:
+    """Returns the number of worker threads used by the batched get/put bits functions"""
+    return _num_threads
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the shared thread pool of get_num_threads() workers, created on first use"""
+    global _executor
+    executor = _executor
+    if executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_num_threads, thread_name_prefix="crypto_gltf"
+                )
+            executor = _executor
+    return executor
+
+
+_num_threads: int = os.cpu_count() or 1
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+if os.environ.get(NUM_THREADS_ENV):
+    set_num_threads(int(os.environ[NUM_THREADS_ENV]))
 
 
 def get_bits(
@@ -65,6 +258,11 @@ def get_bits(
     """get_bits clib wrapper"""
     assert len(buffer.shape) == 1
 
+    if get_backend() == "numpy":
+        return numpy_bits.get_bits(arr, buffer, start, stop, fill)
+
+    clib = get_clib()
+
     match arr.dtype.itemsize:
         case 4:
             """clib get_bits32 function wrapper"""
@@ -122,6 +320,12 @@ def get_bits(
             )
 
 
+def _check_writeable(arrs: list[np.ndarray]) -> None:
+    """Raise if any of arrs is read-only, clib writes through raw pointers regardless"""
+    if not all(arr.flags.writeable for arr in arrs):
+        raise ValueError("put_bits destination is read-only.")
+
+
 def put_bits(
     putarr: np.ndarray,
     buffer: np.ndarray,
@@ -130,6 +334,12 @@ def put_bits(
 ) -> None:
     """put_bits clib wrapper"""
     assert len(buffer.shape) == 1
+    _check_writeable([putarr])
+
+    if get_backend() == "numpy":
+        return numpy_bits.put_bits(putarr, buffer, start, stop)
+
+    clib = get_clib()
 
     match putarr.dtype.itemsize:
         case 4:
@@ -188,3 +398,396 @@ def put_bits(
             raise Exception(
                 f"put_bits not supported for dtype {putarr.dtype.itemsize}, bit length must be 8 or 32."
             )
+
+
+def get_bits_pqr(
+    arr: np.ndarray,
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+    fills: tuple[int, int, int] = (0, 0, 0),
+) -> None:
+    """get_bits for the p, q and r blocks of arr in a single pass where supported"""
+    if get_backend() == "c" and _has_clib_pqr and arr.dtype.itemsize == 4:
+        if len(arr.shape) != 2:
+            raise Exception(f"get_bits32_pqr not supported for shape {arr.shape}")
+        (pstart, pstop), (qstart, qstop), (rstart, rstop) = slices
+        try:
+            get_clib().get_bits32_pqr(
+                arr,
+                *buffers,
+                arr.shape[0],
+                arr.shape[1],
+                pstart,
+                pstop,
+                qstart,
+                qstop,
+                rstart,
+                rstop,
+                *fills,
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.get_bits32_pqr.") from e
+    else:
+        for buffer, (start, stop), fill in zip(buffers, slices, fills):
+            get_bits(arr, buffer, start, stop, fill)
+
+
+def put_bits_pqr(
+    putarr: np.ndarray,
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+) -> None:
+    """put_bits for the p, q and r blocks of putarr in a single pass where supported"""
+    _check_writeable([putarr])
+    if get_backend() == "c" and _has_clib_pqr and putarr.dtype.itemsize == 4:
+        if len(putarr.shape) != 2:
+            raise Exception(f"put_bits32_pqr not supported for shape {putarr.shape}")
+        (pstart, pstop), (qstart, qstop), (rstart, rstop) = slices
+        try:
+            get_clib().put_bits32_pqr(
+                putarr,
+                *buffers,
+                putarr.shape[0],
+                putarr.shape[1],
+                pstart,
+                pstop,
+                qstart,
+                qstop,
+                rstart,
+                rstop,
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.put_bits32_pqr.") from e
+    else:
+        for buffer, (start, stop) in zip(buffers, slices):
+            put_bits(putarr, buffer, start, stop)
+
+
+def _batchable(arrs: list[np.ndarray]) -> bool:
+    """True if arrs can be handed to the clib batch functions"""
+    return (
+        get_backend() == "c"
+        and _has_clib_batch
+        and all(
+            arr.dtype.itemsize == 4 and arr.flags.c_contiguous for arr in arrs
+        )
+    )
+
+
+def _batch_args(arrs: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Returns array pointers and sizes for the clib batch functions"""
+    pointers = np.array([arr.ctypes.data for arr in arrs], dtype=np.uintp)
+    sizes = np.array([arr.size for arr in arrs], dtype=np.uintp)
+    return pointers, sizes
+
+
+def _get_bits_batch(
+    arrs: list[np.ndarray],
+    buffer: np.ndarray,
+    offsets: np.ndarray,
+    start: int,
+    stop: int,
+    fills: np.ndarray | None = None,
+) -> None:
+    """get_bits for every array of arrs, array i is packed into buffer[offsets[i]:offsets[i+1]]
+    with padding value fills[i]. Uses one native call where supported"""
+    if fills is None:
+        fills = np.zeros(len(arrs), dtype=np.uint32)
+
+    if _batchable(arrs):
+        pointers, sizes = _batch_args(arrs)
+        try:
+            get_clib().get_bits32_batch(
+                pointers,
+                sizes,
+                len(arrs),
+                buffer,
+                np.ascontiguousarray(offsets[: len(arrs)], dtype=np.uintp),
+                start,
+                stop,
+                np.ascontiguousarray(fills, dtype=np.uint32),
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.get_bits32_batch.") from e
+    else:
+        for idx, arr in enumerate(arrs):
+            get_bits(
+                arr,
+                buffer[offsets[idx] : offsets[idx + 1]],
+                start,
+                stop,
+                int(fills[idx]),
+            )
+
+
+def _put_bits_batch(
+    arrs: list[np.ndarray],
+    buffer: np.ndarray,
+    offsets: np.ndarray,
+    start: int,
+    stop: int,
+) -> None:
+    """put_bits for every array of arrs, array i is filled from buffer[offsets[i]:offsets[i+1]].
+    Uses one native call where supported"""
+    if _batchable(arrs):
+        pointers, sizes = _batch_args(arrs)
+        try:
+            get_clib().put_bits32_batch(
+                pointers,
+                sizes,
+                len(arrs),
+                buffer,
+                np.ascontiguousarray(offsets[: len(arrs)], dtype=np.uintp),
+                start,
+                stop,
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.put_bits32_batch.") from e
+    else:
+        for idx, arr in enumerate(arrs):
+            put_bits(arr, buffer[offsets[idx] : offsets[idx + 1]], start, stop)
+
+
+def _get_bits_pqr_batch(
+    arrs: list[np.ndarray],
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    offsets: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+    fills: np.ndarray,
+) -> None:
+    """get_bits_pqr for every array of arrs, fills is a (len(arrs), 3) padding value table.
+    Uses one native call where supported"""
+    if _batchable(arrs):
+        pointers, sizes = _batch_args(arrs)
+        (pstart, pstop), (qstart, qstop), (rstart, rstop) = slices
+        try:
+            get_clib().get_bits32_pqr_batch(
+                pointers,
+                sizes,
+                len(arrs),
+                *buffers,
+                *(
+                    np.ascontiguousarray(offs[: len(arrs)], dtype=np.uintp)
+                    for offs in offsets
+                ),
+                pstart,
+                pstop,
+                qstart,
+                qstop,
+                rstart,
+                rstop,
+                np.ascontiguousarray(fills, dtype=np.uint32).reshape(-1),
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.get_bits32_pqr_batch.") from e
+    else:
+        for idx, arr in enumerate(arrs):
+            get_bits_pqr(
+                arr,
+                tuple(  # type: ignore[arg-type]
+                    buffer[offs[idx] : offs[idx + 1]] for buffer, offs in zip(buffers, offsets)
+                ),
+                slices,
+                tuple(int(fill) for fill in fills[idx]),  # type: ignore[arg-type]
+            )
+
+
+def _put_bits_pqr_batch(
+    arrs: list[np.ndarray],
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    offsets: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+) -> None:
+    """put_bits_pqr for every array of arrs. Uses one native call where supported"""
+    if _batchable(arrs):
+        pointers, sizes = _batch_args(arrs)
+        (pstart, pstop), (qstart, qstop), (rstart, rstop) = slices
+        try:
+            get_clib().put_bits32_pqr_batch(
+                pointers,
+                sizes,
+                len(arrs),
+                *buffers,
+                *(
+                    np.ascontiguousarray(offs[: len(arrs)], dtype=np.uintp)
+                    for offs in offsets
+                ),
+                pstart,
+                pstop,
+                qstart,
+                qstop,
+                rstart,
+                rstop,
+            )  # call clib function
+        except Exception as e:
+            raise RuntimeError("Error running clib.put_bits32_pqr_batch.") from e
+    else:
+        for idx, arr in enumerate(arrs):
+            put_bits_pqr(
+                arr,
+                tuple(  # type: ignore[arg-type]
+                    buffer[offs[idx] : offs[idx + 1]] for buffer, offs in zip(buffers, offsets)
+                ),
+                slices,
+            )
+
+
+def _split_rows(
+    arrs: list[np.ndarray],
+    offsets: tuple[np.ndarray, ...],
+    lengths: tuple[int, ...],
+    fills: np.ndarray,
+    chunk_size: int,
+) -> tuple[list[np.ndarray], tuple[np.ndarray, ...], np.ndarray]:
+    """Splits arrays larger than chunk_size into row ranges of chunk_size elements.
+    chunk_size is a multiple of 32, so every range starts on a uint32 word of each block buffer
+    and packs exactly as the whole array would. Only the final range of an array is padded"""
+    chunks: list[np.ndarray] = []
+    chunk_offsets: list[list[int]] = [[] for _ in offsets]
+    chunk_fills: list[np.ndarray] = []
+    no_fill = np.zeros(fills.shape[1:], dtype=np.uint32)
+
+    for idx, arr in enumerate(arrs):
+        if arr.size <= chunk_size or not arr.flags.c_contiguous:
+            ranges = [(0, arr)]
+        else:
+            flat = arr.reshape(-1, 1)
+            ranges = [
+                (start, flat[start : start + chunk_size])
+                for start in range(0, flat.shape[0], chunk_size)
+            ]
+        for num, (start, chunk) in enumerate(ranges):
+            chunks.append(chunk)
+            for table, offs, length in zip(chunk_offsets, offsets, lengths):
+                table.append(int(offs[idx]) + start * length // 32)
+            chunk_fills.append(fills[idx] if num == len(ranges) - 1 else no_fill)
+
+    return (
+        chunks,
+        tuple(
+            np.array(table + [int(offs[len(arrs)])], dtype=np.uintp)
+            for table, offs in zip(chunk_offsets, offsets)
+        ),
+        np.array(chunk_fills, dtype=np.uint32).reshape((-1,) + fills.shape[1:]),
+    )
+
+
+def _run_threaded(
+    run: Callable[[list[np.ndarray], tuple[np.ndarray, ...], np.ndarray], None],
+    arrs: list[np.ndarray],
+    offsets: tuple[np.ndarray, ...],
+    lengths: tuple[int, ...],
+    fills: np.ndarray,
+) -> None:
+    """Calls run(arrs, offsets, fills) serially, or split into row ranges across the thread pool.
+    Each worker owns disjoint words of the block buffers, so output is identical to the serial path"""
+    total = sum(arr.size for arr in arrs)
+    if _num_threads == 1 or total < 2 * MIN_THREAD_ELEMENTS:
+        return run(arrs, offsets, fills)
+
+    chunk_size = max(MIN_THREAD_ELEMENTS, -(-total // _num_threads))
+    chunk_size = -(-chunk_size // 32) * 32
+    chunks, chunk_offsets, chunk_fills = _split_rows(
+        arrs, offsets, lengths, fills, chunk_size
+    )
+
+    # contiguous groups of chunks with roughly equal element counts, one per worker
+    ends = np.cumsum([chunk.size for chunk in chunks])
+    bounds = np.searchsorted(
+        ends, np.arange(1, _num_threads) * total / _num_threads, side="left"
+    ) + 1
+    bounds = np.unique(np.concatenate(([0], bounds, [len(chunks)])))
+
+    futures = [
+        get_executor().submit(
+            run,
+            chunks[lo:hi],
+            tuple(offs[lo : hi + 1] for offs in chunk_offsets),
+            chunk_fills[lo:hi],
+        )
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+        if lo < hi
+    ]
+    for future in futures:
+        future.result()  # propagate worker exceptions
+
+
+def get_bits_batch(
+    arrs: list[np.ndarray],
+    buffer: np.ndarray,
+    offsets: np.ndarray,
+    start: int,
+    stop: int,
+    fills: np.ndarray | None = None,
+) -> None:
+    """get_bits for every array of arrs, array i is packed into buffer[offsets[i]:offsets[i+1]]
+    with padding value fills[i]. Large inputs are split across get_num_threads() threads"""
+    if fills is None:
+        fills = np.zeros(len(arrs), dtype=np.uint32)
+    _run_threaded(
+        lambda arrs, offsets, fills: _get_bits_batch(
+            arrs, buffer, offsets[0], start, stop, fills
+        ),
+        arrs,
+        (offsets,),
+        (stop - start,),
+        fills,
+    )
+
+
+def put_bits_batch(
+    arrs: list[np.ndarray],
+    buffer: np.ndarray,
+    offsets: np.ndarray,
+    start: int,
+    stop: int,
+) -> None:
+    """put_bits for every array of arrs, array i is filled from buffer[offsets[i]:offsets[i+1]].
+    Large inputs are split across get_num_threads() threads"""
+    _check_writeable(arrs)
+    _run_threaded(
+        lambda arrs, offsets, _: _put_bits_batch(arrs, buffer, offsets[0], start, stop),
+        arrs,
+        (offsets,),
+        (stop - start,),
+        np.zeros(len(arrs), dtype=np.uint32),
+    )
+
+
+def get_bits_pqr_batch(
+    arrs: list[np.ndarray],
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    offsets: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+    fills: np.ndarray,
+) -> None:
+    """get_bits_pqr for every array of arrs, fills is a (len(arrs), 3) padding value table.
+    Large inputs are split across get_num_threads() threads"""
+    _run_threaded(
+        lambda arrs, offsets, fills: _get_bits_pqr_batch(
+            arrs, buffers, offsets, slices, fills  # type: ignore[arg-type]
+        ),
+        arrs,
+        offsets,
+        tuple(stop - start for start, stop in slices),
+        fills,
+    )
+
+
+def put_bits_pqr_batch(
+    arrs: list[np.ndarray],
+    buffers: tuple[np.ndarray, np.ndarray, np.ndarray],
+    offsets: tuple[np.ndarray, np.ndarray, np.ndarray],
+    slices: tuple[tuple[int, int], tuple[int, int], tuple[int, int]],
+) -> None:
+    """put_bits_pqr for every array of arrs. Large inputs are split across get_num_threads() threads"""
+    _check_writeable(arrs)
+    _run_threaded(
+        lambda arrs, offsets, _: _put_bits_pqr_batch(
+            arrs, buffers, offsets, slices  # type: ignore[arg-type]
+        ),
+        arrs,
+        offsets,
+        tuple(stop - start for start, stop in slices),
+        np.zeros((len(arrs), 3), dtype=np.uint32),
+    )
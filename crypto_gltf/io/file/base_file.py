@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import os
+from collections.abc import Iterable, Mapping
 from functools import cached_property
 from tempfile import TemporaryDirectory
 
+import numpy as np
+
 from crypto_gltf.data.asset_file_data_types import AssetFileDataType
 from crypto_gltf.data.types import AAD_DATA, Extension
 from crypto_gltf.io.plaintext.plnm import PlnM
@@ -19,13 +22,18 @@ class BaseFile(BaseModel):
     data: AssetFileDataType
 
     @classmethod
-    def load(cls, import_path: str) -> BaseFile:
+    def load(cls, import_path: str, use_mmap: bool = False) -> BaseFile:
         raise NotImplementedError()
 
     def save(self, export_dir: str, images_encrypted: bool = False) -> str:
         """Returns export filepath"""
         raise NotImplementedError()
 
+    def patch(self, export_dir: str | None = None) -> str:
+        """Write changes into a copy of the source file in export_dir,
+        or into the source file itself if export_dir is None. Returns export filepath"""
+        raise NotImplementedError(f"Patching is not supported for {self.filename_ext} files.")
+
     @cached_property
     def basename(self) -> str:
         return os.path.basename(self.import_path)
@@ -56,11 +64,47 @@ class BaseFile(BaseModel):
         assumes the plaintext data came from the same file"""
         raise NotImplementedError()
 
+    def cipher_plnm(self, images: bool = False, lazy: bool = False) -> PlnM:
+        """Return the plaintext data a cipher operation reads,
+        filetypes may skip data that is never encrypted.
+        If lazy, filetypes may decode arrays only when they are first accessed"""
+        return self.plnm
+
+    def insert_cipher_plnm(self, plnm: PlnM, images: bool = False) -> None:
+        """Insert plaintext data returned by cipher_plnm"""
+        self.insert_plnm(plnm)
+
+    def cipher_plnm_selection(
+        self, meshes: Iterable[int] | None = None, nodes: Iterable[int] | None = None
+    ) -> tuple[list[int], list[int]]:
+        """Return the indices of the cipher_plnm meshes and images used by meshes,
+        and by every mesh of the node subtrees nodes"""
+        raise NotImplementedError(
+            f"Selective decryption is not supported for {self.filename_ext} files."
+        )
+
+    def insert_cipher_arrays(
+        self, meshes: Mapping[int, np.ndarray], images: Mapping[int, np.ndarray]
+    ) -> None:
+        """Insert only the given cipher_plnm meshes and images by index,
+        leaving every other array of the file untouched"""
+        raise NotImplementedError(
+            f"Re-encryption is not supported for {self.filename_ext} files."
+        )
+
     def embed_aad(self, aad: AAD_DATA) -> None:
         """Embed aad data in file for retrieval during decryption"""
         raise NotImplementedError()
 
+    def read_aad(self) -> AAD_DATA:
+        """Retrieve embedded aad data, leaving it in the file"""
+        raise NotImplementedError()
+
+    def remove_aad(self) -> None:
+        """Remove embedded aad data from the file"""
+        raise NotImplementedError()
+
     @property
     def aad(self) -> AAD_DATA:
-        """Retrieve embedded aad data"""
+        """Retrieve embedded aad data and remove it from the file"""
         raise NotImplementedError()
@@ -6,8 +6,9 @@ from crypto_gltf.io.file.gltf2.gltf2 import GLTFFile
 from crypto_gltf.io.file.off.off import OffFile
 
 
-def File(import_filepath: str) -> BaseFile:
-    """Factory method for initializing any filetype"""
+def File(import_filepath: str, use_mmap: bool = False) -> BaseFile:
+    """Factory method for initializing any filetype.
+    use_mmap memory maps binary file data where the filetype supports it"""
 
     localizers: dict[str, Type[BaseFile]] = {
         ".gltf": GLTFFile,
@@ -20,4 +21,4 @@ def File(import_filepath: str) -> BaseFile:
     if not filetype:
         raise Exception(f"Filetype {filetype} not supported.")
 
-    return filetype.load(import_filepath)
+    return filetype.load(import_filepath, use_mmap=use_mmap)
@@ -1,16 +1,29 @@
 import json
 import os
+import shutil
 import struct
+from collections.abc import MutableMapping
 from functools import cached_property
+from tempfile import NamedTemporaryFile
 
-from crypto_gltf.data.asset_file_data_types import Gltf2Data
+from crypto_gltf.data.asset_file_data_types import Gltf2Data, LazyDict
 from crypto_gltf.io.file.gltf2.com.gltf2_io import Buffer, BufferView
 from crypto_gltf.io.file.gltf2.exp.gltf2_io_binary_data import (
     BinaryData as ExpBinaryData,
 )
 from crypto_gltf.io.file.gltf2.exp.gltf2_io_buffer import Buffer as ExpBuffer
+from crypto_gltf.io.file.gltf2.imp.gltf2_imp_binary_data import (
+    BinaryData as ImpBinaryData,
+)
 from crypto_gltf.io.file.gltf2.utils import uri_to_path
 
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")  # max segments per writev call
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = -1
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
 
 class GlTF2Exporter:
     """Class to handle glTF2 export"""
@@ -22,6 +35,7 @@ class GlTF2Exporter:
         is_glb: bool,
         filename_ext: str,
         images_encrypted: bool = False,
+        passthrough: bool = True,
     ):
         self.export_buffer: ExpBuffer = ExpBuffer()
         self.buffer_views: list[BufferView] = []
@@ -30,6 +44,8 @@ class GlTF2Exporter:
         self.is_glb: bool = is_glb
         self.filename_ext: str = filename_ext
         self.images_encrypted: bool = images_encrypted
+        self.passthrough: bool = passthrough
+        self.written_paths: list[str] = []  # every file written by export
 
     @cached_property
     def export_filepath(self) -> str:
@@ -51,7 +67,7 @@ class GlTF2Exporter:
         if self.is_glb:
             uri = None
         else:
-            uri = "scene.bin"
+            uri = f"{self.filename}.bin"  # own buffer, .gltf files may share export_dir
 
         buffer = Buffer(
             byte_length=self.export_buffer.byte_length,
@@ -68,68 +84,120 @@ class GlTF2Exporter:
         self.gltf["buffers"] = [buffer.to_dict()]
 
         gltf_bytes = json.dumps(self.gltf).encode("utf-8")
-        buffer_bytes = self.export_buffer.to_bytes()
+        # buffer views already have their final offsets, so segments stream straight to file
+        buffer_segments = self.export_buffer.segments
 
         match self.is_glb:
             case True:
-                with open(self.export_filepath, "wb") as f:
-
-                    length_gltf = len(gltf_bytes)
-                    spaces_gltf = (4 - (length_gltf & 3)) & 3
-                    length_gltf += spaces_gltf
+                length_gltf = len(gltf_bytes)
+                spaces_gltf = (4 - (length_gltf & 3)) & 3
+                length_gltf += spaces_gltf
 
-                    length_bin = len(buffer_bytes)
-                    zeros_bin = (4 - (length_bin & 3)) & 3
-                    length_bin += zeros_bin
+                length_bin = self.export_buffer.byte_length
+                zeros_bin = (4 - (length_bin & 3)) & 3
+                length_bin += zeros_bin
 
-                    length = 12 + 8 + length_gltf
-                    if length_bin > 0:
-                        length += 8 + length_bin
+                length = 12 + 8 + length_gltf
+                if length_bin > 0:
+                    length += 8 + length_bin
 
+                segments: list[bytes | memoryview] = [
                     # Header (Version 2)
-                    f.write("glTF".encode())
-                    f.write(struct.pack("I", 2))
-                    f.write(struct.pack("I", length))
-
+                    struct.pack("<4sII", b"glTF", 2, length),
                     # Chunk 0 (JSON)
-                    f.write(struct.pack("I", length_gltf))
-                    f.write("JSON".encode())
-                    f.write(gltf_bytes)
-                    f.write(b" " * spaces_gltf)
-
-                    # Chunk 1 (BIN)
-                    if length_bin > 0:
-                        f.write(struct.pack("I", length_bin))
-                        f.write("BIN\0".encode())
-                        f.write(buffer_bytes)
-                        f.write(b"\0" * zeros_bin)
+                    struct.pack("<I4s", length_gltf, b"JSON"),
+                    gltf_bytes,
+                    b" " * spaces_gltf,
+                ]
+                # Chunk 1 (BIN)
+                if length_bin > 0:
+                    segments.append(struct.pack("<I4s", length_bin, b"BIN\0"))
+                    segments.extend(buffer_segments)
+                    segments.append(b"\0" * zeros_bin)
+
+                self.write_segments(self.export_filepath, segments)
+                self.written_paths.append(self.export_filepath)
 
             case False:
                 self.export_data(
-                    buffer_bytes,
+                    buffer_segments,
                     filepath=f"{self.export_dir}/{uri_to_path(buffer.uri)}",
                 )
                 self.export_data(
-                    gltf_bytes,
+                    [gltf_bytes],
                     filepath=self.export_filepath,
                 )
 
         return self.export_filepath
 
-    def export_data(self, data: bytes, filepath: str) -> str:
-        """Safely writes data to destination in export_dir"""
-        path = os.path.join(os.path.dirname(self.export_dir), filepath)
+    def export_data(self, data: list[bytes | memoryview], filepath: str) -> str:
+        """Safely writes data segments to filepath, a destination in export_dir"""
+        path = filepath
         try:
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            with open(path, "wb") as f:
-                f.write(data)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.write_segments(path, data)
+            self.written_paths.append(path)
             return path
         except Exception as e:
             raise Exception(f"Couldn't export file: {path}") from e
 
+    @classmethod
+    def write_segments(cls, filepath: str, segments: list[bytes | memoryview]) -> None:
+        """Write segments to filepath. An existing file is replaced atomically,
+        as segments may be memory mapped from it"""
+        if not os.path.exists(filepath):
+            with open(filepath, "wb") as f:
+                cls.write_vectored(f.fileno(), segments)
+            return
+
+        with NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(filepath)), delete=False) as f:
+            try:
+                cls.write_vectored(f.fileno(), segments)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        shutil.copymode(filepath, f.name)
+        os.replace(f.name, filepath)
+
+    @staticmethod
+    def write_vectored(fd: int, segments: list[bytes | memoryview]) -> None:
+        """Write segments in order with as few system calls as possible"""
+        pending = [memoryview(segment).cast("B") for segment in segments if len(segment)]
+        if not hasattr(os, "writev"):  # i.e. Windows
+            for segment in pending:
+                while len(segment):
+                    segment = segment[os.write(fd, segment) :]
+            return
+
+        idx = 0
+        while idx < len(pending):
+            written = os.writev(fd, pending[idx : idx + IOV_MAX])
+            # skip fully written segments and resume partially written ones
+            while idx < len(pending) and written >= len(pending[idx]):
+                written -= len(pending[idx])
+                idx += 1
+            if written:
+                pending[idx] = pending[idx][written:]
+
+    def is_passthrough(self, gltf_data: Gltf2Data, data: MutableMapping, idx: int) -> bool:
+        """True if data[idx] can be copied from the source file rather than re-encoded,
+        i.e. pass-through is enabled and the value was never loaded, so is unchanged"""
+        return (
+            self.passthrough
+            and gltf_data.source is not None
+            and isinstance(data, LazyDict)
+            and not data.is_loaded(idx)
+        )
+
     def export_accessor(self, gltf_data: Gltf2Data, accessor_idx: int) -> bool:
         """Export accessor to buffer"""
-        binary_data = ExpBinaryData.from_numpy(arr=gltf_data.accessors[accessor_idx])
+        raw = None
+        if self.is_passthrough(gltf_data, gltf_data.accessors, accessor_idx):
+            raw = ImpBinaryData.get_accessor_bytes(gltf_data.source, accessor_idx)
+        if raw is not None:
+            binary_data = ExpBinaryData(raw)
+        else:
+            binary_data = ExpBinaryData.from_numpy(arr=gltf_data.accessors[accessor_idx])
         buffer_view = self.export_buffer.add_and_get_view(
             binary_data
         )  # add to buffer and get buffer view
@@ -147,7 +215,24 @@ class GlTF2Exporter:
 
         assert not (uri is None and buffer_view is None)
 
-        if uri is not None:
+        raw = None
+        if self.is_passthrough(gltf_data, gltf_data.images, image_idx):
+            # unchanged image, keep the source encoding
+            raw = ImpBinaryData.get_image_data(gltf_data.source, image_idx)
+
+        if raw is not None and uri is not None:
+            if not uri.startswith("data:"):  # embedded data uris are kept in the json
+                path = os.path.join(self.export_dir, uri_to_path(uri))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.write_segments(path, [raw])
+                self.written_paths.append(path)
+
+        elif raw is not None:
+            binary_data = ExpBinaryData(raw)
+            self.buffer_views.append(self.export_buffer.add_and_get_view(binary_data))
+            self.gltf["images"][image_idx]["bufferView"] = len(self.buffer_views) - 1
+
+        elif uri is not None:
             # write to file
             if self.images_encrypted:
                 # .jpeg alters some RGB values on export
@@ -159,6 +244,7 @@ class GlTF2Exporter:
             path = os.path.join(self.export_dir, uri_to_path(uri))
             os.makedirs(os.path.dirname(path), exist_ok=True)
             gltf_data.images[image_idx].save(path, compression_level=0)
+            self.written_paths.append(path)
 
         elif buffer_view is not None:
             # add to buffer
@@ -2,20 +2,24 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+from __future__ import annotations
+
 import array
 import io
 import typing
 
 import numpy as np
 from crypto_gltf.io.file.gltf2.com.gltf2_io_constants import ComponentType
-from PIL import Image
+
+if typing.TYPE_CHECKING:
+    from PIL import Image
 
 
 class BinaryData:
     """Store for gltf binary data that can later be stored in a buffer."""
 
-    def __init__(self, data: bytes, bufferViewTarget=None):
-        if not isinstance(data, bytes):
+    def __init__(self, data: bytes | memoryview, bufferViewTarget=None):
+        if not isinstance(data, (bytes, memoryview)):
             raise TypeError("Data is not a bytes array")
         self.data = data
         self.bufferViewTarget = bufferViewTarget
@@ -24,7 +28,7 @@ class BinaryData:
         return self.data == other.data
 
     def __hash__(self):
-        return hash(self.data)
+        return hash(bytes(self.data))
 
     @classmethod
     def from_list(
@@ -42,7 +46,8 @@ class BinaryData:
         arr: np.ndarray,
         bufferViewTarget=None,
     ):
-        return BinaryData(arr.tobytes(), bufferViewTarget)
+        # view rather than copy, the array is written straight to file on export
+        return BinaryData(memoryview(np.ascontiguousarray(arr)).cast("B"), bufferViewTarget)
 
     @classmethod
     def from_image(
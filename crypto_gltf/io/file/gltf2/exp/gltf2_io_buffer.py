@@ -9,24 +9,28 @@ from crypto_gltf.io.file.gltf2.exp.gltf2_io_binary_data import BinaryData
 
 
 class Buffer:
-    """Class representing binary data for use in a glTF file as 'buffer' property."""
+    """Class representing binary data for use in a glTF file as 'buffer' property.
+    Data is kept as a list of segments with their padding, so it can be written without joining."""
 
     def __init__(self, buffer_index=0, initial_data=None):
-        self.__data: bytearray = bytearray(b"")
+        self.__segments: list[bytes | memoryview] = []
+        self.__byte_length: int = 0
         if initial_data is not None:
-            self.__data = bytearray(initial_data.tobytes())
+            self.__segments.append(initial_data.tobytes())
+            self.__byte_length = len(self.__segments[0])
         self.__buffer_index = buffer_index
 
     def add_and_get_view(self, binary_data: BinaryData) -> BufferView:
         """Add binary data to the buffer. Return a glTF BufferView."""
-        offset = len(self.__data)
-        self.__data.extend(binary_data.data)
-
+        offset = self.__byte_length
         length = binary_data.byte_length
+        self.__segments.append(binary_data.data)
 
         # offsets should be a multiple of 4 --> therefore add padding if necessary
         padding = (4 - (length % 4)) % 4
-        self.__data.extend(b"\x00" * padding)
+        if padding:
+            self.__segments.append(b"\x00" * padding)
+        self.__byte_length += length + padding
 
         buffer_view = BufferView(
             buffer=self.__buffer_index,
@@ -42,15 +46,20 @@ class Buffer:
 
     @property
     def byte_length(self):
-        return len(self.__data)
+        return self.__byte_length
+
+    @property
+    def segments(self) -> list[bytes | memoryview]:
+        return self.__segments
 
     def to_bytes(self):
-        return self.__data
+        return b"".join(self.__segments)
 
     def clear(self):
-        self.__data = bytearray(b"")
+        self.__segments = []
+        self.__byte_length = 0
 
     def to_embed_string(self):
         return "data:application/octet-stream;base64," + base64.b64encode(
-            self.__data
+            self.to_bytes()
         ).decode("ascii")
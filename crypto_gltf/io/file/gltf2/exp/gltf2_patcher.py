@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import struct
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+from crypto_gltf.data.asset_file_data_types import Gltf2Data, LazyDict
+from crypto_gltf.io.file.gltf2.com.gltf2_io_constants import ComponentType, DataType
+
+GLB_HEADER_SIZE = 12
+CHUNK_HEADER_SIZE = 8
+
+
+class GlTF2Patcher:
+    """Class to write modified accessors into an existing GLB without re-exporting it.
+    Modified accessors must keep their byte size, new accessors are appended to the BIN chunk"""
+
+    def __init__(self, source_path: str, export_path: str):
+        self.source_path: str = source_path
+        self.export_path: str = export_path
+
+    def patch(self, gltf_data: Gltf2Data) -> str:
+        """Patch glTF2 data into export_path, which may be the source file itself"""
+
+        if not gltf_data.is_glb or gltf_data.source is None:
+            raise Exception("Patching is only supported for .glb files.")
+        if not isinstance(gltf_data.accessors, LazyDict) or not isinstance(
+            gltf_data.images, LazyDict
+        ):
+            raise Exception("Plaintext has been replaced, the file must be re-exported.")
+        if any(gltf_data.images.is_loaded(idx) for idx in gltf_data.images):
+            raise Exception("Images may have changed size, the file must be re-exported.")
+
+        json_length, bin_length, file_size = self.read_layout()
+        bin_offset = GLB_HEADER_SIZE + CHUNK_HEADER_SIZE + json_length + CHUNK_HEADER_SIZE
+
+        gltf = gltf_data.gltf.copy()
+        gltf["accessors"] = list(gltf.get("accessors", []))
+        gltf["bufferViews"] = [view.copy() for view in gltf.get("bufferViews", [])]
+        gltf["buffers"] = [buffer.copy() for buffer in gltf.get("buffers", [])]
+        if not gltf["buffers"] or gltf["buffers"][0].get("uri") is not None:
+            raise Exception("GLB has no BIN chunk buffer to patch.")
+
+        # drop trailing bufferViews nothing refers to any more, i.e. of a removed aad,
+        # so the BIN chunk doesn't grow with every encrypt and decrypt
+        referenced = self.referenced_buffer_views(gltf)
+        views = gltf["bufferViews"]
+        while views and len(views) - 1 not in referenced and views[-1]["buffer"] == 0:
+            views.pop()
+        kept_length = min(
+            bin_length,
+            max(
+                (
+                    ((view.get("byteOffset") or 0) + view["byteLength"] + 3) & ~3
+                    for view in views
+                    if view["buffer"] == 0
+                ),
+                default=0,
+            ),
+        )
+
+        # (offset within BIN chunk, bytes) of every write
+        patches: list[tuple[int, memoryview]] = []
+        appended = bytearray(b"")
+        source_accessors = gltf_data.source.accessors
+
+        for idx in gltf_data.accessors:
+            if not gltf_data.accessors.is_loaded(idx):
+                continue  # unchanged
+            arr = np.ascontiguousarray(gltf_data.accessors[idx])
+            accessor = gltf["accessors"][idx]
+            if (
+                idx < len(source_accessors)
+                and accessor.get("bufferView") == source_accessors[idx].buffer_view
+            ):
+                offset = self.accessor_offset(gltf, accessor, arr)
+                patches.append((offset, memoryview(arr).cast("B")))
+            else:
+                # new accessor, i.e. embedded aad, or one that no longer fits its source
+                # bufferView, appended to the BIN chunk
+                offset = kept_length + len(appended)
+                appended.extend(arr.tobytes())
+                appended.extend(b"\x00" * ((4 - len(appended) % 4) % 4))
+                gltf["bufferViews"].append(
+                    {"buffer": 0, "byteOffset": offset, "byteLength": arr.nbytes}
+                )
+                gltf["accessors"][idx] = {
+                    **accessor,
+                    "bufferView": len(gltf["bufferViews"]) - 1,
+                    "byteOffset": 0,
+                }
+
+        new_bin_length = kept_length + len(appended)
+        gltf["buffers"][0]["byteLength"] = new_bin_length
+        gltf_bytes = json.dumps(gltf).encode("utf-8")
+        gltf_bytes += b" " * ((4 - len(gltf_bytes) % 4) % 4)
+
+        in_place = os.path.abspath(self.export_path) == os.path.abspath(self.source_path)
+        bin_is_last = bin_offset + bin_length == file_size
+
+        if in_place and bin_is_last and len(gltf_bytes) <= json_length:
+            # json fits in the existing chunk, write everything in place
+            gltf_bytes += b" " * (json_length - len(gltf_bytes))
+            with open(self.export_path, "r+b") as f:
+                fd = f.fileno()
+                os.pwrite(fd, gltf_bytes, GLB_HEADER_SIZE + CHUNK_HEADER_SIZE)
+                self.write_bin(fd, bin_offset, kept_length, patches, appended)
+                os.pwrite(fd, struct.pack("<I", new_bin_length), bin_offset - CHUNK_HEADER_SIZE)
+                os.pwrite(fd, struct.pack("<I", bin_offset + new_bin_length), 8)
+                if new_bin_length < bin_length:
+                    os.ftruncate(fd, bin_offset + new_bin_length)
+            return self.export_path
+
+        # copy the BIN chunk behind a new json chunk, then patch the copy
+        export_dir = os.path.dirname(os.path.abspath(self.export_path))
+        with NamedTemporaryFile(dir=export_dir, delete=False) as f:
+            try:
+                new_bin_offset = (
+                    GLB_HEADER_SIZE + CHUNK_HEADER_SIZE + len(gltf_bytes) + CHUNK_HEADER_SIZE
+                )
+                f.write(b"glTF")
+                f.write(struct.pack("<II", 2, new_bin_offset + new_bin_length))
+                f.write(struct.pack("<I", len(gltf_bytes)))
+                f.write(b"JSON")
+                f.write(gltf_bytes)
+                f.write(struct.pack("<I", new_bin_length))
+                f.write(b"BIN\0")
+                with open(self.source_path, "rb") as source:
+                    source.seek(bin_offset)
+                    self.copy_range(source, f, kept_length)
+                f.flush()
+                self.write_bin(f.fileno(), new_bin_offset, kept_length, patches, appended)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        shutil.copymode(self.source_path, f.name)
+        os.replace(f.name, self.export_path)
+        return self.export_path
+
+    def read_layout(self) -> tuple[int, int, int]:
+        """Returns json chunk length, BIN chunk length and file size of the source GLB"""
+        with open(self.source_path, "rb") as f:
+            magic, version, _, json_length, json_type = struct.unpack("<4sIII4s", f.read(20))
+            if magic != b"glTF" or version != 2 or json_type != b"JSON":
+                raise Exception(f"{self.source_path} is not a version 2 GLB file.")
+            f.seek(json_length, os.SEEK_CUR)
+            bin_length, bin_type = struct.unpack("<I4s", f.read(CHUNK_HEADER_SIZE))
+            if bin_type != b"BIN\0":
+                raise Exception(f"{self.source_path} has no BIN chunk.")
+            return json_length, bin_length, os.fstat(f.fileno()).st_size
+
+    @classmethod
+    def referenced_buffer_views(cls, node: object) -> set[int]:
+        """Indices of every bufferView referenced in glTF json node, by accessors, images
+        or extensions"""
+        referenced: set[int] = set()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "bufferView" and isinstance(value, int):
+                    referenced.add(value)
+                else:
+                    referenced |= cls.referenced_buffer_views(value)
+        elif isinstance(node, list):
+            for value in node:
+                referenced |= cls.referenced_buffer_views(value)
+        return referenced
+
+    @staticmethod
+    def accessor_offset(gltf: dict, accessor: dict, arr: np.ndarray) -> int:
+        """Returns the BIN chunk offset of a tightly packed accessor arr may overwrite"""
+        if accessor.get("bufferView") is None or accessor.get("sparse"):
+            raise Exception("Only tightly packed accessors in the BIN chunk can be patched.")
+        buffer_view = gltf["bufferViews"][accessor["bufferView"]]
+        dtype = np.dtype(ComponentType.to_numpy_dtype(accessor["componentType"]))
+        default_stride = dtype.itemsize * DataType.num_elements(accessor["type"])
+        # exported files write absent properties as null
+        if (
+            buffer_view["buffer"] != 0
+            or (buffer_view.get("byteStride") or default_stride) != default_stride
+        ):
+            raise Exception("Only tightly packed accessors in the BIN chunk can be patched.")
+        if arr.dtype != dtype or arr.nbytes != accessor["count"] * default_stride:
+            raise Exception("Accessor type or size has changed, it can't be patched.")
+        if (accessor.get("byteOffset") or 0) + arr.nbytes > buffer_view["byteLength"]:
+            raise Exception("Accessor overruns its bufferView, it can't be patched.")
+        return (buffer_view.get("byteOffset") or 0) + (accessor.get("byteOffset") or 0)
+
+    @staticmethod
+    def write_bin(
+        fd: int,
+        bin_offset: int,
+        bin_length: int,
+        patches: list[tuple[int, memoryview]],
+        appended: bytearray,
+    ) -> None:
+        """Positioned writes of patches and appended data into the BIN chunk at bin_offset"""
+        for offset, data in patches:
+            os.pwrite(fd, data, bin_offset + offset)
+        if appended:
+            os.pwrite(fd, appended, bin_offset + bin_length)
+
+    @staticmethod
+    def copy_range(source, destination, length: int) -> None:
+        """Copy length bytes from the current position of source to destination"""
+        while length > 0:
+            chunk = source.read(min(length, shutil.COPY_BUFSIZE))
+            if not chunk:
+                raise Exception("Unexpected end of source file.")
+            destination.write(chunk)
+            length -= len(chunk)
@@ -1,37 +1,54 @@
 from __future__ import annotations
 
-from time import time
+import os
+from collections.abc import Iterable, Mapping, Sequence
+from typing import TYPE_CHECKING
 
 import numpy as np
-from crypto_gltf.data.asset_file_data_types import Gltf2Data
+from crypto_gltf.data.asset_file_data_types import Gltf2Data, LazyDict, LazySequence
 from crypto_gltf.data.types import AAD_DATA, Composition
 from crypto_gltf.io.file.base_file import BaseFile
+from crypto_gltf.io.file.gltf2.com.gltf2_io_constants import ComponentType
 from crypto_gltf.io.file.gltf2.exp.gltf2_exporter import GlTF2Exporter
+from crypto_gltf.io.file.gltf2.exp.gltf2_patcher import GlTF2Patcher
 from crypto_gltf.io.file.gltf2.imp.gltf2_imp_binary_data import (
     BinaryData as ImpBinaryData,
 )
 from crypto_gltf.io.file.gltf2.imp.gltf2_importer import GlTF2Importer
 from crypto_gltf.io.plaintext.plnm import PlnM
+from crypto_gltf.profiling import span
 from loguru import logger
-from PIL import Image
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+
+def _decode_accessor(gltf_importer: GlTF2Importer, idx: int) -> np.ndarray:
+    with span("decode") as decode_span:
+        arr = ImpBinaryData.decode_accessor(gltf_importer, idx, cache=True)
+        decode_span.add_bytes(arr.nbytes)
+    return arr
+
+
+def _decode_image(gltf_importer: GlTF2Importer, idx: int) -> Image.Image:
+    with span("decode_image") as decode_span:
+        image = ImpBinaryData.decode_image(gltf_importer, idx)
+        decode_span.add_bytes(image.width * image.height * len(image.getbands()))
+    return image
 
 
 class GLTFFile(BaseFile):
     data: Gltf2Data
 
     @classmethod
-    def load(cls, import_path: str) -> GLTFFile:
-        """Load an glTF/glb file"""
+    def load(cls, import_path: str, use_mmap: bool = False) -> GLTFFile:
+        """Load an glTF/glb file, memory mapped if use_mmap"""
 
-        tic = time()
-        gltf_importer = GlTF2Importer.from_filepath(
-            filepath=import_path,
-        )
-        for i in range(len(gltf_importer.accessors)):
-            ImpBinaryData.decode_accessor(gltf_importer, i, cache=True)
-
-        for i in range(len(gltf_importer.images)):
-            ImpBinaryData.decode_image(gltf_importer, i)
+        with span("import", os.path.getsize(import_path)):
+            gltf_importer = GlTF2Importer.from_filepath(
+                filepath=import_path,
+                use_mmap=use_mmap,
+            )
         if gltf_importer.glb_buffer:
             filename_ext = ".glb"
             is_glb = True
@@ -39,31 +56,59 @@ class GLTFFile(BaseFile):
             filename_ext = ".gltf"
             is_glb = False
 
+        # accessors and images are decoded on first access
         data = Gltf2Data(
             gltf=gltf_importer.gltf,
-            images=gltf_importer.image_cache,
-            accessors=gltf_importer.accessor_cache,
+            images=LazyDict(
+                range(len(gltf_importer.images)),
+                lambda i: _decode_image(gltf_importer, i),
+            ),
+            accessors=LazyDict(
+                range(len(gltf_importer.accessors)),
+                lambda i: _decode_accessor(gltf_importer, i),
+            ),
             is_glb=is_glb,
+            source=gltf_importer,
         )
-
-        # logger.debug(f"{filename_ext[1:]} import took {time()-tic} seconds")
         return cls(data=data, import_path=import_path, filename_ext=filename_ext)
 
-    def save(self, export_dir: str, images_encrypted: bool = False) -> str:
-        """Save to glTF/glb file"""
+    def save(
+        self, export_dir: str, images_encrypted: bool = False, passthrough: bool = True
+    ) -> str:
+        """Save to glTF/glb file. If passthrough, accessors and images that were never loaded
+        are copied from the source file as is, instead of being re-encoded"""
 
-        tic = time()
-        gltf_exporter = GlTF2Exporter(
-            export_dir=export_dir,
-            filename=self.filename,
-            is_glb=self.data.is_glb,
-            filename_ext=self.filename_ext,
-            images_encrypted=images_encrypted,
-        )
-        export_filepath = gltf_exporter.export(self.data)
+        with span("export") as export_span:
+            gltf_exporter = GlTF2Exporter(
+                export_dir=export_dir,
+                filename=self.filename,
+                is_glb=self.data.is_glb,
+                filename_ext=self.filename_ext,
+                images_encrypted=images_encrypted,
+                passthrough=passthrough,
+            )
+            export_filepath = gltf_exporter.export(self.data)
+            if export_span.recording:
+                export_span.add_bytes(
+                    sum(os.path.getsize(path) for path in set(gltf_exporter.written_paths))
+                )
 
-        # logger.debug(f"{self.filename_ext[1:]} export took {time()-tic} seconds")
+        return export_filepath
 
+    def patch(self, export_dir: str | None = None) -> str:
+        """Write modified accessors and the aad straight into a copy of the source GLB in export_dir,
+        or into the source GLB itself if export_dir is None. Only the json chunk is rewritten,
+        requires images to be untouched"""
+        if export_dir is None:
+            export_path = self.import_path
+        else:
+            export_path = f"{export_dir}/{self.filename}{self.filename_ext}"
+        with span("export") as export_span:
+            export_filepath = GlTF2Patcher(
+                source_path=self.import_path, export_path=export_path
+            ).patch(self.data)
+            if export_span.recording:
+                export_span.add_bytes(os.path.getsize(export_filepath))
         return export_filepath
 
     @property
@@ -84,9 +129,131 @@ class GLTFFile(BaseFile):
             images_dim=len(images),
         )
 
+    @property
+    def float_accessor_idxs(self) -> list[int]:
+        """Indices of non-empty accessors that decode to floats, read from the json only"""
+        return [
+            idx
+            for idx, accessor in enumerate(self.data.gltf.get("accessors", []))
+            if (accessor["componentType"] == ComponentType.Float or accessor.get("normalized"))
+            and accessor["count"] > 0
+        ]
+
+    def cipher_plnm(self, images: bool = False, lazy: bool = False) -> PlnM:
+        """Get plaintext of float accessors, and images if images.
+        Integer accessors and unused images are never decoded.
+        If lazy, accessors and images are only decoded when their item is first accessed"""
+        float_accessor_idxs = self.float_accessor_idxs
+        accessors: Sequence[np.ndarray]
+        image_arrs: Sequence[np.ndarray]
+        if lazy:
+            accessors = LazySequence(
+                len(float_accessor_idxs),
+                lambda position: self.data.accessors[float_accessor_idxs[position]],
+            )
+            image_arrs = LazySequence(
+                len(self.data.images) if images else 0,
+                lambda idx: np.asarray(self.data.images[idx], dtype=np.uint8),
+            )
+        else:
+            accessors = [self.data.accessors[idx] for idx in float_accessor_idxs]
+            image_arrs = (
+                [np.asarray(image, dtype=np.uint8) for image in self.data.images.values()]
+                if images
+                else []
+            )
+        return PlnM(
+            meshes=accessors,
+            images=image_arrs,
+            meshes_dim=len(accessors),
+            images_dim=len(image_arrs),
+        )
+
+    def cipher_plnm_selection(
+        self, meshes: Iterable[int] | None = None, nodes: Iterable[int] | None = None
+    ) -> tuple[list[int], list[int]]:
+        """Return the indices of the cipher_plnm meshes and images used by meshes,
+        and by every mesh of the node subtrees nodes. Images are those of the textures
+        of the meshes' materials"""
+        gltf = self.data.gltf
+        mesh_idxs = set(meshes or [])
+
+        stack = list(nodes or [])
+        visited: set[int] = set()
+        while stack:
+            node_idx = stack.pop()
+            if node_idx in visited:
+                continue
+            visited.add(node_idx)
+            node = gltf["nodes"][node_idx]
+            if node.get("mesh") is not None:
+                mesh_idxs.add(node["mesh"])
+            stack.extend(node.get("children", []))
+
+        accessor_idxs: set[int] = set()
+        material_idxs: set[int] = set()
+        for mesh_idx in mesh_idxs:
+            for primitive in gltf["meshes"][mesh_idx]["primitives"]:
+                accessor_idxs.update(primitive["attributes"].values())
+                for target in primitive.get("targets", []):
+                    accessor_idxs.update(target.values())
+                if primitive.get("material") is not None:
+                    material_idxs.add(primitive["material"])
+
+        # texture infos are the objects with an index within a material
+        texture_idxs: set[int] = set()
+        pending: list = [gltf["materials"][idx] for idx in material_idxs]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, dict):
+                if isinstance(item.get("index"), int):
+                    texture_idxs.add(item["index"])
+                pending.extend(item.values())
+            elif isinstance(item, list):
+                pending.extend(item)
+        image_idxs = {
+            gltf["textures"][idx]["source"]
+            for idx in texture_idxs
+            if gltf["textures"][idx].get("source") is not None
+        }
+
+        return (
+            [
+                position
+                for position, idx in enumerate(self.float_accessor_idxs)
+                if idx in accessor_idxs
+            ],
+            sorted(image_idxs),
+        )
+
+    def insert_cipher_plnm(self, plnm: PlnM, images: bool = False) -> None:
+        """Insert plaintext returned by cipher_plnm"""
+        for idx, mesh in zip(self.float_accessor_idxs, plnm.meshes):
+            self.data.accessors[idx] = mesh
+        if images:
+            from PIL import Image
+
+            for idx, image in enumerate(plnm.images):
+                self.data.images[idx] = Image.fromarray(image)
+
+    def insert_cipher_arrays(
+        self, meshes: Mapping[int, np.ndarray], images: Mapping[int, np.ndarray]
+    ) -> None:
+        """Insert only the given cipher_plnm meshes and images by index,
+        other accessors and images are never decoded, so patch and save pass them through"""
+        float_accessor_idxs = self.float_accessor_idxs
+        for position, mesh in meshes.items():
+            self.data.accessors[float_accessor_idxs[position]] = mesh
+        if images:
+            from PIL import Image
+
+            for idx, image in images.items():
+                self.data.images[idx] = Image.fromarray(image)
+
     def insert_plnm(self, plnm: PlnM) -> None:
         """Insert plaintext in GLTFFile
         assumes the plaintext data came from the same GLTFFile"""
+        from PIL import Image
 
         self.data.accessors = {idx: mesh for idx, mesh in enumerate(plnm.meshes)}
         self.data.images = {
@@ -99,15 +266,23 @@ class GLTFFile(BaseFile):
         num_accessors = len(self.data.accessors)
         assert Composition.AAD == aad.aad
         self.data.accessors[num_accessors] = aad.aad
-        self.data.gltf["accessors"].append(
-            {
-                "bufferView": num_accessors,
-                "byteOffset": 0,
-                "componentType": 5125,
-                "count": len(aad.aad),
-                "type": "VEC3",
-            }
-        )
+        accessor = {
+            "bufferView": num_accessors,
+            "byteOffset": 0,
+            "componentType": 5125,
+            "count": len(aad.aad),
+            "type": "VEC3",
+        }
+        source = self.data.source
+        if (
+            source is not None
+            and num_accessors < len(source.accessors)
+            and source.accessors[num_accessors].count == len(aad.aad)
+        ):
+            # replaces the aad read from the file, which patch overwrites where it is
+            accessor["bufferView"] = source.accessors[num_accessors].buffer_view
+            accessor["byteOffset"] = source.accessors[num_accessors].byte_offset or 0
+        self.data.gltf["accessors"].append(accessor)
         encryption_info = {
             "encrypted": True,
             "accessor": num_accessors,
@@ -115,6 +290,8 @@ class GLTFFile(BaseFile):
             "meshes_params": aad.meshes_params,
             "images_params": aad.images_params,
         }
+        if aad.segments is not None:
+            encryption_info["segments"] = aad.segments
 
         extras = self.data.gltf["asset"].get("extras")
         if extras is not None:
@@ -122,9 +299,8 @@ class GLTFFile(BaseFile):
         else:
             self.data.gltf["asset"]["extras"] = {"encryption_info": encryption_info}
 
-    @property
-    def aad(self) -> AAD_DATA:
-        """Retrieve embedded aad data"""
+    def read_aad(self) -> AAD_DATA:
+        """Retrieve embedded aad data, leaving it in the file"""
 
         encryption_info = self.data.gltf["asset"].get("extras").get("encryption_info")
         if not encryption_info:
@@ -132,16 +308,24 @@ class GLTFFile(BaseFile):
         if not encryption_info["encrypted"]:
             raise Exception("Asset not encrypted")
 
-        aad_accessor_idx = encryption_info["accessor"]
-        aad = self.data.accessors[aad_accessor_idx]
-
-        # remove embedded aad
-        self.data.gltf["accessors"].pop(aad_accessor_idx)
-        self.data.accessors.pop(aad_accessor_idx)
-
+        aad = self.data.accessors[encryption_info["accessor"]]
         return AAD_DATA(
             aad=aad,
             encrypt_images=encryption_info["images_encrypted"],
             meshes_params=encryption_info["meshes_params"],
             images_params=encryption_info["images_params"],
+            segments=encryption_info.get("segments"),
         )
+
+    def remove_aad(self) -> None:
+        """Remove embedded aad data from the file"""
+        aad_accessor_idx = self.data.gltf["asset"]["extras"]["encryption_info"]["accessor"]
+        self.data.gltf["accessors"].pop(aad_accessor_idx)
+        del self.data.accessors[aad_accessor_idx]
+
+    @property
+    def aad(self) -> AAD_DATA:
+        """Retrieve embedded aad data and remove it from the file"""
+        aad = self.read_aad()
+        self.remove_aad()
+        return aad
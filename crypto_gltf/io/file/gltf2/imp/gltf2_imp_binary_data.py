@@ -1,10 +1,15 @@
+from __future__ import annotations
+
 import io
+from typing import TYPE_CHECKING
 
 import numpy as np
 from crypto_gltf.io.file.gltf2.com.gltf2_io import Accessor
 from crypto_gltf.io.file.gltf2.com.gltf2_io_constants import ComponentType, DataType
 from crypto_gltf.io.file.gltf2.imp.gltf2_importer import GlTF2Importer
-from PIL import Image
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 class BinaryData:
@@ -50,6 +55,24 @@ class BinaryData:
 
         return loaded_buffer[byte_offset : byte_offset + buffer_view.byte_length]
 
+    @staticmethod
+    def get_accessor_bytes(gltf: GlTF2Importer, accessor_idx: int) -> memoryview | None:
+        """Get the source bytes of a tightly packed accessor, exactly as they decode.
+        Returns None for accessors that must be decoded (no buffer view, strided or sparse)"""
+        accessor = gltf.accessors[accessor_idx]
+        if accessor.buffer_view is None or accessor.sparse:
+            return None
+
+        dtype = ComponentType.to_numpy_dtype(accessor.component_type)
+        default_stride = np.dtype(dtype).itemsize * DataType.num_elements(accessor.type)
+        stride = gltf.buffer_views[accessor.buffer_view].byte_stride
+        if stride is not None and stride != default_stride:
+            return None
+
+        data = BinaryData.get_buffer_view(gltf, accessor.buffer_view)
+        accessor_offset = accessor.byte_offset or 0
+        return data[accessor_offset : accessor_offset + accessor.count * default_stride]
+
     @staticmethod
     def get_data_from_accessor(
         gltf: GlTF2Importer, accessor_idx: int, cache=False
@@ -196,6 +219,8 @@ class BinaryData:
     @staticmethod
     def decode_image(gltf: GlTF2Importer, image_idx: int) -> Image.Image:
         """Decode image (acccessor or file) to PIL image file, store in cache"""
+        from PIL import Image
+
         image_data = BinaryData.get_image_data(gltf, image_idx)
         dataBytesIO = io.BytesIO(image_data)
 
@@ -2,17 +2,21 @@ from __future__ import annotations
 
 import base64
 import json
+import mmap
 import os
 import struct
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 import numpy as np
 from crypto_gltf.data.types import JSONDict
 from crypto_gltf.io.file.gltf2.com.gltf2_io import Accessor, Buffer, BufferView, Image
 from crypto_gltf.io.file.gltf2.utils import uri_to_path
-from PIL import Image as PILImage
 from pydantic import BaseModel, ConfigDict
 
+if TYPE_CHECKING:
+    from PIL import Image as PILImage
+
 
 class GlbModel(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -44,14 +48,16 @@ class GlTF2Importer:
     accessor_cache: dict[int, np.ndarray]
     image_cache: dict[int, PILImage.Image]
 
+    use_mmap: bool = False
+
     @classmethod
-    def from_filepath(cls, filepath: str) -> GlTF2Importer:
-        """Load glTF from filepath"""
+    def from_filepath(cls, filepath: str, use_mmap: bool = False) -> GlTF2Importer:
+        """Load glTF from filepath. If use_mmap, the file and external buffers are memory mapped
+        read only, so accessors are decoded over the mapping and unread data is never paged in"""
         if not os.path.isfile(filepath):
             raise ImportError("Please select a file")
 
-        with open(filepath, "rb") as f:
-            content = memoryview(f.read())
+        content = cls.read_file(filepath, use_mmap)
 
         if content[:4] == b"glTF":
             glb_model = cls.load_glb(content)
@@ -94,8 +100,18 @@ class GlTF2Importer:
             accessor_cache={},
             loaded_buffers={},
             image_cache={},
+            use_mmap=use_mmap,
         )
 
+    @staticmethod
+    def read_file(path: str, use_mmap: bool = False) -> memoryview:
+        """Read file at path, or memory map it read only if use_mmap"""
+        with open(path, "rb") as f:
+            if use_mmap and os.fstat(f.fileno()).st_size > 0:
+                # the mapping outlives the file descriptor, it's unmapped once unreferenced
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            return memoryview(f.read())
+
     def load_buffer(self, buffer_idx: int) -> None:
         """Load buffer."""
         buffer = self.buffers[buffer_idx]
@@ -122,8 +138,7 @@ class GlTF2Importer:
 
         path = os.path.join(os.path.dirname(self.filepath), uri_to_path(uri))
         try:
-            with open(path, "rb") as f_:
-                return memoryview(f_.read())
+            return self.read_file(path, self.use_mmap)
         except Exception as e:
             raise Exception(f"Couldn't read file: {path}") from e
 
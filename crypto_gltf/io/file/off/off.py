@@ -1,96 +1,164 @@
 from __future__ import annotations
 
 import os
-import struct
+import re
+import warnings
 
 import numpy as np
 from crypto_gltf.data.asset_file_data_types import OffData
 from crypto_gltf.data.types import AAD_DATA, Composition
 from crypto_gltf.io.file.base_file import BaseFile
 from crypto_gltf.io.plaintext.plnm import PlnM
+from crypto_gltf.profiling import span
 from loguru import logger
 
+COMMENT_PATTERN = re.compile(rb"#[^\n]*")
+WRITE_CHUNK_ROWS = 1 << 16  # rows formatted per write, bounds the size of formatted text
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _content_lines(text: bytes) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns start offset, end offset and token count of every non blank line of text"""
+    chars = np.frombuffer(text, dtype=np.uint8)
+    newlines = np.flatnonzero(chars == ord("\n"))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(chars)]))
+
+    space = chars <= ord(" ")  # whitespace and control characters
+    token_starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+    counts = np.searchsorted(token_starts, ends) - np.searchsorted(token_starts, starts)
+    content = counts > 0
+    return starts[content], ends[content], counts[content]
+
+
+def _parse_lines(
+    text: bytes,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    counts: np.ndarray,
+    dtypes: tuple[type, ...] = (np.float64,),
+) -> tuple[np.ndarray, np.ndarray]:
+    """Parses the numbers of consecutive lines of text in one pass, with the first of dtypes
+    that reads every token. Returns the flat values and the offset of each line's first value"""
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    if not len(starts):
+        return np.array([], dtype=dtypes[-1]), offsets[:0]
+    section = text[starts[0] : ends[-1]]
+    for dtype in dtypes:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)  # checked by size below
+            values = np.fromstring(section, dtype=dtype, sep=" ")
+        if values.size == counts.sum():
+            return values, offsets
+    raise Exception("Malformatted number. Bad .off file.")
+
+
+def _write_rows(fp, fmt: str, *blocks: np.ndarray, shortest_repr: bool = False) -> None:
+    """Writes the rows of blocks, side by side, formatted with fmt. Formats a whole chunk
+    of rows per write. shortest_repr converts float blocks to their shortest repr strings"""
+    for start in range(0, len(blocks[0]), WRITE_CHUNK_ROWS):
+        chunks = [block[start : start + WRITE_CHUNK_ROWS] for block in blocks]
+        if shortest_repr:
+            chunks = [
+                chunk.astype(str) if chunk.dtype.kind == "f" else chunk for chunk in chunks
+            ]
+        if len(chunks) > 1:
+            chunk = np.hstack([chunk.astype(object) for chunk in chunks])
+        else:
+            chunk = chunks[0]
+        fp.write((fmt * len(chunk)).format(*chunk.ravel().tolist()))
+
+
+def _num_used_vertices(faces: np.ndarray | list[tuple[int, ...]]) -> int:
+    """Returns one more than the largest vertex index of faces"""
+    if isinstance(faces, np.ndarray):
+        return int(faces.max()) + 1
+    return int(max(map(max, faces))) + 1
+
 
 class OffFile(BaseFile):
     data: OffData
 
     @classmethod
-    def load(cls, import_path: str) -> OffFile:
-        """Load an OFF Mesh file"""
+    def load(cls, import_path: str, use_mmap: bool = False) -> OffFile:
+        """Load an OFF Mesh file. OFF is a text format, so use_mmap has no effect"""
+        with span("import", os.path.getsize(import_path)):
+            return cls._parse(import_path)
 
+    @classmethod
+    def _parse(cls, import_path: str) -> OffFile:
         # Parse mesh from OFF file
         import_path_bin = os.fsencode(import_path)
-        file = open(import_path_bin, "r")
-        first_line = file.readline().rstrip()
-        use_colors = first_line == "COFF"
-        colors = []
-
-        # handle blank and comment lines after the first line
-        line = file.readline()
-        while line.isspace() or line[0] == "#":
-            line = file.readline()
-
-        vcount, fcount, ecount = [int(x) for x in line.split()]
-        verts = []
-        faces = []
-        edges = []
-        i = 0
-        while i < vcount:
-            line = file.readline()
-            if line.isspace():
-                continue  # skip empty lines
-            try:
-                bits = [float(x) for x in line.split()]
-                px = bits[0]
-                py = bits[1]
-                pz = bits[2]
-                if use_colors:
-                    colors.append(
-                        [
-                            float(bits[3]) / 255,
-                            float(bits[4]) / 255,
-                            float(bits[5]) / 255,
-                            1.0,
-                        ]
-                    )
-
-            except ValueError:
-                i = i + 1
-                continue
-            verts.append((px, py, pz))
-            i = i + 1
-
-        i = 0
-        while i < fcount:
-            line = file.readline()
-            if line.isspace():
-                continue  # skip empty lines
-            try:
-                splitted = line.split()
-                ids = list(map(int, splitted))
-                if len(ids) > 3:
-                    faces.append(tuple(ids[1:]))
-                elif len(ids) == 3:
-                    edges.append(tuple(ids[1:]))
-            except ValueError:
-                i = i + 1
-                continue
-            i = i + 1
+        with open(import_path_bin, "rb") as file:
+            text = file.read()
+        if b"#" in text:
+            text = COMMENT_PATTERN.sub(b"", text)
+
+        # line offsets of everything but blank and comment lines
+        starts, ends, counts = _content_lines(text)
+        if len(starts) < 2:
+            raise Exception("Malformatted header. Bad .off file.")
+        use_colors = text[starts[0] : ends[0]].strip() == b"COFF"
+        vcount, fcount, ecount = [int(x) for x in text[starts[1] : ends[1]].split()]
+        if len(starts) < 2 + vcount + fcount:
+            raise Exception("Missing vertices or faces. Bad .off file.")
+
+        vert_lines = slice(2, 2 + vcount)
+        if (counts[vert_lines] < (6 if use_colors else 3)).any():
+            raise Exception("Malformatted vertices. Bad .off file.")
+        values, offsets = _parse_lines(
+            text, starts[vert_lines], ends[vert_lines], counts[vert_lines]
+        )
+        verts = values[offsets[:, None] + np.arange(3)]
+        if use_colors:
+            rgb = values[offsets[:, None] + np.arange(3, 6)] / 255
+            colors = np.hstack((rgb, np.ones((vcount, 1))))
+        else:
+            colors = np.array([])
+
+        face_lines = slice(2 + vcount, 2 + vcount + fcount)
+        ids, offsets = _parse_lines(
+            text,
+            starts[face_lines],
+            ends[face_lines],
+            counts[face_lines],
+            dtypes=(np.int64, np.float64),  # integer parsing is much faster
+        )
+        sizes = ids[offsets].astype(np.int64)
+        if (counts[face_lines] <= sizes).any():
+            raise Exception("Malformatted faces. Bad .off file.")
+        offsets, sizes = offsets[sizes > 2], sizes[sizes > 2]  # skip edges
+        if (sizes == 3).all():
+            # triangle mesh fast path
+            faces = ids[offsets[:, None] + np.arange(1, 4)].astype(np.int64)
+        else:
+            ids = ids.astype(np.int64).tolist()
+            faces = [
+                tuple(ids[offset + 1 : offset + 1 + size])
+                for offset, size in zip(offsets.tolist(), sizes.tolist())
+            ]
 
         # logger.info(f".off file loaded from {import_path}")
 
         return cls(
             import_path=import_path,
             data=OffData(
-                verts=np.array(verts, dtype=np.float32),
+                verts=verts.astype(np.float32),
                 faces=faces,
-                colors=np.array(colors, dtype=np.float32),
+                colors=colors.astype(np.float32),
+                num_used_vertices=_num_used_vertices(faces) if len(faces) else None,
             ),
             filename_ext=".off",
         )
 
-    def save(self, export_dir: str, images_encrypted: bool = False) -> str:
-        """Save to OFF Mesh file"""
+    def save(
+        self,
+        export_dir: str,
+        images_encrypted: bool = False,
+        shortest_repr: bool = False,
+    ) -> str:
+        """Save to OFF Mesh file. shortest_repr writes vertices with the shortest
+        decimal that parses back to the same float32, rather than at .64 precision"""
 
         off_data = self.data
 
@@ -98,32 +166,39 @@ class OffFile(BaseFile):
         faces = off_data.faces
         colors = off_data.colors
 
+        vert_fmt = "{} {} {}" if shortest_repr else "{:.64} {:.64} {:.64}"
+        vert_blocks = [verts]
+        if colors.size > 0:
+            vert_blocks.append(np.rint(colors[:, :3] * 255).astype(np.int64))
+            vert_fmt += " {:d} {:d} {:d} 255"
+
         # Write geometry to file
         export_filepath = f"{export_dir}/{self.export_filename}"
         export_dir_bin = os.fsencode(export_filepath)
-        fp = open(export_dir_bin, "w")
-
-        if colors.size > 0:
-            fp.write("COFF\n")
-        else:
-            fp.write("OFF\n")
-
-        fp.write("%d %d 0\n" % (len(verts), len(faces)))
-
-        for i, vert in enumerate(verts):
-            fp.write(f"{vert[0]:.64} {vert[1]:.64} {vert[2]:.64}")
+        with span("export") as export_span, open(
+            export_dir_bin, "w", buffering=WRITE_BUFFER_SIZE
+        ) as fp:
             if colors.size > 0:
-                fp.write(f" {colors[i][0]:d} {colors[i][1]:d} {colors[i][2]:d} 255")
-            fp.write("\n")
-
-        # for face in faces:
-        for i, face in enumerate(faces):
-            fp.write("%d" % len(face))
-            for vid in face:
-                fp.write(" %d" % vid)
-            fp.write("\n")
-
-        fp.close()
+                fp.write("COFF\n")
+            else:
+                fp.write("OFF\n")
+
+            fp.write("%d %d 0\n" % (len(verts), len(faces)))
+
+            _write_rows(fp, vert_fmt + "\n", *vert_blocks, shortest_repr=shortest_repr)
+
+            if isinstance(faces, np.ndarray):
+                size = faces.shape[1]
+                _write_rows(fp, f"{size}" + " {:d}" * size + "\n", faces)
+            else:
+                for start in range(0, len(faces), WRITE_CHUNK_ROWS):
+                    fp.write(
+                        "".join(
+                            "%d %s\n" % (len(face), " ".join(map(str, face)))
+                            for face in faces[start : start + WRITE_CHUNK_ROWS]
+                        )
+                    )
+            export_span.add_bytes(fp.tell())
 
         # logger.info(f".off file saved to {export_filepath}")
 
@@ -146,20 +221,30 @@ class OffFile(BaseFile):
         self.data.verts = plnm.meshes[0]
         self.data.colors = plnm.meshes[1]
 
+    @property
+    def num_used_vertices(self) -> int:
+        """Number of vertices referenced by faces, cached from load.
+        Vertices past it hold the embedded aad"""
+        if self.data.num_used_vertices is None:
+            self.data.num_used_vertices = _num_used_vertices(self.data.faces)
+        return self.data.num_used_vertices
+
     def embed_aad(self, aad: AAD_DATA) -> None:
         """Embed aad data in file for retrieval during decryption"""
 
         assert Composition.AAD == aad.aad
-        num_used_vertices = max(max(x) for x in self.data.faces) + 1
+        if aad.segments is not None:
+            raise Exception("Segmented encryption is not supported for .off files.")
+        num_used_vertices = self.num_used_vertices
 
-        # so that massive aad vertices don't interfere in rendering, we set all bits larger than 16 to 0
-        # and divide the array in half
+        # so that massive aad vertices don't interfere in rendering, each float32 carries 16 bits:
+        # aad_16 is a native-order uint16 view of the uint32 aad, two per value, and each uint16
+        # is stored big endian in the first two bytes of a float32 whose last two bytes are 0
         aad_16 = np.frombuffer(aad.aad.tobytes(), dtype=np.uint16)
-        buffer = bytearray(b"")
-        for val in aad_16:
-            buffer.extend(struct.pack(">HH", val, np.uint16(0)))
+        halves = np.zeros((len(aad_16), 2), dtype=">u2")
+        halves[:, 0] = aad_16
 
-        aad_float32 = np.frombuffer(buffer, dtype=np.float32).reshape((-1, 3))
+        aad_float32 = halves.view(np.float32).reshape((-1, 3))
         params = np.array(
             [
                 [
@@ -176,20 +261,17 @@ class OffFile(BaseFile):
     @property
     def aad(self) -> AAD_DATA:
         """Retrieve embedded aad data"""
-        num_used_vertices = max(max(x) for x in self.data.faces) + 1
+        num_used_vertices = self.num_used_vertices
         params = self.data.verts[-1]
-        aad = self.data.verts[num_used_vertices:][:-1]
+        aad = np.ascontiguousarray(self.data.verts[num_used_vertices:][:-1])
         self.data.verts = self.data.verts[
             :num_used_vertices
         ]  # remove embedded aad data
 
-        # retrieve split aad values
-        buffer = bytearray(b"")
-        for val in aad.flatten():
-            bits, _ = struct.unpack(">HH", val)
-            buffer.extend(np.uint16(bits).tobytes())
-
-        aad = np.frombuffer(buffer, dtype=np.uint32).reshape((-1, 3))
+        # retrieve the native-order uint16 view of the aad, stored big endian
+        # in the first two bytes of each float32
+        aad_16 = aad.view(">u2").reshape((-1, 2))[:, 0].astype(np.uint16)
+        aad = aad_16.view(np.uint32).reshape((-1, 3))
 
         params_dic = {"p": int(params[0]), "q": int(params[1]), "r": int(params[2])}
         return AAD_DATA(
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 import numpy as np
 from crypto_gltf.data.types import PlnMDataType
 from crypto_gltf.io.plaintext.base_plaintext import BasePlainText
-from PIL import Image
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 
 @dataclass
@@ -37,6 +40,7 @@ class PlnM(BasePlainText):
     @property
     def renders(self) -> list[Image.Image]:
         """Render image data classes"""
+        from PIL import Image
 
         renders = []
         for image in self.images:
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter
+from typing import ClassVar
+
+"""Instrumentation of pipeline stages. Stages run inside spans, which report their duration
+and bytes processed to registered callbacks. With no callbacks registered span returns a
+shared no-op span, so disabled instrumentation costs one function call per stage"""
+
+
+@dataclass
+class Span:
+    """A timed stage, passed to every callback when it ends"""
+
+    name: str
+    nbytes: int = 0
+    start: float = 0.0
+    seconds: float = 0.0
+    failed: bool = False  # the stage raised
+    recording: ClassVar[bool] = True  # callbacks receive the span, worth measuring for
+
+    def add_bytes(self, nbytes: int) -> None:
+        self.nbytes += nbytes
+
+    def __enter__(self) -> Span:
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.seconds = perf_counter() - self.start
+        self.failed = exc_type is not None
+        for callback in _callbacks:
+            callback(self)
+
+
+class NullSpan:
+    """Span used while instrumentation is disabled, does nothing"""
+
+    recording = False
+
+    def add_bytes(self, nbytes: int) -> None:
+        pass
+
+    def __enter__(self) -> NullSpan:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+SpanCallback = Callable[[Span], None]
+NULL_SPAN = NullSpan()
+# replaced rather than mutated, so spans ending on other threads iterate safely
+_callbacks: tuple[SpanCallback, ...] = ()
+
+
+def add_callback(callback: SpanCallback) -> None:
+    """Register callback to receive every span that ends from now on"""
+    global _callbacks
+    _callbacks = (*_callbacks, callback)
+
+
+def remove_callback(callback: SpanCallback) -> None:
+    global _callbacks
+    _callbacks = tuple(c for c in _callbacks if c != callback)
+
+
+def span(name: str, nbytes: int = 0) -> Span | NullSpan:
+    """Returns a span timing a stage, a no-op if no callbacks are registered"""
+    if not _callbacks:
+        return NULL_SPAN
+    return Span(name=name, nbytes=nbytes)
+
+
+class SpanRecorder:
+    """Callback collecting spans"""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def totals(self) -> dict[str, dict[str, float]]:
+        """Returns total seconds, bytes and count of the spans of each stage"""
+        totals: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, {"seconds": 0.0, "nbytes": 0, "count": 0})
+            total["seconds"] += span.seconds
+            total["nbytes"] += span.nbytes
+            total["count"] += 1
+        return totals
+
+
+@contextmanager
+def recording() -> Iterator[SpanRecorder]:
+    """Record every span ending within the context"""
+    recorder = SpanRecorder()
+    add_callback(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_callback(recorder)
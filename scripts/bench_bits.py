@@ -0,0 +1,51 @@
+import argparse
+from time import perf_counter
+
+import numpy as np
+from crypto_gltf.encrypt.adaptive.types import MeshesAdaptiveCipherParams
+from crypto_gltf.encrypt.adaptive.utils import (
+    BITS_BACKENDS,
+    buffer_length,
+    clib,
+    get_bits,
+    put_bits,
+    set_backend,
+)
+
+"""Benchmark get_bits/put_bits backends on a synthetic float32 accessor"""
+
+
+def bench(rows: int, repeats: int) -> None:
+    arr = np.random.random_sample((rows, 3)).astype(np.float32)
+    params = MeshesAdaptiveCipherParams(p=2, q=2, r=10)
+    backends = [b for b in BITS_BACKENDS if b != "c" or clib is not None]
+
+    for block in ["p", "q", "r"]:
+        start, stop = params.start(block), params.stop(block)
+        bufflen = buffer_length(start, stop, *arr.shape)
+        for backend in backends:
+            set_backend(backend)
+            get_time, put_time = float("inf"), float("inf")
+            for _ in range(repeats):
+                buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+                tic = perf_counter()
+                get_bits(arr, buffer, start, stop)
+                get_time = min(get_time, perf_counter() - tic)
+
+                tic = perf_counter()
+                put_bits(arr, buffer, start, stop)
+                put_time = min(put_time, perf_counter() - tic)
+
+            mb = arr.nbytes / 1e6
+            print(
+                f"{block} [{start}:{stop}] {backend:>5}: "
+                f"get_bits {mb / get_time:8.1f} MB/s, put_bits {mb / put_time:8.1f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark get_bits/put_bits backends")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    bench(rows=args.rows, repeats=args.repeats)
@@ -0,0 +1,254 @@
+import argparse
+import io
+import json
+import platform
+import struct
+import sys
+import tracemalloc
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import numpy as np
+from crypto_gltf import Asset
+from crypto_gltf.data.types import FileType
+from crypto_gltf.encrypt.adaptive.utils import get_backend, get_num_threads
+from crypto_gltf.profiling import recording
+from PIL import Image
+
+"""Benchmark import, decode, key derivation, bit extraction, GCM, bit insertion and export
+over the test assets and synthetic scenes, from the pipeline's profiling spans. Writes per stage
+timings, throughput over the encrypted plaintext bytes and peak memory to JSON,
+optionally checked against a baseline"""
+
+TEST_ASSET_DIR = Path(__file__).parent.parent / "tests" / "assets"
+SPAN_STAGES = (
+    "import",
+    "decode",
+    "decode_image",
+    "key_derivation",
+    "bit_extraction",
+    "gcm",
+    "bit_insertion",
+    "export",
+)
+STAGES = SPAN_STAGES + ("encrypt", "decrypt")
+
+
+def write_synthetic_glb(
+    path: str, vertices: int, textures: int, texture_size: int, seed: int = 0
+) -> str:
+    """Write a .glb of one triangle mesh with vertices random positions and uvs,
+    textured by textures random texture_size x texture_size PNGs"""
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-1, 1, (vertices, 3)).astype(np.float32)
+    uvs = rng.uniform(0, 1, (vertices, 2)).astype(np.float32)
+    indices = np.arange(vertices - vertices % 3, dtype=np.uint32)
+    pngs = []
+    for _ in range(textures):
+        pixels = rng.integers(0, 256, (texture_size, texture_size, 3), dtype=np.uint8)
+        png = io.BytesIO()
+        Image.fromarray(pixels).save(png, format="PNG", compress_level=1)
+        pngs.append(png.getvalue())
+
+    chunks = [positions.tobytes(), uvs.tobytes(), indices.tobytes(), *pngs]
+    buffer_views, offset = [], 0
+    for chunk in chunks:
+        buffer_views.append({"buffer": 0, "byteOffset": offset, "byteLength": len(chunk)})
+        offset += len(chunk) + (-len(chunk) % 4)
+    binary = b"".join(chunk + b"\0" * (-len(chunk) % 4) for chunk in chunks)
+
+    primitive = {"attributes": {"POSITION": 0, "TEXCOORD_0": 1}, "indices": 2}
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [primitive]}],
+        "accessors": [
+            {
+                "bufferView": 0,
+                "componentType": 5126,
+                "count": vertices,
+                "type": "VEC3",
+                "min": positions.min(axis=0).tolist(),
+                "max": positions.max(axis=0).tolist(),
+            },
+            {"bufferView": 1, "componentType": 5126, "count": vertices, "type": "VEC2"},
+            {"bufferView": 2, "componentType": 5125, "count": len(indices), "type": "SCALAR"},
+        ],
+        "bufferViews": buffer_views,
+        "buffers": [{"byteLength": len(binary)}],
+    }
+    if textures:
+        primitive["material"] = 0
+        gltf["images"] = [
+            {"bufferView": 3 + i, "mimeType": "image/png"} for i in range(textures)
+        ]
+        gltf["textures"] = [{"source": i} for i in range(textures)]
+        gltf["materials"] = [
+            {"pbrMetallicRoughness": {"baseColorTexture": {"index": i}}}
+            for i in range(textures)
+        ]
+
+    gltf_bytes = json.dumps(gltf).encode("utf-8")
+    gltf_bytes += b" " * (-len(gltf_bytes) % 4)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, 28 + len(gltf_bytes) + len(binary)))
+        f.write(struct.pack("<I4s", len(gltf_bytes), b"JSON") + gltf_bytes)
+        f.write(struct.pack("<I4s", len(binary), b"BIN\0") + binary)
+    return path
+
+
+def timed(func, *args, **kwargs) -> tuple[float, object]:
+    tic = perf_counter()
+    result = func(*args, **kwargs)
+    return perf_counter() - tic, result
+
+
+def run_stages(path: str, export_dir: str, encrypt_images: bool) -> tuple[dict[str, float], int]:
+    """Time each stage once, returns stage seconds and the number of plaintext bytes encrypted.
+    Inner stages are the spans recorded while loading, encrypting and saving path"""
+    seconds: dict[str, float] = {}
+    with recording() as recorder:
+        asset = Asset.load(path)
+        seconds["encrypt"], response = timed(asset.encrypt, encrypt_images=encrypt_images)
+        export_path = asset.save(export_dir)
+    totals = recorder.totals()
+    for stage in SPAN_STAGES:
+        seconds[stage] = totals.get(stage, {}).get("seconds", 0.0)
+    nbytes = int(totals["bit_extraction"]["nbytes"])
+
+    encrypted_asset = Asset.load(export_path)
+    seconds["decrypt"], _ = timed(encrypted_asset.decrypt, k3=response.key.k3)
+    return seconds, nbytes
+
+
+def peak_memory(path: str, export_dir: str, encrypt_images: bool) -> float:
+    """Peak traced memory in MB of loading, encrypting and saving path"""
+    tracemalloc.start()
+    try:
+        asset = Asset.load(path)
+        asset.encrypt(encrypt_images=encrypt_images)
+        asset.save(export_dir)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def bench_asset(path: str, repeats: int, encrypt_images: bool) -> dict:
+    """Benchmark path, keeping the fastest of repeats runs of each stage"""
+    best = {stage: float("inf") for stage in STAGES}
+    with TemporaryDirectory() as export_dir:
+        for _ in range(repeats):
+            seconds, nbytes = run_stages(path, export_dir, encrypt_images)
+            for stage, value in seconds.items():
+                best[stage] = min(best[stage], value)
+        peak_mb = peak_memory(path, export_dir, encrypt_images)
+
+    return {
+        "asset": Path(path).name,
+        "plaintext_bytes": nbytes,
+        "peak_memory_mb": round(peak_mb, 3),
+        "stages": {
+            stage: {
+                "seconds": round(value, 6),
+                "mb_s": round(nbytes / 1e6 / value, 3) if value > 0 else None,
+            }
+            for stage, value in best.items()
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns a message per stage of an asset that is slower than baseline by more than tolerance"""
+    baseline_assets = {result["asset"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        previous = baseline_assets.get(result["asset"])
+        if previous is None:
+            continue
+        for stage, timing in result["stages"].items():
+            before = previous["stages"].get(stage, {}).get("seconds")
+            if before and timing["seconds"] > before * (1 + tolerance):
+                regressions.append(
+                    f"{result['asset']} {stage}: {before:.4f}s -> {timing['seconds']:.4f}s"
+                )
+    return regressions
+
+
+def environment() -> dict:
+    try:
+        package_version = version("crypto-gltf")
+    except PackageNotFoundError:
+        package_version = None
+    return {
+        "crypto_gltf": package_version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "bits_backend": get_backend(),
+        "num_threads": get_num_threads(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark encryption pipeline stages")
+    parser.add_argument("--assets", default=str(TEST_ASSET_DIR), help="asset directory")
+    parser.add_argument("--no-assets", action="store_true", help="only run synthetic scenes")
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("VERTICES", "TEXTURES"),
+        help="add a synthetic scene, may be repeated",
+    )
+    parser.add_argument("--texture-size", type=int, default=1024)
+    parser.add_argument("--encrypt-images", action="store_true")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="JSON results path, printed if not given")
+    parser.add_argument("--baseline", help="JSON results to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as synthetic_dir:
+        paths = []
+        if not args.no_assets:
+            paths += sorted(
+                str(p)
+                for p in Path(args.assets).glob("*")
+                if p.suffix.lower() in FileType.ASSET.extensions
+            )
+        for vertices, textures in args.synthetic:
+            name = f"synthetic_{vertices}v_{textures}t.glb"
+            paths.append(
+                write_synthetic_glb(
+                    str(Path(synthetic_dir) / name), vertices, textures, args.texture_size
+                )
+            )
+
+        results = {"environment": environment(), "results": []}
+        for path in paths:
+            result = bench_asset(path, args.repeats, args.encrypt_images)
+            results["results"].append(result)
+            stages = ", ".join(
+                f"{stage} {timing['seconds'] * 1e3:.1f}ms"
+                for stage, timing in result["stages"].items()
+            )
+            print(f"{result['asset']}: {stages}, peak {result['peak_memory_mb']:.1f}MB", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
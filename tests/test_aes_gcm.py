@@ -0,0 +1,109 @@
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from crypto_gltf.encrypt.adaptive.cryptography.aes_gcm import (
+    aes_gcm_decrypt,
+    aes_gcm_decrypt_into,
+    aes_gcm_decrypt_segments,
+    aes_gcm_encrypt_into,
+    aes_gcm_encrypt_segments,
+    aes_gcm_reencrypt_segments,
+    aes_gcm_verify_segments,
+)
+from cryptography.exceptions import InvalidTag
+
+
+@pytest.mark.parametrize("length", [1, 15, 16, 1000, 4099])
+def test_streaming_in_place_round_trip(length: int):
+    """Test that in place chunked encryption decrypts with the monolithic decrypt and vice versa"""
+    key = secrets.token_bytes(32)
+    message = secrets.token_bytes(length)
+
+    buffer = bytearray(message)
+    aad = aes_gcm_encrypt_into(message=buffer, out=buffer, key=key, chunk_size=64)
+    assert bytes(buffer) != message
+    assert aes_gcm_decrypt(ciphertext=bytes(buffer), aad_b64=aad, key=key) == message
+
+    out = bytearray(length)
+    aes_gcm_decrypt_into(ciphertext=buffer, out=out, aad_b64=aad, key=key, chunk_size=64)
+    assert bytes(out) == message
+
+
+def test_streaming_decrypt_invalid_key():
+    """Test that streaming decrypt fails authentication with the wrong key"""
+    buffer = bytearray(secrets.token_bytes(100))
+    aad = aes_gcm_encrypt_into(message=buffer, out=buffer, key=secrets.token_bytes(32))
+    with pytest.raises(InvalidTag):
+        aes_gcm_decrypt_into(
+            ciphertext=buffer, out=buffer, aad_b64=aad, key=secrets.token_bytes(32)
+        )
+
+
+def test_segments_round_trip():
+    """Test that segmented encryption round trips and detects reordered segments"""
+    key = secrets.token_bytes(32)
+    message = secrets.token_bytes(1000)
+
+    buffer = bytearray(message)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        aad, tags = aes_gcm_encrypt_segments(
+            message=buffer, out=buffer, key=key, segment_size=96, executor=executor
+        )
+        assert len(tags) == 11
+
+        out = bytearray(len(message))
+        aes_gcm_decrypt_segments(
+            ciphertext=buffer,
+            out=out,
+            aad_b64=aad,
+            tags=tags,
+            key=key,
+            segment_size=96,
+            executor=executor,
+        )
+        assert bytes(out) == message
+
+        swapped = bytearray(buffer)
+        swapped[:96], swapped[96:192] = buffer[96:192], buffer[:96]
+        with pytest.raises(InvalidTag):
+            aes_gcm_decrypt_segments(
+                ciphertext=swapped,
+                out=out,
+                aad_b64=aad,
+                tags=[tags[1], tags[0]] + tags[2:],
+                key=key,
+                segment_size=96,
+                executor=executor,
+            )
+
+
+def test_reencrypt_segments():
+    """Test that re-encrypted segments decrypt with the kept ones under new IVs,
+    and the table verifies with the key only"""
+    key = secrets.token_bytes(32)
+    message = bytearray(secrets.token_bytes(1000))
+    ranges = [(start, min(start + 96, 1000)) for start in range(0, 1000, 96)]
+
+    buffer = bytearray(message)
+    aad, tags = aes_gcm_encrypt_segments(message=buffer, out=buffer, key=key, ranges=ranges)
+    aes_gcm_verify_segments(aad_b64=aad, tags=tags, key=key)
+    with pytest.raises(InvalidTag):
+        aes_gcm_verify_segments(aad_b64=aad, tags=tags, key=secrets.token_bytes(32))
+
+    message[100:200] = secrets.token_bytes(100)  # modifies segments 1 and 2
+    edited = bytearray(message)
+    new_aad, new_tags, ivs = aes_gcm_reencrypt_segments(
+        message=edited, out=buffer, aad_b64=aad, tags=tags, key=key, ranges=ranges, indices=[1, 2]
+    )
+    assert new_aad != aad and new_tags[3:] == tags[3:] and new_tags[1:3] != tags[1:3]
+
+    out = bytearray(len(message))
+    aes_gcm_decrypt_segments(
+        ciphertext=buffer, out=out, aad_b64=new_aad, tags=new_tags, key=key, ranges=ranges, ivs=ivs
+    )
+    assert out == message
+    with pytest.raises(InvalidTag):
+        aes_gcm_decrypt_segments(
+            ciphertext=buffer, out=out, aad_b64=new_aad, tags=new_tags, key=key, ranges=ranges
+        )
@@ -0,0 +1,59 @@
+import asyncio
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+from crypto_gltf.aio import AsyncAsset, gather_limited
+from crypto_gltf.io.file.file import File
+
+ASSET_DIR = os.path.join(os.path.dirname(__file__), "assets")
+ASSET_NAMES = ["Apple.off", "tiny_asset.glb", "cube_scene.glb", "honda.gltf"]
+
+
+async def round_trip(import_path: str, export_dir: str) -> bool:
+    """Encrypt, save, reload and decrypt an asset without blocking the event loop"""
+    asset = await AsyncAsset.load(import_path)
+    encryption_response = await asset.encrypt(meshes_cipher_params=(2, 2, 10))
+    encrypted_asset = await AsyncAsset.load(await asset.save(export_dir))
+    return await encrypted_asset.decrypt(k3=encryption_response.key.k3) and (
+        encrypted_asset.asset.file.plnm == File(import_path).plnm
+    )
+
+
+def test_async_round_trip():
+    """Test assets processed concurrently under a limit decrypt to their plaintext"""
+    with TemporaryDirectory() as tmp_dir:
+        export_dirs = [os.path.join(tmp_dir, name) for name in ASSET_NAMES]
+        for export_dir in export_dirs:
+            os.makedirs(export_dir)
+        results = asyncio.run(
+            gather_limited(
+                (
+                    round_trip(os.path.join(ASSET_DIR, name), export_dir)
+                    for name, export_dir in zip(ASSET_NAMES, export_dirs)
+                ),
+                limit=2,
+            )
+        )
+    assert results == [True] * len(ASSET_NAMES)
+
+
+def test_gather_limited():
+    """Test gather_limited never exceeds its limit and keeps result order"""
+    running, peak = 0, 0
+
+    async def task(i: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (i % 3))
+        running -= 1
+        return i
+
+    assert asyncio.run(gather_limited((task(i) for i in range(10)), limit=3)) == list(
+        range(10)
+    )
+    assert peak == 3
+
+    with pytest.raises(ValueError):
+        asyncio.run(gather_limited([], limit=0))
@@ -1,7 +1,12 @@
+import os
+import shutil
 from tempfile import TemporaryDirectory
 
+import numpy as np
 import pytest
 from crypto_gltf import Asset
+from crypto_gltf.encrypt.adaptive.system import AdaptiveCryptoSystemV3
+from crypto_gltf.io.file.gltf2.exp.gltf2_patcher import GlTF2Patcher
 
 
 @pytest.mark.dependency(depends=["test_encryptor", "test_import_export"])
@@ -23,3 +28,298 @@ def test_asset(asset: Asset):
             k3=encryption_response.key.k3,
         )
         assert plnm_plaintext == encrypted_asset.file.plnm
+
+
+def test_segmented_asset(asset: Asset):
+    """test full pipeline in segmented GCM mode, the segment table is stored with the file"""
+    if asset.file.filename_ext == ".off":
+        with pytest.raises(Exception):
+            asset.encrypt(segment_size=1024)
+        return
+
+    with TemporaryDirectory() as tmp_dir:
+        plnm_plaintext = asset.file.plnm.__copy__()
+        encryption_response = asset.encrypt(segment_size=1024)
+        assert encryption_response.aad.segments is not None
+        export_path = asset.save(tmp_dir)
+
+        encrypted_asset = Asset.load(export_path)
+        encrypted_asset.decrypt(k3=encryption_response.key.k3)
+        assert plnm_plaintext == encrypted_asset.file.plnm
+
+
+@pytest.mark.parametrize(
+    "name, segment_size, encrypt_images",
+    [
+        ("Apple.off", None, False),
+        ("honda.glb", None, False),
+        ("honda.glb", 1024, False),
+        ("cube_scene.glb", 64, False),
+        ("tiny_asset.glb", 1 << 16, True),
+    ],
+)
+def test_target_level(name: str, segment_size: int | None, encrypt_images: bool):
+    """test decrypting to a target level matches decrypting with that level's own key,
+    whichever higher key is provided"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", name)
+
+    with TemporaryDirectory() as tmp_dir:
+        asset = Asset.load(asset_path)
+        key = asset.encrypt(encrypt_images=encrypt_images, segment_size=segment_size).key
+        export_path = asset.save(tmp_dir)
+
+        level_keys = {"clear": "k3", "low": "k2", "mid": "k1"}
+        for level, level_key in level_keys.items():
+            expected_asset = Asset.load(export_path)
+            expected_asset.decrypt(**{level_key: getattr(key, level_key)})
+            expected = expected_asset.file.plnm
+
+            for higher_key in ["k3", "k2", "k1"][: ["k3", "k2", "k1"].index(level_key) + 1]:
+                decrypted_asset = Asset.load(export_path)
+                decrypted_asset.decrypt(
+                    **{higher_key: getattr(key, higher_key)}, target_level=level
+                )
+                plnm = decrypted_asset.file.plnm
+                for arr, expected_arr in zip(
+                    plnm.meshes + plnm.images, expected.meshes + expected.images
+                ):
+                    assert np.array_equal(arr.view(np.uint8), expected_arr.view(np.uint8))
+
+        with pytest.raises(ValueError):
+            Asset.load(export_path).decrypt(k2=key.k2, target_level="clear")
+
+        # decrypting nothing is refused, leaving the asset decryptable after saving
+        unchanged_asset = Asset.load(export_path)
+        with pytest.raises(ValueError, match="decrypts nothing"):
+            unchanged_asset.decrypt(k3=key.k3, target_level="high")
+        os.makedirs(os.path.join(tmp_dir, "high"))
+        unchanged_asset = Asset.load(unchanged_asset.save(os.path.join(tmp_dir, "high")))
+        unchanged_asset.decrypt(k3=key.k3)
+        assert unchanged_asset.file.plnm == Asset.load(asset_path).file.plnm
+
+        with pytest.raises(Exception, match="Invalid key"):
+            Asset.load(export_path).decrypt(k3=bytes(32), target_level="mid")
+
+
+@pytest.mark.parametrize("k", ["k3", "k2", "k1"])
+def test_selective_decryption(k: str):
+    """test decrypting selected meshes and nodes of a partially encrypted asset decrypts
+    exactly their accessors, matching a full decryption"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", "honda.glb")
+
+    with TemporaryDirectory() as tmp_dir:
+        asset = Asset.load(asset_path)
+        key = asset.encrypt(partial=True, segment_size=4096).key
+        export_path = asset.save(tmp_dir)
+
+        ciphertext = Asset.load(export_path).file.cipher_plnm().meshes
+        full_asset = Asset.load(export_path)
+        full_asset.decrypt(**{k: getattr(key, k)})
+        plaintext = full_asset.file.cipher_plnm().meshes
+
+        num_meshes = len(asset.file.data.gltf["meshes"])
+        for selection in [{"meshes": [num_meshes - 1]}, {"nodes": [0]}, {"meshes": [0, 2]}]:
+            decrypted_asset = Asset.load(export_path)
+            selected, _ = decrypted_asset.file.cipher_plnm_selection(**selection)
+            assert selected
+            decrypted_asset.decrypt(**{k: getattr(key, k)}, **selection)
+
+            for idx, arr in enumerate(decrypted_asset.file.cipher_plnm().meshes):
+                expected = plaintext[idx] if idx in selected else ciphertext[idx]
+                assert np.array_equal(arr.view(np.uint8), expected.view(np.uint8))
+
+        with pytest.raises(Exception, match="Invalid key"):
+            Asset.load(export_path).decrypt(**{k: bytes(32)}, meshes=[num_meshes - 1])
+
+    with TemporaryDirectory() as tmp_dir:
+        asset = Asset.load(asset_path)
+        key = asset.encrypt().key
+        with pytest.raises(ValueError):
+            Asset.load(asset.save(tmp_dir)).decrypt(k3=key.k3, meshes=[0])
+
+
+def test_repeated_selective_decryption():
+    """test selective decryption only loads the accessors it needs and keeps the aad,
+    so further meshes can be decrypted, also after saving, until every one is"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", "honda.glb")
+
+    with TemporaryDirectory() as tmp_dir, TemporaryDirectory() as export_dir:
+        asset = Asset.load(asset_path)
+        key = asset.encrypt(partial=True, segment_size=4096).key
+        export_path = asset.save(tmp_dir)
+
+        full_asset = Asset.load(export_path)
+        full_asset.decrypt(k3=key.k3)
+        plaintext = full_asset.file.cipher_plnm().meshes
+
+        num_meshes = len(asset.file.data.gltf["meshes"])
+        decrypted_asset = Asset.load(export_path)
+        file = decrypted_asset.file
+        selected, _ = file.cipher_plnm_selection(meshes=[num_meshes - 1])
+        decrypted_asset.decrypt(k3=key.k3, meshes=[num_meshes - 1])
+        loaded = [
+            position
+            for position, idx in enumerate(file.float_accessor_idxs)
+            if file.data.accessors.is_loaded(idx)  # type: ignore[attr-defined]
+        ]
+        assert set(selected) <= set(loaded) and len(loaded) < len(plaintext) // 2
+
+        decrypted_asset.decrypt(k3=key.k3, meshes=[0])
+        decrypted_asset.decrypt(k3=key.k3, meshes=[0])  # already decrypted
+        saved_path = decrypted_asset.save(export_dir)
+        reloaded = Asset.load(saved_path)
+        reloaded.decrypt(k3=key.k3)
+        num_accessors = len(Asset.load(asset_path).file.data.gltf["accessors"])
+        assert len(reloaded.file.data.gltf["accessors"]) == num_accessors  # aad removed
+
+        for arr, expected in zip(reloaded.file.cipher_plnm().meshes, plaintext):
+            assert np.array_equal(arr.view(np.uint8), expected.view(np.uint8))
+
+        with pytest.raises(ValueError):
+            AdaptiveCryptoSystemV3.reencrypt(
+                plnm=Asset.load(asset_path).file.cipher_plnm(),
+                k3=key.k3,
+                aad=Asset.load(saved_path).file.aad,
+            )
+
+
+@pytest.mark.parametrize(
+    "name, encrypt_images, edits",
+    [
+        ("honda.glb", False, [([], 0), ([2], 1), ([0, 2], None)]),
+        ("tiny_asset.glb", True, [([1], 1)]),
+    ],
+)
+def test_reencrypt_changed(
+    name: str, encrypt_images: bool, edits: list[tuple[list[int], int | None]]
+):
+    """test re-encrypting an edited asset only replaces its modified arrays,
+    and decrypts to the edited plaintext"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", name)
+
+    with TemporaryDirectory() as tmp_dir:
+        encrypted_dir = os.path.join(tmp_dir, "encrypted")
+        edited_dir = os.path.join(tmp_dir, "edited")
+        os.makedirs(encrypted_dir)
+        os.makedirs(edited_dir)
+        asset = Asset.load(asset_path)
+        key = asset.encrypt(partial=True, segment_size=1024, encrypt_images=encrypt_images).key
+        encrypted_path = asset.save(encrypted_dir)
+
+        with pytest.raises(ValueError, match="partial=True"):
+            unsegmented = Asset.load(asset_path)
+            unsegmented.encrypt()
+            unsegmented.reencrypt_changed(Asset.load(asset_path), key.k3)
+        off_path = os.path.join(os.path.dirname(__file__), "assets", "Apple.off")
+        with pytest.raises(ValueError, match=".off files"):
+            off_asset = Asset.load(off_path)
+            off_asset.encrypt()
+            off_asset.reencrypt_changed(Asset.load(off_path), key.k3)
+
+        for edited_idxs, num_modified in edits:
+            edited = Asset.load(asset_path)
+            accessor_idxs = edited.file.float_accessor_idxs
+            for idx in edited_idxs:
+                arr = edited.file.data.accessors[accessor_idxs[idx]]
+                edited.file.data.accessors[accessor_idxs[idx]] = arr * 0.5 + 1
+            edited_path = edited.save(edited_dir)
+
+            encrypted_asset = Asset.load(encrypted_path)
+            response = encrypted_asset.reencrypt_changed(Asset.load(edited_path), key.k3)
+            meshes, images = response.ciphertext
+            if num_modified is not None:
+                # leading accessors derive the subkeys, editing them encrypts every array again
+                assert sorted(meshes) == edited_idxs and images == {}
+
+            reencrypted_asset = Asset.load(encrypted_asset.save(tmp_dir))
+            reencrypted_asset.decrypt(k3=key.k3)
+            assert reencrypted_asset.file.plnm == Asset.load(edited_path).file.plnm
+
+        # a failed re-encryption leaves the asset as it was, still decryptable
+        failed_asset = Asset.load(encrypted_path)
+        with pytest.raises(Exception, match="Invalid key"):
+            failed_asset.reencrypt_changed(Asset.load(edited_path), bytes(32))
+        failed_asset.decrypt(k3=key.k3)
+        assert failed_asset.file.plnm == Asset.load(asset_path).file.plnm
+
+
+def test_patched_asset(asset_path: str):
+    """test encrypted and decrypted accessors patched into a .glb match the in memory data"""
+    if not asset_path.endswith(".glb"):
+        pytest.skip("Patching is .glb only")
+
+    with TemporaryDirectory() as tmp_dir:
+        source_path = shutil.copy(asset_path, tmp_dir)
+        asset = Asset.load(source_path)
+        encryption_response = asset.encrypt()
+
+        # copy-then-patch, images are left untouched so plnm is only read after patching
+        patched_dir = os.path.join(tmp_dir, "patched")
+        os.makedirs(patched_dir)
+        if "draco" in asset_path:
+            # decompressed accessors have no bufferView to overwrite
+            with pytest.raises(Exception, match="tightly packed"):
+                asset.patch(patched_dir)
+            return
+        encrypted_asset = Asset.load(asset.patch(patched_dir))
+        assert encrypted_asset.file.plnm == asset.file.plnm
+
+        # in place patch of the decrypted asset
+        encrypted_asset = Asset.load(os.path.join(patched_dir, os.path.basename(asset_path)))
+        encrypted_asset.decrypt(k3=encryption_response.key.k3)
+        assert encrypted_asset.patch() == encrypted_asset.file.import_path
+        assert (
+            Asset.load(encrypted_asset.file.import_path).file.plnm
+            == Asset.load(asset_path).file.plnm
+        )
+
+
+def test_patched_resized_aad():
+    """test an embedded aad of another size than the one read from a .glb is appended
+    by patch rather than overwriting the source bufferView, which can't hold it"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", "honda.glb")
+
+    with TemporaryDirectory() as tmp_dir:
+        source_path = shutil.copy(asset_path, tmp_dir)
+        asset = Asset.load(source_path)
+        asset.encrypt()
+        asset.patch()
+
+        encrypted_asset = Asset.load(source_path)
+        file = encrypted_asset.file
+        aad = file.aad
+        num_accessors = len(file.data.gltf["accessors"])
+        aad.aad = np.concatenate((aad.aad, aad.aad[-2:]))
+        file.embed_aad(aad)
+        source_view = file.data.source.accessors[num_accessors].buffer_view
+        assert file.data.gltf["accessors"][num_accessors]["bufferView"] != source_view
+
+        with pytest.raises(Exception, match="overruns"):
+            accessor = {**file.data.gltf["accessors"][num_accessors], "bufferView": source_view}
+            GlTF2Patcher.accessor_offset(file.data.gltf, accessor, aad.aad)
+        encrypted_asset.patch()
+        assert np.array_equal(Asset.load(source_path).file.read_aad().aad, aad.aad)
+
+
+def test_patch_cycles_reclaim_aad():
+    """test repeated in place encrypt and decrypt patches don't grow the .glb,
+    the BIN chunk of a removed aad is reclaimed"""
+    asset_path = os.path.join(os.path.dirname(__file__), "assets", "honda.glb")
+
+    with TemporaryDirectory() as tmp_dir:
+        source_path = shutil.copy(asset_path, tmp_dir)
+        sizes = []
+        for _ in range(3):
+            asset = Asset.load(source_path)
+            key = asset.encrypt().key
+            asset.patch()
+            encrypted_size = os.path.getsize(source_path)
+
+            asset = Asset.load(source_path)
+            asset.decrypt(k3=key.k3)
+            asset.patch()
+            sizes.append((encrypted_size, os.path.getsize(source_path)))
+
+        assert sizes[0] == sizes[1] == sizes[2]
+        assert sizes[0][1] < sizes[0][0]  # the aad is removed from the BIN chunk
+        assert Asset.load(source_path).file.plnm == Asset.load(asset_path).file.plnm
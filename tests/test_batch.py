@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from crypto_gltf.batch import batch_tasks, main, run_batch
+from crypto_gltf.io.file.file import File
+
+ASSET_DIR = os.path.join(os.path.dirname(__file__), "assets")
+ASSET_NAMES = ["Apple.off", "tiny_asset.glb", "cube_scene.glb", "honda.gltf"]
+# buffer and images of honda.gltf
+GLTF_RESOURCES = ["honda.bin"] + [f"Image{suffix}.png" for suffix in ["", "_0", "_1", "_2", "_3"]]
+
+
+def test_batch_round_trip(monkeypatch: pytest.MonkeyPatch):
+    """Test a directory encrypted in parallel into a relative directory decrypts from
+    its results manifest, .gltf files sharing a directory keep their own buffers"""
+    with TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        source_dir = os.path.join(tmp_dir, "source")
+        os.makedirs(os.path.join(source_dir, "nested"))
+        for name in ASSET_NAMES[1:] + GLTF_RESOURCES:
+            shutil.copy(os.path.join(ASSET_DIR, name), source_dir)
+        shutil.copy(os.path.join(ASSET_DIR, "honda.gltf"), os.path.join(source_dir, "copy.gltf"))
+        nested_dir = os.path.join(source_dir, "nested")
+        shutil.copy(os.path.join(ASSET_DIR, ASSET_NAMES[0]), nested_dir)
+        with open(os.path.join(source_dir, "notes.txt"), "w") as f:
+            f.write("not an asset")
+
+        encrypted_dir = os.path.join("out", "encrypted")
+        encrypt_manifest = os.path.join(tmp_dir, "encrypted.jsonl")
+        tasks = batch_tasks(source_dir, encrypted_dir, "encrypt")
+        assert len(tasks) == 5
+        assert run_batch(tasks, encrypt_manifest, workers=2) == {"ok": 5, "error": 0}
+
+        with open(encrypt_manifest) as f:
+            records = [json.loads(line) for line in f]
+        assert all(record["k3"] and record["k1"] for record in records)
+        assert os.path.abspath(os.path.join(encrypted_dir, "nested")) in [
+            os.path.dirname(record["output"]) for record in records
+        ]
+
+        decrypted_dir = os.path.join("out", "decrypted")
+        assert main(["decrypt", encrypt_manifest, decrypted_dir, "--workers", "2"]) == 0
+        with open(os.path.join(decrypted_dir, "manifest.jsonl")) as f:
+            outputs = {
+                record["path"]: record["output"] for record in map(json.loads, f)
+            }
+
+        for record in records:
+            assert File(outputs[record["output"]]).plnm == File(record["path"]).plnm
+
+
+def test_batch_records_failures():
+    """Test a file that fails to decrypt is recorded without stopping the batch"""
+    with TemporaryDirectory() as tmp_dir:
+        manifest = os.path.join(tmp_dir, "manifest.jsonl")
+        with open(manifest, "w") as f:
+            for name in ASSET_NAMES:
+                f.write(json.dumps({"path": os.path.join(ASSET_DIR, name)}) + "\n")
+
+        tasks = batch_tasks(manifest, tmp_dir, "decrypt")
+        results = os.path.join(tmp_dir, "results.jsonl")
+        assert run_batch(tasks, results, workers=1) == {"ok": 0, "error": len(ASSET_NAMES)}
+        with open(results) as f:
+            assert all(json.loads(line)["error"] for line in f)
@@ -1,7 +1,35 @@
 import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-from crypto_gltf.encrypt.adaptive.utils import buffer_length, get_bits, put_bits
+import pytest
+from crypto_gltf.encrypt.adaptive import numpy_bits, utils
+from crypto_gltf.encrypt.adaptive.cryptography.key_gen import get_sblock
+from crypto_gltf.encrypt.adaptive.types import (
+    BlockLayout,
+    ImagesAdaptiveCipherParams,
+    MeshesAdaptiveCipherParams,
+)
+from crypto_gltf.encrypt.adaptive.utils import (
+    block_offsets,
+    buffer_length,
+    clib,
+    get_backend,
+    get_bits,
+    get_bits_batch,
+    get_bits_pqr,
+    get_bits_pqr_batch,
+    get_executor,
+    get_num_threads,
+    put_bits,
+    put_bits_batch,
+    put_bits_pqr,
+    put_bits_pqr_batch,
+    set_backend,
+    set_num_threads,
+)
 from crypto_gltf.utils.numpy_utils import array_bit_slice_eq
 
 
@@ -180,3 +208,284 @@ def test_put_get_varied_slice8_2D():
         put_bits(putarr, buffer, start, stop)
 
         assert array_bit_slice_eq(mat, putarr, start, stop)
+
+
+@pytest.mark.skipif(clib is None, reason="C library unavailable")
+def test_numpy_backend_matches_clib32():
+    """Test that the numpy backend packs and inserts float32 bits identically to clib"""
+    for _ in range(100):
+        rows, cols = np.random.randint(1, 1000), np.random.randint(1, 16)
+        mat = np.random.random_sample((rows, cols)).astype(np.float32)
+        start = np.random.randint(0, 32)
+        stop = np.random.randint(start + 1, 33)
+        fill = secrets.randbits(32)
+
+        bufflen = buffer_length(start, stop, rows, cols)
+        clib_buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+        numpy_buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+        get_bits(mat, clib_buffer, start, stop, fill)
+        numpy_bits.get_bits(mat, numpy_buffer, start, stop, fill)
+        assert np.array_equal(clib_buffer, numpy_buffer)
+
+        ciphertext = np.random.randint(0, 2**32, bufflen, dtype=np.uint32)
+        clib_putarr, numpy_putarr = np.copy(mat), np.copy(mat)
+        put_bits(clib_putarr, ciphertext, start, stop)
+        numpy_bits.put_bits(numpy_putarr, ciphertext, start, stop)
+        assert np.array_equal(clib_putarr.view(np.uint32), numpy_putarr.view(np.uint32))
+
+
+@pytest.mark.skipif(clib is None, reason="C library unavailable")
+def test_numpy_backend_matches_clib8():
+    """Test that the numpy backend packs and inserts uint8 bits identically to clib"""
+    for _ in range(10):
+        rows, cols = np.random.randint(1, 512), np.random.randint(1, 512)
+        slices = np.random.randint(1, 5)
+        mat = np.random.randint(0, 255, (rows, cols, slices)).astype(np.uint8)
+        start = np.random.randint(0, 8)
+        stop = np.random.randint(start + 1, 9)
+        fill = secrets.randbits(32)
+
+        bufflen = buffer_length(start, stop, rows, cols, slices)
+        clib_buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+        numpy_buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+        get_bits(mat, clib_buffer, start, stop, fill)
+        numpy_bits.get_bits(mat, numpy_buffer, start, stop, fill)
+        assert np.array_equal(clib_buffer, numpy_buffer)
+
+        ciphertext = np.random.randint(0, 2**32, bufflen, dtype=np.uint32)
+        clib_putarr, numpy_putarr = np.copy(mat), np.copy(mat)
+        put_bits(clib_putarr, ciphertext, start, stop)
+        numpy_bits.put_bits(numpy_putarr, ciphertext, start, stop)
+        assert np.array_equal(clib_putarr, numpy_putarr)
+
+
+def test_set_backend():
+    """Test that get_bits/put_bits dispatch to the selected backend"""
+    previous = get_backend()
+    try:
+        set_backend("numpy")
+        assert get_backend() == "numpy"
+        mat = np.random.random_sample((100, 3)).astype(np.float32)
+        bufflen = buffer_length(0, 32, 100, 3)
+        buffer = np.zeros((bufflen), dtype=np.uint32, order="C")
+        putarr = np.zeros((100, 3), dtype=np.float32, order="C")
+        get_bits(mat, buffer, 0, 32)
+        put_bits(putarr, buffer, 0, 32)
+        assert np.array_equal(mat, putarr)
+
+        with pytest.raises(ValueError):
+            set_backend("rust")  # type: ignore[arg-type]
+    finally:
+        set_backend(previous)
+
+
+def test_pqr_matches_single_blocks():
+    """Test that fused p/q/r get/put match three single block get/put calls"""
+    for _ in range(100):
+        rows, cols = np.random.randint(1, 1000), np.random.randint(1, 16)
+        mat = np.random.random_sample((rows, cols)).astype(np.float32)
+        p, q = np.random.randint(1, 8), np.random.randint(1, 8)
+        r = np.random.randint(1, 24 - p - q)
+        slices = ((9, 9 + p), (9 + p, 9 + p + q), (9 + p + q, 9 + p + q + r))
+        fills = (secrets.randbits(32), secrets.randbits(32), secrets.randbits(32))
+
+        buffers = tuple(
+            np.zeros(buffer_length(start, stop, rows, cols), dtype=np.uint32)
+            for start, stop in slices
+        )
+        get_bits_pqr(mat, buffers, slices, fills)
+        for buffer, (start, stop), fill in zip(buffers, slices, fills):
+            single_buffer = np.zeros_like(buffer)
+            get_bits(mat, single_buffer, start, stop, fill)
+            assert np.array_equal(buffer, single_buffer)
+
+        ciphertexts = tuple(
+            np.random.randint(0, 2**32, len(buffer), dtype=np.uint32)
+            for buffer in buffers
+        )
+        fused_putarr, single_putarr = np.copy(mat), np.copy(mat)
+        put_bits_pqr(fused_putarr, ciphertexts, slices)
+        for ciphertext, (start, stop) in zip(ciphertexts, slices):
+            put_bits(single_putarr, ciphertext, start, stop)
+        assert np.array_equal(
+            fused_putarr.view(np.uint32), single_putarr.view(np.uint32)
+        )
+
+
+def test_batch_matches_single_arrays():
+    """Test that batched get/put match per array get/put into a combined buffer"""
+    for _ in range(20):
+        arrs = [
+            np.random.random_sample(
+                (np.random.randint(1, 500), np.random.randint(1, 5))
+            ).astype(np.float32)
+            for _ in range(np.random.randint(1, 50))
+        ]
+        start = np.random.randint(0, 31)
+        stop = np.random.randint(start + 1, 33)
+        fills = np.random.randint(0, 2**32, len(arrs), dtype=np.uint32)
+
+        offsets = block_offsets([arr.shape for arr in arrs], [(start, stop)] * len(arrs))
+        buffer = np.zeros(int(offsets[-1]), dtype=np.uint32)
+        get_bits_batch(arrs, buffer, offsets, start, stop, fills)
+        for idx, arr in enumerate(arrs):
+            single_buffer = np.zeros(int(offsets[idx + 1] - offsets[idx]), dtype=np.uint32)
+            get_bits(arr, single_buffer, start, stop, int(fills[idx]))
+            assert np.array_equal(buffer[offsets[idx] : offsets[idx + 1]], single_buffer)
+
+        ciphertext = np.random.randint(0, 2**32, len(buffer), dtype=np.uint32)
+        batch_putarrs = [np.copy(arr) for arr in arrs]
+        put_bits_batch(batch_putarrs, ciphertext, offsets, start, stop)
+        for idx, arr in enumerate(arrs):
+            single_putarr = np.copy(arr)
+            put_bits(single_putarr, ciphertext[offsets[idx] : offsets[idx + 1]], start, stop)
+            assert np.array_equal(
+                batch_putarrs[idx].view(np.uint32), single_putarr.view(np.uint32)
+            )
+
+
+def test_pqr_batch_round_trip():
+    """Test that batched fused p/q/r put inverts batched fused p/q/r get"""
+    slices = ((9, 11), (11, 13), (13, 23))
+    for _ in range(20):
+        arrs = [
+            np.random.random_sample(
+                (np.random.randint(1, 500), np.random.randint(1, 5))
+            ).astype(np.float32)
+            for _ in range(np.random.randint(1, 50))
+        ]
+        shapes = [arr.shape for arr in arrs]
+        offsets = tuple(block_offsets(shapes, [s] * len(arrs)) for s in slices)
+        buffers = tuple(np.zeros(int(offs[-1]), dtype=np.uint32) for offs in offsets)
+        fills = np.random.randint(0, 2**32, (len(arrs), 3), dtype=np.uint32)
+
+        get_bits_pqr_batch(arrs, buffers, offsets, slices, fills)  # type: ignore[arg-type]
+        putarrs = [np.zeros_like(arr) for arr in arrs]
+        put_bits_pqr_batch(putarrs, buffers, offsets, slices)  # type: ignore[arg-type]
+        for arr, putarr in zip(arrs, putarrs):
+            assert array_bit_slice_eq(arr, putarr, 9, 23)
+
+
+def test_put_bits_read_only():
+    """Test that put into a read-only array raises and leaves it unchanged"""
+    slices = ((9, 11), (11, 13), (13, 23))
+    arrs = [np.random.random_sample((100, 3)).astype(np.float32) for _ in range(3)]
+    arrs[1].flags.writeable = False
+    expected = np.copy(arrs[1])
+    offsets = tuple(block_offsets([arr.shape for arr in arrs], [s] * len(arrs)) for s in slices)
+    buffers = tuple(
+        np.random.randint(0, 2**32, int(offs[-1]), dtype=np.uint32) for offs in offsets
+    )
+
+    with pytest.raises(ValueError, match="read-only"):
+        put_bits_batch(arrs, buffers[0], offsets[0], *slices[0])
+    with pytest.raises(ValueError, match="read-only"):
+        put_bits_pqr_batch(arrs, buffers, offsets, slices)  # type: ignore[arg-type]
+    with pytest.raises(ValueError, match="read-only"):
+        put_bits(arrs[1], buffers[0][offsets[0][1] : offsets[0][2]], *slices[0])
+    assert np.array_equal(arrs[1].view(np.uint32), expected.view(np.uint32))
+
+
+@pytest.mark.parametrize("backend", ["c", "numpy"])
+def test_threaded_batch_matches_serial(backend, monkeypatch):
+    """Test that packing split across threads is byte identical to serial packing"""
+    if backend == "c" and clib is None:
+        pytest.skip("C library unavailable")
+    monkeypatch.setattr(utils, "MIN_THREAD_ELEMENTS", 64)
+    previous_backend, previous_threads = get_backend(), get_num_threads()
+    set_backend(backend)
+    slices = ((9, 11), (11, 14), (14, 23))
+    try:
+        for _ in range(10):
+            arrs = [
+                np.random.random_sample(
+                    (np.random.randint(1, 2000), np.random.randint(1, 5))
+                ).astype(np.float32)
+                for _ in range(np.random.randint(1, 10))
+            ]
+            shapes = [arr.shape for arr in arrs]
+            offsets = tuple(block_offsets(shapes, [s] * len(arrs)) for s in slices)
+            fills = np.random.randint(0, 2**32, (len(arrs), 3), dtype=np.uint32)
+            ciphertexts = tuple(
+                np.random.randint(0, 2**32, int(offs[-1]), dtype=np.uint32)
+                for offs in offsets
+            )
+
+            results = []
+            for num_threads in (1, 4):
+                set_num_threads(num_threads)
+                buffers = tuple(np.zeros(int(offs[-1]), dtype=np.uint32) for offs in offsets)
+                get_bits_pqr_batch(arrs, buffers, offsets, slices, fills)  # type: ignore[arg-type]
+                putarrs = [np.copy(arr) for arr in arrs]
+                put_bits_pqr_batch(putarrs, ciphertexts, offsets, slices)  # type: ignore[arg-type]
+                results.append((buffers, putarrs))
+
+            (serial_buffers, serial_arrs), (threaded_buffers, threaded_arrs) = results
+            for serial, threaded in zip(serial_buffers, threaded_buffers):
+                assert np.array_equal(serial, threaded)
+            for serial, threaded in zip(serial_arrs, threaded_arrs):
+                assert np.array_equal(serial.view(np.uint32), threaded.view(np.uint32))
+    finally:
+        set_backend(previous_backend)
+        set_num_threads(previous_threads)
+
+
+def test_executor_thread_safety():
+    """Test that concurrent first uses share one pool, and replacing it lets work in flight
+    on the old pool complete"""
+    previous_threads = get_num_threads()
+    try:
+        set_num_threads(4)
+        barrier = threading.Barrier(8)
+
+        def first_use(_):
+            barrier.wait()
+            return get_executor()
+
+        with ThreadPoolExecutor(8) as pool:
+            executors = list(pool.map(first_use, range(8)))
+        assert all(executor is executors[0] for executor in executors)
+
+        in_flight = executors[0].submit(lambda: time.sleep(0.1) or 1)
+        set_num_threads(2)
+        assert get_executor() is not executors[0]
+        assert in_flight.result() == 1
+        assert get_executor().submit(lambda: 2).result() == 2
+    finally:
+        set_num_threads(previous_threads)
+
+
+def test_get_sblock_matches_concatenated_buffers():
+    """Test that key source blocks match per array buffers concatenated"""
+    arrs = [
+        np.random.random_sample((np.random.randint(1, 20), 3)).astype(np.float32)
+        for _ in range(10)
+    ]
+    concatenated = bytearray(b"")
+    for arr in arrs:
+        buffer = np.zeros(buffer_length(13, 23, *arr.shape), dtype=np.uint32)
+        get_bits(arr, buffer, 13, 23)
+        concatenated.extend(buffer.tobytes())
+    assert get_sblock(arrs, 13, 23) == concatenated[:32]
+
+
+def test_block_layout_matches_block_offsets():
+    """Test that the asset block layout matches per block offsets tables and groups param runs"""
+    meshes_params = MeshesAdaptiveCipherParams(p=2, q=3, r=10)
+    images_params = ImagesAdaptiveCipherParams(p=1, q=1, r=6)
+    data = [
+        (np.zeros((np.random.randint(1, 100), 3), dtype=np.float32), meshes_params)
+        for _ in range(5)
+    ] + [
+        (np.zeros((np.random.randint(1, 20), 7, 3), dtype=np.uint8), images_params)
+        for _ in range(3)
+    ]
+    layout = BlockLayout.from_data(data)  # type: ignore[arg-type]
+    assert layout.runs == ((0, 5, meshes_params.slices), (5, 8, images_params.slices))
+    for block_idx, block in enumerate("pqr"):
+        expected = block_offsets(
+            [arr.shape for arr, _ in data],
+            [params.slices[block_idx] for _, params in data],
+        )
+        assert np.array_equal(layout.block_offsets(block), expected)  # type: ignore[arg-type]
+        assert layout.length(block) == expected[-1]  # type: ignore[arg-type]
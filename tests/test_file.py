@@ -1,7 +1,21 @@
+import os
+import shutil
 from tempfile import TemporaryDirectory
 
+import numpy as np
+import pytest
+from crypto_gltf import Asset
+from crypto_gltf.data.asset_file_data_types import LazyDict, OffData
+from crypto_gltf.data.types import AAD_DATA
 from crypto_gltf.io.file.base_file import BaseFile
 from crypto_gltf.io.file.file import File
+from crypto_gltf.io.file.gltf2.exp import gltf2_exporter
+from crypto_gltf.io.file.gltf2.exp.gltf2_exporter import GlTF2Exporter
+from crypto_gltf.io.file.gltf2.gltf2 import GLTFFile
+from crypto_gltf.io.file.gltf2.imp.gltf2_imp_binary_data import (
+    BinaryData as ImpBinaryData,
+)
+from crypto_gltf.io.file.gltf2.imp.gltf2_importer import GlTF2Importer
 
 
 class TestFile:
@@ -14,3 +28,177 @@ class TestFile:
             export_filepath = file.save(export_dir=tmp_dir)
             export_file = File(export_filepath)
             assert import_plnm == export_file.plnm
+
+    def test_mmap_import(self, asset_path: str):
+        """Test memory mapped import matches a full read, and the asset round trips encryption"""
+        plnm = File(asset_path).plnm
+        asset = Asset.load(asset_path, use_mmap=True)
+        assert plnm == asset.file.plnm
+
+        encryption_response = asset.encrypt()
+        with TemporaryDirectory() as tmp_dir:
+            encrypted_asset = Asset.load(asset.save(tmp_dir), use_mmap=True)
+            encrypted_asset.decrypt(k3=encryption_response.key.k3)
+            assert plnm == encrypted_asset.file.plnm
+
+    def test_overwrite_mmap_source(self, asset_path: str):
+        """Test saving over the memory mapped source file streams the original data intact"""
+        if not asset_path.endswith((".gltf", ".glb")):
+            pytest.skip("Memory mapping is glTF only")
+        plnm = File(asset_path).plnm
+        with TemporaryDirectory() as tmp_dir:
+            shutil.copytree(os.path.dirname(asset_path), tmp_dir, dirs_exist_ok=True)
+            asset = Asset.load(os.path.join(tmp_dir, os.path.basename(asset_path)), use_mmap=True)
+            encryption_response = asset.encrypt()
+            assert asset.save(tmp_dir) == asset.file.import_path
+
+            encrypted_asset = Asset.load(asset.file.import_path, use_mmap=True)
+            encrypted_asset.decrypt(k3=encryption_response.key.k3)
+            assert plnm == encrypted_asset.file.plnm
+
+    def test_write_vectored(self, monkeypatch: pytest.MonkeyPatch):
+        """Test vectored writes across several writev calls match a joined write"""
+        monkeypatch.setattr(gltf2_exporter, "IOV_MAX", 3)
+        segments = [b"glTF", b"", memoryview(np.arange(10, dtype=np.float32)).cast("B"), b"\0" * 3]
+        segments += [bytes([i]) * i for i in range(8)]
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "segments.bin")
+            GlTF2Exporter.write_segments(path, segments)
+            GlTF2Exporter.write_segments(path, segments)  # replaces existing file
+            with open(path, "rb") as f:
+                assert f.read() == b"".join(segments)
+
+    def test_off_parser(self):
+        """Test OFF parsing of comments, blank lines, COFF colors and mixed polygon faces"""
+        text = """COFF
+# comment
+
+4 3 0
+0.5 1 -2 255 0 0 255 # trailing comment
+
+1e-3 nan 3 0 255 0 255
+# vertex comment
+2 2 2 0 0 255 255
+-1 -1 -1 51 51 51 255
+3 0 1 2
+4 0 1 2 3 255 0 0
+
+2 0 3
+"""
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mesh.off")
+            with open(path, "w") as f:
+                f.write(text)
+            data = File(path).data
+
+            with open(path, "w") as f:
+                f.write("OFF\n2 2 0\n0 0 0\n1 1 1\n3 0 1 1\n\n3 1 0 0\n")
+            triangles = File(path).data.faces
+
+        assert np.array_equal(
+            data.verts,
+            np.array(
+                [[0.5, 1, -2], [1e-3, np.nan, 3], [2, 2, 2], [-1, -1, -1]],
+                dtype=np.float32,
+            ),
+            equal_nan=True,
+        )
+        assert np.allclose(
+            data.colors[:, :3], [[1, 0, 0], [0, 1, 0], [0, 0, 1], [0.2, 0.2, 0.2]]
+        )
+        assert np.all(data.colors[:, 3] == 1)
+        assert data.faces == [(0, 1, 2), (0, 1, 2, 3)]  # edges are skipped
+
+        assert isinstance(triangles, np.ndarray)
+        assert triangles.shape == (2, 3)
+        assert np.array_equal(triangles, [[0, 1, 1], [1, 0, 0]])
+
+    @pytest.mark.parametrize("shortest_repr", [False, True])
+    def test_off_writer(self, shortest_repr: bool):
+        """Test OFF export round trips vertices bit for bit, colors and faces"""
+        rng = np.random.default_rng(0)
+        verts = rng.integers(0, 2**32, (1000, 3), dtype=np.uint32).view(np.float32)
+        verts[~np.isfinite(verts)] = 0
+        colors = np.hstack(
+            (rng.integers(0, 256, (1000, 3)) / 255, np.ones((1000, 1)))
+        ).astype(np.float32)
+        triangles = rng.integers(0, 1000, (500, 3))
+        polygons = [tuple(face) for face in triangles[:10]] + [(0, 1, 2, 3)]
+
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "mesh.off")
+            with open(path, "w") as f:
+                f.write("OFF\n0 0 0\n")
+            file = File(path)
+            for faces in (triangles, polygons):
+                file.data = OffData(verts=verts, faces=faces, colors=colors)
+                data = File(file.save(tmp_dir, shortest_repr=shortest_repr)).data
+
+                assert np.array_equal(data.verts.view(np.uint32), verts.view(np.uint32))
+                assert np.allclose(data.colors, colors)
+                assert list(map(tuple, data.faces)) == list(map(tuple, faces))
+
+    def test_off_aad_round_trip(self):
+        """Test aad embedded past the used vertices of an OFF file is extracted intact"""
+        file = File(os.path.join(os.path.dirname(__file__), "assets", "head.off"))
+        verts = file.data.verts.copy()
+        assert file.num_used_vertices == max(max(face) for face in file.data.faces) + 1
+
+        aad = np.random.default_rng(0).integers(0, 2**32, (18, 3), dtype=np.uint32)
+        file.embed_aad(
+            AAD_DATA(
+                aad=aad,
+                encrypt_images=False,
+                meshes_params={"p": 2, "q": 2, "r": 10},
+                images_params={},
+            )
+        )
+        assert len(file.data.verts) == file.num_used_vertices + len(aad) * 2 + 1
+
+        extracted = file.aad
+        assert np.array_equal(extracted.aad, aad)
+        assert extracted.meshes_params == {"p": 2, "q": 2, "r": 10}
+        assert np.array_equal(file.data.verts, verts[: file.num_used_vertices])
+
+    def test_lazy_cipher_plnm(self, file: BaseFile):
+        """Test cipher plaintext holds exactly the float meshes, without decoding anything else"""
+        if not isinstance(file, GLTFFile):
+            pytest.skip("Lazy decoding is glTF only")
+        cipher_plnm = file.cipher_plnm()
+        accessors = file.data.accessors
+        assert isinstance(accessors, LazyDict)
+        assert not any(file.data.images.is_loaded(idx) for idx in file.data.images)  # type: ignore[attr-defined]
+        assert all(
+            accessors.is_loaded(idx) == (idx in file.float_accessor_idxs) for idx in accessors
+        )
+
+        float_meshes = [
+            mesh for mesh in file.plnm.meshes if mesh.dtype.kind == "f" and mesh.size > 0
+        ]
+        assert len(float_meshes) == cipher_plnm.meshes_dim
+        assert all(
+            np.array_equal(mesh, cipher_mesh)
+            for mesh, cipher_mesh in zip(float_meshes, cipher_plnm.meshes)
+        )
+
+    def test_passthrough_export(self, asset_path: str):
+        """Test images and integer accessors untouched by mesh encryption are exported byte for byte"""
+        asset = Asset.load(asset_path)
+        if not isinstance(asset.file, GLTFFile):
+            pytest.skip("Pass-through export is glTF only")
+        source = asset.file.data.source
+        float_idxs = asset.file.float_accessor_idxs
+        asset.encrypt()
+
+        with TemporaryDirectory() as tmp_dir:
+            exported = GlTF2Importer.from_filepath(asset.save(tmp_dir))
+            for idx in range(len(source.images)):
+                assert bytes(ImpBinaryData.get_image_data(exported, idx)) == bytes(
+                    ImpBinaryData.get_image_data(source, idx)
+                )
+            for idx in range(len(source.accessors)):
+                if idx not in float_idxs:
+                    assert np.array_equal(
+                        ImpBinaryData.decode_accessor(exported, idx),
+                        ImpBinaryData.decode_accessor(source, idx),
+                    )
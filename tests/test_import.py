@@ -0,0 +1,42 @@
+import json
+import re
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET = 1.0  # seconds, cumulative import time of crypto_gltf
+LAZY_MODULES = ("PIL", "cellular_automaton", "pygame", "crypto_gltf.encrypt.deprecit")
+
+
+def import_crypto_gltf() -> tuple[float, dict]:
+    """Import crypto_gltf in a fresh interpreter, returns its cumulative import time in seconds
+    and the lazily loaded modules it imported"""
+    script = (
+        "import json, sys, crypto_gltf;"
+        "from crypto_gltf.encrypt.adaptive import utils;"
+        f"lazy = {LAZY_MODULES!r};"
+        "print(json.dumps({"
+        "'modules': sorted(m for m in sys.modules if m.startswith(lazy)),"
+        "'clib_loaded': utils._clib_loaded}))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(r"import time:\s+\d+ \|\s+(\d+) \| crypto_gltf\n", result.stderr)
+    assert match is not None
+    return int(match.group(1)) / 1e6, json.loads(result.stdout)
+
+
+def test_lazy_imports():
+    """Test importing crypto_gltf loads neither PIL, the deprecated systems nor the C library"""
+    _, loaded = import_crypto_gltf()
+    assert loaded["modules"] == []
+    assert not loaded["clib_loaded"]
+
+
+def test_import_time_budget():
+    """Test importing crypto_gltf takes less than IMPORT_TIME_BUDGET, best of three"""
+    seconds = min(import_crypto_gltf()[0] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET, f"import crypto_gltf took {seconds:.3f}s"
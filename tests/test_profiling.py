@@ -0,0 +1,70 @@
+import os
+from tempfile import TemporaryDirectory
+
+import pytest
+from crypto_gltf import Asset
+from crypto_gltf.profiling import (
+    NULL_SPAN,
+    Span,
+    add_callback,
+    recording,
+    remove_callback,
+    span,
+)
+
+ASSET_DIR = os.path.join(os.path.dirname(__file__), "assets")
+
+
+@pytest.mark.parametrize("name", ["tiny_asset.glb", "Apple.off"])
+def test_pipeline_spans(name: str):
+    """Test each pipeline stage reports a span with the bytes it processed"""
+    with TemporaryDirectory() as tmp_dir, recording() as recorder:
+        asset = Asset.load(os.path.join(ASSET_DIR, name))
+        encryption_response = asset.encrypt()
+        encrypted_asset = Asset.load(asset.save(tmp_dir))
+        encrypted_asset.decrypt(k3=encryption_response.key.k3)
+
+    totals = recorder.totals()
+    stages = {"import", "key_derivation", "bit_extraction", "gcm", "bit_insertion", "export"}
+    if name.endswith(".glb"):
+        stages.add("decode")
+    assert stages <= set(totals)
+    assert all(totals[stage]["nbytes"] > 0 for stage in stages)
+    assert totals["import"]["count"] == 2
+    assert totals["gcm"]["count"] == 4  # all blocks encrypted at once, decrypted one by one
+    assert not any(s.failed for s in recorder.spans)
+
+
+def test_gltf_export_span(monkeypatch: pytest.MonkeyPatch):
+    """Test a .gltf saved to a relative directory is written there, and its export span
+    counts every file written, the json and its buffer"""
+    with TemporaryDirectory() as tmp_dir:
+        monkeypatch.chdir(tmp_dir)
+        asset = Asset.load(os.path.join(ASSET_DIR, "honda.gltf"))
+        assert os.path.isfile(asset.save(os.path.join("out", "plain")))  # no callbacks, nothing measured
+
+        export_dir = os.path.join("out", "profiled")
+        with recording() as recorder:
+            export_path = asset.save(export_dir)
+        written = [os.path.join(export_dir, name) for name in os.listdir(export_dir)]
+        assert os.path.abspath(export_path) in map(os.path.abspath, written)
+        assert len(written) > 1
+        assert recorder.totals()["export"]["nbytes"] == sum(map(os.path.getsize, written))
+
+
+def test_spans_disabled():
+    """Test spans are a shared no-op without callbacks, and callbacks see failures"""
+    assert span("gcm") is NULL_SPAN
+
+    spans: list[Span] = []
+    add_callback(spans.append)
+    try:
+        with pytest.raises(ValueError):
+            with span("export", 10) as export_span:
+                export_span.add_bytes(5)
+                raise ValueError()
+    finally:
+        remove_callback(spans.append)
+
+    assert span("gcm") is NULL_SPAN
+    assert [(s.name, s.nbytes, s.failed) for s in spans] == [("export", 15, True)]